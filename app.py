@@ -1,14 +1,22 @@
+import asyncio
+import signal
+
 from fastapi import Depends, FastAPI
 
-from auth.jwt_bearer import JWTBearer
-from config.config import initiate_database, shutdown_database
+import database.user as DatabaseUser
+from auth.jwt_bearer import token_listener
+from config.config import (get_settings, initiate_database, reload_settings,
+                           shutdown_database)
+from database.facets import run_facets_refresher
+from database.popularity import run_popularity_reconciler
 from routes.client import router as ClientRouter
+from routes.export import router as ExportRouter
 from routes.favorite import router as FavoriteRouter
+from routes.metrics import router as MetricsRouter
 from routes.product import router as ProductRouter
 from routes.user import router as UserRouter
 
 app = FastAPI()
-token_listener = JWTBearer()
 
 
 def include_routers():
@@ -38,23 +46,65 @@ def include_routers():
         prefix="/favorite",
         dependencies=[Depends(token_listener)]
     )
+    app.include_router(
+        ExportRouter,
+        tags=["Export"],
+        prefix="/export",
+        dependencies=[Depends(token_listener)]
+    )
+    app.include_router(
+        MetricsRouter,
+        tags=["Metrics"],
+        prefix="/metrics",
+        dependencies=[Depends(token_listener)]
+    )
+
+
+def register_reload_signal():
+    """
+    Registers a SIGHUP handler that reloads the settings snapshot.
+
+    Signal handlers can only be installed from the main thread, so this is a
+    no-op when the application runs elsewhere (ex: under the TestClient).
+    """
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP, reload_settings
+        )
+    except (RuntimeError, ValueError):
+        pass
 
 
 @app.on_event("startup")
 async def start_database():
     """
     Event handler for application startup.
-    Initialize the database connection when the application starts.
+    Initialize the settings snapshot and the database connection when the
+    application starts, reload the settings on SIGHUP and refresh the
+    catalog facets and reconcile the product popularity counters in the
+    background.
     """
+    get_settings()
+    register_reload_signal()
     await initiate_database()
+    await DatabaseUser.ensure_default_user()
+    app.state.facets_refresher = asyncio.create_task(run_facets_refresher())
+    app.state.popularity_reconciler = asyncio.create_task(
+        run_popularity_reconciler()
+    )
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """
     Event handler for application shutdown.
-    This function closes the database connection when the application stops.
+    This function stops the background tasks and closes the database
+    connection when the application stops.
     """
+    app.state.facets_refresher.cancel()
+    app.state.popularity_reconciler.cancel()
     await shutdown_database()
 
 include_routers()
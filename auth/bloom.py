@@ -0,0 +1,59 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter for strings.
+
+    Membership tests never return false negatives; false positives happen
+    with roughly `error_rate` probability while at most `capacity` items
+    were added.
+
+    Attributes:
+        capacity (int): The expected number of items.
+        size (int): The number of bits of the filter.
+        hashes (int): The number of bits set per item.
+        count (int): The number of items added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Initializes an empty filter sized for the given capacity.
+
+        Args:
+            capacity (int): The expected number of items.
+            error_rate (float, optional): The target false positive rate.
+            Default is 0.001.
+        """
+        self.capacity = capacity
+        self.size = max(8, int(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        ))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str):
+        """
+        Adds an item to the filter.
+
+        Args:
+            item (str): The item to add.
+        """
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
@@ -4,20 +4,41 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from resources.resources import ResourceManager
 
 from .jwt_handler import decode_jwt
+from .revocation import get_revocation_list
+from .token_cache import get_token_cache
 
 resources = ResourceManager()
 
 
+def get_claims(jwtoken: str) -> dict:
+    """
+    Returns the claims of a JWT token, verifying it only on a cache miss.
+    Use jwt_handler.decode_jwt
+    Args:
+        jwtoken (str): The JWT token to be verified.
+    Returns:
+        dict: The decoded claims if the token is valid and not expired,
+        otherwise an empty dictionary.
+    """
+    token_cache = get_token_cache()
+    claims = token_cache.get(jwtoken)
+    if claims is None:
+        claims = decode_jwt(jwtoken)
+        if claims:
+            token_cache.put(jwtoken, claims)
+    return claims
+
+
 def verify_jwt(jwtoken: str) -> bool:
     """
     Verifies the validity of a JWT token.
-    Use jwt_handler.decode_jwt
+    Use get_claims
     Args:
         jwtoken (str): The JWT token to be verified.
     Returns:
         bool: True if the token is valid, False otherwise.
     """
-    if decode_jwt(jwtoken):
+    if get_claims(jwtoken):
         return True
     else:
         return False
@@ -44,7 +65,8 @@ class JWTBearer(HTTPBearer):
             str: The JWT token if authentication is successful.
         Raises:
             HTTPException: Status code 401 if the authentication fails due to
-            an invalid credentials scheme, invalid token or missing token.
+            an invalid credentials scheme, invalid, expired or revoked token
+            or missing token.
         """
 
         credentials: HTTPAuthorizationCredentials = (
@@ -53,7 +75,11 @@ class JWTBearer(HTTPBearer):
 
         if credentials:
             if credentials.scheme == "Bearer":
-                if not verify_jwt(credentials.credentials):
+                claims = get_claims(credentials.credentials)
+                if not claims or (
+                    "jti" in claims
+                    and await get_revocation_list().is_revoked(claims["jti"])
+                ):
                     raise HTTPException(
                         status_code=401,
                         detail=resources.get("auth.invalid_token")
@@ -65,3 +91,6 @@ class JWTBearer(HTTPBearer):
                 status_code=403,
                 detail=resources.get("auth.not_authenticated")
             )
+
+
+token_listener = JWTBearer()
@@ -1,9 +1,10 @@
 import time
-from typing import Dict
+import uuid
+from typing import Dict, Optional
 
 import jwt
 
-from config.config import Settings
+from config.config import get_settings
 
 
 def token_response(token: str):
@@ -17,23 +18,29 @@ def token_response(token: str):
     return {"access_token": token}
 
 
-def sign_jwt(login: str) -> Dict[str, str]:
+def sign_jwt(login: str, family: Optional[str] = None) -> Dict[str, str]:
     """
     Singin and generates a JWT token for a given login.
     Args:
         login (str): The login for which the token is being generated.
+        family (Optional[str]): The refresh token family of the session the
+        token belongs to, revoked with the token.
     Returns:
         Dict[str, str]: A dictionary containing the signed JWT token.
     """
+    settings = get_settings()
     payload = {
         "login": login,
-        "expires": (time.time() + Settings().EXPIRE_TIME)
+        "jti": uuid.uuid4().hex,
+        "expires": (time.time() + settings.EXPIRE_TIME)
     }
+    if family:
+        payload["family"] = family
     return token_response(
         jwt.encode(
             payload,
-            Settings().SECRET_KEY,
-            algorithm=Settings().TOKEN_ALGORITHM
+            settings.SECRET_KEY,
+            algorithm=settings.TOKEN_ALGORITHM
         )
     )
 
@@ -47,9 +54,13 @@ def decode_jwt(token: str) -> dict:
         dict: The decoded token if valid and not expired,
         otherwise an empty dictionary.
     """
-    decoded_token = jwt.decode(
-        token.encode(),
-        Settings().SECRET_KEY,
-        algorithms=Settings().TOKEN_ALGORITHM
-    )
+    settings = get_settings()
+    try:
+        decoded_token = jwt.decode(
+            token.encode(),
+            settings.SECRET_KEY,
+            algorithms=settings.TOKEN_ALGORITHM
+        )
+    except jwt.InvalidTokenError:
+        return {}
     return decoded_token if decoded_token["expires"] >= time.time() else {}
@@ -0,0 +1,191 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import metrics
+from config.config import get_settings
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+VERIFIED_CACHE_SIZE = 10000
+
+hash_executor: ThreadPoolExecutor = None
+# Hash of a random password, checked when the user does not exist
+dummy_hash: str = None
+
+# Per-username digests of recently verified passwords. The key is random per
+# process, so the digests are useless outside of this worker.
+_verified_key = os.urandom(32)
+_verified: OrderedDict[str, tuple] = OrderedDict()
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def hash_password(password: str) -> str:
+    """
+    Generates a salted scrypt hash of a password.
+
+    Args:
+        password (str): The plain text password.
+
+    Returns:
+        str: The hash in the format "scrypt$n$r$p$salt$hash".
+    """
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(
+        password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P
+    )
+    return "$".join([
+        "scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        _b64(salt), _b64(digest)
+    ])
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """
+    Checks a password against a hash generated by `hash_password`.
+
+    Args:
+        password (str): The plain text password.
+        password_hash (str): The stored hash.
+
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    try:
+        _, n, r, p, salt, digest = password_hash.split("$")
+        expected = base64.b64decode(digest)
+        computed = hashlib.scrypt(
+            password.encode(),
+            salt=base64.b64decode(salt),
+            n=int(n), r=int(r), p=int(p),
+            dklen=len(expected)
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(computed, expected)
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool where password hashes are computed, so
+    slow hashes never block the event loop.
+
+    Returns:
+        ThreadPoolExecutor: The password hashing pool.
+    """
+    global hash_executor
+    if hash_executor is None:
+        hash_executor = ThreadPoolExecutor(
+            max_workers=get_settings().PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+    return hash_executor
+
+
+def _verified_digest(password: str, password_hash: str) -> bytes:
+    return hmac.new(
+        _verified_key,
+        f"{password_hash}\0{password}".encode(),
+        hashlib.sha256
+    ).digest()
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Runs `hash_password` in the password hashing pool.
+
+    Args:
+        password (str): The plain text password.
+
+    Returns:
+        str: The generated hash.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(), hash_password, password
+    )
+
+
+def check_dummy_password(password: str) -> bool:
+    """
+    Checks a password against the hash of a random password, to spend the
+    same time as `check_password` when the user does not exist.
+
+    Args:
+        password (str): The plain text password.
+
+    Returns:
+        bool: Always False.
+    """
+    global dummy_hash
+    if dummy_hash is None:
+        dummy_hash = hash_password(_b64(os.urandom(16)))
+    check_password(password, dummy_hash)
+    return False
+
+
+async def reject_unknown_user(password: str) -> bool:
+    """
+    Runs a password check that always fails in the password hashing pool,
+    so that a login with an unknown username takes as long as a login with
+    a wrong password and does not tell which usernames exist.
+
+    Args:
+        password (str): The plain text password.
+
+    Returns:
+        bool: Always False.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(), check_dummy_password, password
+    )
+
+
+async def verify_password(
+    username: str, password: str, password_hash: str
+) -> bool:
+    """
+    Verifies a user's password in the password hashing pool.
+
+    Successful verifications are remembered for PASSWORD_CACHE_TTL seconds,
+    so a repeated login with the same password and the same stored hash skips
+    the slow hash. Changing the password invalidates the entry.
+
+    Args:
+        username (str): The login of the user.
+        password (str): The plain text password.
+        password_hash (str): The stored hash of the user.
+
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    digest = _verified_digest(password, password_hash)
+    cached = _verified.get(username)
+    if cached and cached[1] >= time.time():
+        if hmac.compare_digest(cached[0], digest):
+            metrics.incr("password_cache.hits")
+            return True
+    metrics.incr("password_cache.misses")
+
+    loop = asyncio.get_running_loop()
+    valid = await loop.run_in_executor(
+        get_hash_executor(), check_password, password, password_hash
+    )
+    if valid:
+        _verified[username] = (
+            digest, time.time() + get_settings().PASSWORD_CACHE_TTL
+        )
+        _verified.move_to_end(username)
+        while len(_verified) > VERIFIED_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return valid
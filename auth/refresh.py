@@ -0,0 +1,101 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import Binary
+from pymongo import ReturnDocument
+
+from config import metrics
+from config.config import get_settings
+from models.refresh_token import RefreshToken
+
+
+def _digest(token: str) -> Binary:
+    return Binary(hashlib.sha256(token.encode()).digest())
+
+
+def new_family() -> str:
+    """
+    Starts a login session.
+
+    Returns:
+        str: The identifier of the refresh token family of the session.
+    """
+    return uuid.uuid4().hex
+
+
+async def issue_refresh_token(login: str, family: str = None) -> str:
+    """
+    Issues a new refresh token, storing only its digest.
+
+    Args:
+        login (str): The login the token is issued to.
+        family (str, optional): The session the token belongs to. A new
+        session is started if not informed.
+
+    Returns:
+        str: The opaque refresh token.
+    """
+    token = secrets.token_urlsafe(32)
+    await RefreshToken(
+        id=_digest(token),
+        family=family or new_family(),
+        login=login,
+        expires_at=datetime.now(timezone.utc) + timedelta(
+            seconds=get_settings().REFRESH_EXPIRE_TIME
+        ),
+    ).create()
+    return token
+
+
+async def rotate_refresh_token(token: str) -> Optional[RefreshToken]:
+    """
+    Marks a refresh token as used, if it is valid and was never used.
+
+    Presenting an already used token means it leaked, so every token of its
+    session is revoked.
+
+    Args:
+        token (str): The opaque refresh token.
+
+    Returns:
+        Optional[RefreshToken]: The rotated token, or None if it is invalid,
+        expired or reused.
+    """
+    collection = RefreshToken.get_motor_collection()
+    digest = _digest(token)
+    rotated = await collection.find_one_and_update(
+        {
+            "_id": digest,
+            "used": False,
+            "expires_at": {"$gt": datetime.now(timezone.utc)},
+        },
+        {"$set": {"used": True}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if rotated:
+        return RefreshToken.model_validate(rotated)
+
+    reused = await collection.find_one({"_id": digest, "used": True})
+    if reused:
+        metrics.incr("auth.refresh_reuse_detected")
+        await revoke_refresh_family(reused["family"])
+    return None
+
+
+async def revoke_refresh_family(family: str) -> int:
+    """
+    Revokes every refresh token of a session.
+
+    Args:
+        family (str): The identifier of the session.
+
+    Returns:
+        int: The number of revoked refresh tokens.
+    """
+    result = await RefreshToken.get_motor_collection().delete_many(
+        {"family": family}
+    )
+    return result.deleted_count
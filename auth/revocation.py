@@ -0,0 +1,154 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from config import metrics
+from config.config import get_settings
+from models.revoked_token import RevokedToken
+
+from .bloom import BloomFilter
+
+revocation_list: "RevocationList" = None
+
+# Revocations are re-read for this long after the last one seen, since a
+# write may become visible after a later one was already read
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class RevocationList:
+    """
+    The revoked tokens known by this worker.
+
+    Revoked `jti`s are kept in a Bloom filter that is refreshed incrementally
+    from the `revoked_token` collection, so checking a token that was not
+    revoked costs no I/O. Only filter hits are confirmed in the database.
+
+    Attributes:
+        capacity (int): The expected number of revoked, unexpired tokens.
+        refresh_interval (float): Seconds between two refreshes of the filter.
+    """
+
+    def __init__(self, capacity: int, refresh_interval: float):
+        """
+        Initializes an empty revocation list, loaded on the first check.
+
+        Args:
+            capacity (int): The expected number of revoked, unexpired tokens.
+            refresh_interval (float): Seconds between two refreshes.
+        """
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self._filter = BloomFilter(capacity)
+        self._last_revoked_at: datetime = None
+        self._last_refresh = 0.0
+        # The tokens of the overlap window already in the filter
+        self._recent: dict = {}
+
+    def _add(self, jti: str, revoked_at: datetime):
+        if jti not in self._recent:
+            self._filter.add(jti)
+        self._recent[jti] = revoked_at
+        if self._last_revoked_at is None or revoked_at > self._last_revoked_at:
+            self._last_revoked_at = revoked_at
+
+    async def refresh(self):
+        """
+        Adds the tokens revoked since the last refresh to the filter.
+
+        The tokens revoked during the REFRESH_OVERLAP before the last one
+        seen are read again, and only added if they are not in the filter
+        yet. The filter is rebuilt from scratch when it holds more items
+        than its capacity, dropping the tokens already purged by the TTL
+        index.
+        """
+        self._last_refresh = time.monotonic()
+        query = {}
+        if self._filter.count > self.capacity:
+            self._filter = BloomFilter(self.capacity)
+            self._last_revoked_at = None
+            self._recent = {}
+        elif self._last_revoked_at:
+            query = {
+                "revoked_at": {
+                    "$gte": self._last_revoked_at - REFRESH_OVERLAP
+                }
+            }
+
+        cursor = RevokedToken.get_motor_collection().find(
+            query, {"revoked_at": 1}
+        )
+        async for revoked in cursor:
+            self._add(revoked["_id"], revoked["revoked_at"])
+        if self._last_revoked_at:
+            window_start = self._last_revoked_at - REFRESH_OVERLAP
+            self._recent = {
+                jti: revoked_at for jti, revoked_at in self._recent.items()
+                if revoked_at >= window_start
+            }
+        metrics.incr("revocation.refreshes")
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Checks if a token was revoked.
+
+        Args:
+            jti (str): The `jti` claim of the token.
+
+        Returns:
+            bool: True if the token was revoked, False otherwise.
+        """
+        if time.monotonic() - self._last_refresh >= self.refresh_interval:
+            await self.refresh()
+
+        if jti not in self._filter:
+            return False
+
+        metrics.incr("revocation.filter_hits")
+        if await RevokedToken.get(jti):
+            return True
+        metrics.incr("revocation.false_positives")
+        return False
+
+    async def revoke(self, jti: str, expires: float):
+        """
+        Revokes a token until its expiration.
+
+        Args:
+            jti (str): The `jti` claim of the token.
+            expires (float): The `expires` claim of the token.
+        """
+        revoked = await RevokedToken.get_motor_collection()\
+            .find_one_and_update(
+                {"_id": jti},
+                {
+                    "$currentDate": {"revoked_at": True},
+                    "$setOnInsert": {
+                        "expires_at": datetime.fromtimestamp(
+                            expires, timezone.utc
+                        ),
+                    },
+                },
+                projection={"revoked_at": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        self._add(jti, revoked["revoked_at"])
+        metrics.incr("revocation.revoked")
+
+
+def get_revocation_list() -> RevocationList:
+    """
+    Returns the process-wide revocation list.
+
+    Returns:
+        RevocationList: The revocation list of this worker.
+    """
+    global revocation_list
+    if revocation_list is None:
+        settings = get_settings()
+        revocation_list = RevocationList(
+            settings.REVOCATION_FILTER_CAPACITY,
+            settings.REVOCATION_REFRESH_INTERVAL
+        )
+    return revocation_list
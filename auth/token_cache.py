@@ -0,0 +1,125 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import metrics
+from config.config import Settings, get_settings
+
+token_cache: "TokenCache" = None
+
+
+class TokenCache:
+    """
+    A bounded LRU cache of already verified JWT tokens.
+
+    Entries are keyed by the SHA-256 digest of the token and hold the decoded
+    claims. An entry is dropped as soon as its `expires` claim passes, or when
+    the cache is full and it is the least recently used one.
+
+    Attributes:
+        max_size (int): The maximum number of tokens kept in the cache.
+        settings (Settings): The settings snapshot the tokens were verified
+        against.
+    """
+
+    def __init__(self, max_size: int, settings: Settings = None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_size (int): The maximum number of tokens kept in the cache.
+            settings (Settings, optional): The settings snapshot the tokens
+            are verified against.
+        """
+        self.max_size = max_size
+        self.settings = settings
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Returns the cached claims of a token, if it is cached and not expired.
+
+        Args:
+            token (str): The JWT token.
+
+        Returns:
+            Optional[dict]: The decoded claims, or None on a cache miss.
+        """
+        key = self._digest(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            metrics.incr("token_cache.misses")
+            return None
+
+        if claims["expires"] < time.time():
+            del self._entries[key]
+            metrics.incr("token_cache.expired")
+            metrics.incr("token_cache.misses")
+            return None
+
+        self._entries.move_to_end(key)
+        metrics.incr("token_cache.hits")
+        return claims
+
+    def put(self, token: str, claims: dict):
+        """
+        Stores the claims of a verified token, evicting the least recently
+        used entries if the cache is full.
+
+        Args:
+            token (str): The JWT token.
+            claims (dict): The decoded and validated claims.
+        """
+        key = self._digest(token)
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            metrics.incr("token_cache.evictions")
+
+    def discard(self, token: str):
+        """
+        Removes a token from the cache, if present.
+
+        Args:
+            token (str): The JWT token.
+        """
+        self._entries.pop(self._digest(token), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """
+        Returns the cache size and its hit, miss and eviction counters.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            **metrics.snapshot("token_cache."),
+        }
+
+
+def get_token_cache() -> TokenCache:
+    """
+    Returns the process-wide token cache.
+
+    The cache is bound to the settings snapshot it was created with, so a
+    settings reload (ex: a new SECRET_KEY) starts over with an empty cache.
+
+    Returns:
+        TokenCache: The current token cache.
+    """
+    global token_cache
+    settings = get_settings()
+    if token_cache is None or token_cache.settings is not settings:
+        token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings)
+    return token_cache
@@ -0,0 +1,44 @@
+"""
+Per-request authentication cost.
+
+Compares decoding a token while re-reading the `.env` file on every access
+(the previous behaviour) with the cached settings snapshot.
+
+Usage (from the project root, with a `.env` file):
+    python -m benchmarks.bench_auth
+"""
+import time
+import timeit
+
+import jwt
+
+from auth.jwt_handler import decode_jwt, sign_jwt
+from config.config import Settings
+
+ROUNDS = 2000
+
+
+def decode_jwt_uncached(token: str) -> dict:
+    decoded_token = jwt.decode(
+        token.encode(),
+        Settings().SECRET_KEY,
+        algorithms=Settings().TOKEN_ALGORITHM
+    )
+    return decoded_token if decoded_token["expires"] >= time.time() else {}
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<28} {seconds / ROUNDS * 1_000_000:>10.1f} us/request")
+
+
+if __name__ == "__main__":
+    token = sign_jwt("benchmark")["access_token"]
+
+    report(
+        "Settings() per call",
+        timeit.timeit(lambda: decode_jwt_uncached(token), number=ROUNDS)
+    )
+    report(
+        "cached settings snapshot",
+        timeit.timeit(lambda: decode_jwt(token), number=ROUNDS)
+    )
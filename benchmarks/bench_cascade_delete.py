@@ -0,0 +1,60 @@
+"""
+Cascade delete latency against the number of favorites of a product.
+
+Compares deleting the favorites one document at a time (the previous
+behaviour) with the single delete_many used by delete_all_favorites.
+
+Usage (from the project root, with a `.env` file and MongoDB running):
+    python -m benchmarks.bench_cascade_delete
+"""
+import asyncio
+import time
+
+from config.config import initiate_database, shutdown_database
+from database.favorite import delete_all_favorites, favorites_collection
+from models.favorite import Favorite
+
+# Product id reserved for the benchmark, never used by real data
+PRODUCT_ID = -1
+SIZES = [10, 100, 1000, 10000]
+
+
+async def insert_favorites(count: int):
+    await Favorite.insert_many([
+        Favorite(client_id=-(i + 1), product_id=PRODUCT_ID)
+        for i in range(count)
+    ])
+
+
+async def delete_one_by_one():
+    favorites = await favorites_collection.find_many(
+        {"product_id": PRODUCT_ID}
+    ).to_list()
+    for favorite in favorites:
+        await favorite.delete()
+
+
+async def measure(delete, count: int) -> float:
+    await insert_favorites(count)
+    start = time.perf_counter()
+    await delete()
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    await initiate_database()
+    await delete_all_favorites(product_id=PRODUCT_ID)
+
+    print(f"{'favorites':>10} {'one by one':>14} {'delete_many':>14}  (ms)")
+    for count in SIZES:
+        one_by_one = await measure(delete_one_by_one, count)
+        bulk = await measure(
+            lambda: delete_all_favorites(product_id=PRODUCT_ID), count
+        )
+        print(f"{count:>10} {one_by_one:>14.1f} {bulk:>14.1f}")
+
+    await shutdown_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
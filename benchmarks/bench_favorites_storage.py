@@ -0,0 +1,96 @@
+"""
+Favorites read and write latency of the two storage modes.
+
+Reads the favorites of a client and adds one favorite, with one document
+per favorite (FAVORITES_STORAGE=documents) and with the embedded per-client
+array (FAVORITES_STORAGE=embedded), for several numbers of favorites.
+
+Usage (from the project root, with a `.env` file and MongoDB running):
+    python -m benchmarks.bench_favorites_storage
+"""
+import asyncio
+import time
+
+import config.config as config
+from config.config import get_settings, initiate_database, shutdown_database
+from database.favorite import (add_favorite, delete_all_favorites,
+                               delete_favorite, get_favorites)
+from models.client import Client
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+from models.product import Product
+
+# Client and product ids reserved for the benchmark, never used by real data
+CLIENT_ID = -1
+FIRST_PRODUCT_ID = -100000
+SIZES = [10, 100, 500]
+ROUNDS = 200
+
+
+def use_storage(storage: str):
+    config.settings = get_settings().model_copy(
+        update={"FAVORITES_STORAGE": storage}
+    )
+
+
+async def setup(count: int):
+    await Client(
+        id=CLIENT_ID, name="Benchmark", email="benchmark@example.com"
+    ).save()
+    await Product.insert_many([
+        Product(
+            id=FIRST_PRODUCT_ID - i, title="Benchmark", price=1.0,
+            image="", brand="Benchmark", reviewScore=None,
+        )
+        for i in range(count + 1)
+    ])
+    product_ids = [FIRST_PRODUCT_ID - i for i in range(count)]
+    await Favorite.insert_many([
+        Favorite(client_id=CLIENT_ID, product_id=product_id)
+        for product_id in product_ids
+    ])
+    await ClientFavorites(id=CLIENT_ID, product_ids=product_ids).save()
+
+
+async def cleanup(count: int):
+    for storage in ("documents", "embedded"):
+        use_storage(storage)
+        await delete_all_favorites(client_id=CLIENT_ID)
+    await Product.find(
+        {"_id": {"$lte": FIRST_PRODUCT_ID, "$gte": FIRST_PRODUCT_ID - count}}
+    ).delete()
+    await Client.find({"_id": CLIENT_ID}).delete()
+
+
+async def measure(operation, rounds: int = ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await operation()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def main():
+    await initiate_database()
+
+    print(f"{'favorites':>10} {'storage':>10} {'read':>10} {'add':>10}  (ms)")
+    for count in SIZES:
+        await cleanup(count)
+        await setup(count)
+        new_product_id = FIRST_PRODUCT_ID - count
+        for storage in ("documents", "embedded"):
+            use_storage(storage)
+            read = await measure(lambda: get_favorites(CLIENT_ID))
+
+            async def add():
+                await add_favorite(CLIENT_ID, new_product_id)
+                await delete_favorite(CLIENT_ID, new_product_id)
+
+            write = await measure(add)
+            print(f"{count:>10} {storage:>10} {read:>10.2f} {write:>10.2f}")
+        await cleanup(count)
+
+    await shutdown_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
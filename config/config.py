@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+from typing import List, Literal
+
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -5,6 +8,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 import models as models
 
 db_client: AsyncIOMotorClient = None
+settings: "Settings" = None
 
 
 class Settings(BaseSettings):
@@ -15,9 +19,53 @@ class Settings(BaseSettings):
         DATABASE_URL (str): The MongoDB database connection URL.
         SECRET_KEY (str): The secret key for signing JWT tokens.
         EXPIRE_TIME (int): The expiration time for JWT tokens (in seconds).
+        REFRESH_EXPIRE_TIME (int): The expiration time for refresh tokens
+        (in seconds).
         TOKEN_ALGORITHM (str): The algorithm used for signing JWT tokens.
         API_USER (str): Default username for API authentication.
         API_PASS (str): Default password for API authentication.
+        TOKEN_CACHE_SIZE (int): Maximum number of verified tokens kept in
+        memory by the JWTBearer.
+        PASSWORD_HASH_WORKERS (int): Size of the thread pool where password
+        hashes are computed.
+        PASSWORD_CACHE_TTL (int): Seconds a successful password verification
+        is remembered per user.
+        REVOCATION_FILTER_CAPACITY (int): Expected number of revoked tokens
+        not yet expired, used to size the revocation Bloom filter.
+        REVOCATION_REFRESH_INTERVAL (float): Seconds between two incremental
+        refreshes of the revocation Bloom filter.
+        PAGE_SIZE (int): Default number of items per page of the listings.
+        MAX_PAGE_SIZE (int): Maximum number of items per page a client can
+        request.
+        USE_TRANSACTIONS (bool): Run cascading writes in a transaction.
+        Requires MongoDB running as a replica set.
+        BULK_BATCH_SIZE (int): Documents written per batch by the bulk
+        import endpoints.
+        PRODUCT_COUNT_TTL (float): Seconds the number of products is cached
+        before being counted again.
+        PRODUCT_COUNT_ESTIMATED (bool): Count the products from the
+        collection metadata instead of scanning the index.
+        PRODUCT_CACHE_SIZE (int): Maximum number of products kept in memory.
+        PRODUCT_CACHE_TTL (float): Seconds a cached product is served
+        without reading the database.
+        PRODUCT_CACHE_NEGATIVE_TTL (float): Seconds a missing product ID is
+        remembered as missing.
+        MAX_BATCH_IDS (int): Maximum number of IDs of a batch multi-get.
+        FACETS_REFRESH_INTERVAL (float): Seconds between two checks for
+        product writes that make the catalog facets stale. Also the time
+        the facets are served from memory.
+        FACETS_TOP_SIZE (int): Number of products of each brand leaderboard.
+        FACETS_PRICE_BOUNDARIES (List[float]): The lower bounds of the price
+        histogram buckets.
+        FAVORITES_STORAGE (str): "documents" to store each favorite as a
+        document, or "embedded" to store the favorite product IDs of each
+        client in a single document.
+        FAVORITES_MAX_PER_CLIENT (int): Maximum number of favorites of a
+        client in the embedded storage mode.
+        FAVORITES_DUAL_WRITE (bool): Also write the favorites to the
+        storage that is not in use, while migrating between the two.
+        POPULARITY_RECONCILE_INTERVAL (float): Seconds between two
+        recomputations of the product favorite counters from the favorites.
     """
     DATABASE_URL: str
     SECRET_KEY: str
@@ -25,7 +73,61 @@ class Settings(BaseSettings):
     TOKEN_ALGORITHM: str
     API_USER: str
     API_PASS: str
-    model_config = SettingsConfigDict(env_file=".env")
+    TOKEN_CACHE_SIZE: int = 10000
+    REFRESH_EXPIRE_TIME: int = 2592000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_CACHE_TTL: int = 300
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_REFRESH_INTERVAL: float = 5.0
+    PAGE_SIZE: int = 10
+    MAX_PAGE_SIZE: int = 100
+    USE_TRANSACTIONS: bool = False
+    BULK_BATCH_SIZE: int = 1000
+    PRODUCT_COUNT_TTL: float = 60.0
+    PRODUCT_COUNT_ESTIMATED: bool = False
+    PRODUCT_CACHE_SIZE: int = 10000
+    PRODUCT_CACHE_TTL: float = 300.0
+    PRODUCT_CACHE_NEGATIVE_TTL: float = 30.0
+    MAX_BATCH_IDS: int = 100
+    FACETS_REFRESH_INTERVAL: float = 60.0
+    FACETS_TOP_SIZE: int = 10
+    FACETS_PRICE_BOUNDARIES: List[float] = [0, 50, 100, 250, 500, 1000]
+    FAVORITES_STORAGE: Literal["documents", "embedded"] = "documents"
+    FAVORITES_MAX_PER_CLIENT: int = 1000
+    FAVORITES_DUAL_WRITE: bool = False
+    POPULARITY_RECONCILE_INTERVAL: float = 3600.0
+    model_config = SettingsConfigDict(env_file=".env", frozen=True)
+
+
+def get_settings() -> Settings:
+    """
+    Returns the process-wide settings snapshot.
+
+    The `.env` file is read and validated only once, on the first call.
+    Use `reload_settings` to pick up changes without restarting.
+
+    Returns:
+        Settings: The current (immutable) settings.
+    """
+    global settings
+    if settings is None:
+        settings = Settings()
+    return settings
+
+
+def reload_settings() -> Settings:
+    """
+    Re-reads the `.env` file and replaces the settings snapshot.
+
+    The new snapshot is fully validated before it is published, so a broken
+    `.env` keeps the previous settings in place.
+
+    Returns:
+        Settings: The new settings snapshot.
+    """
+    global settings
+    settings = Settings()
+    return settings
 
 
 async def initiate_database():
@@ -33,7 +135,7 @@ async def initiate_database():
     Initializes the database connection and sets up Beanie with the all models.
     """
     global db_client
-    db_client = AsyncIOMotorClient(Settings().DATABASE_URL)
+    db_client = AsyncIOMotorClient(get_settings().DATABASE_URL)
     await init_beanie(
         database=db_client.get_default_database(),
         document_models=models.__all__
@@ -48,6 +150,24 @@ async def shutdown_database():
     db_client.close()
 
 
+@asynccontextmanager
+async def transaction():
+    """
+    Opens a transaction for cascading writes, if USE_TRANSACTIONS is set.
+
+    Yields:
+        The session to pass to the database calls, or None when
+        transactions are disabled.
+    """
+    if not get_settings().USE_TRANSACTIONS:
+        yield None
+        return
+
+    async with await db_client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
 def get_db():
     global db_client
     return db_client
@@ -0,0 +1,23 @@
+from config.config import initiate_database, shutdown_database
+from database.catalog_sync import sync_catalog
+
+
+async def catalog_sync(feed_path: str):
+    await initiate_database()
+
+    # O feed é lido linha a linha, sem carregar o arquivo inteiro
+    with open(feed_path, encoding="utf-8") as feed:
+        report = await sync_catalog(feed)
+
+    print(
+        f"Inseridos: {report['inserted']}, "
+        f"atualizados: {report['updated']}, "
+        f"removidos: {report['deleted']}, "
+        f"inalterados: {report['unchanged']}."
+    )
+    for error in report["errors"]:
+        print(f"Linha {error['line']}: {error['error']}")
+    if report["errors"]:
+        print("Feed com erros: nenhum produto foi removido.")
+
+    await shutdown_database()
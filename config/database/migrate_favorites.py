@@ -0,0 +1,38 @@
+from config.config import initiate_database, shutdown_database
+from database.favorite_migration import (dual_write, migrate_to_documents,
+                                         migrate_to_embedded)
+
+
+async def migrate_favorites(target: str, restart: bool = False):
+    await initiate_database()
+
+    # A migração é retomada do último lote gravado, exceto com --restart.
+    # Uma passada completa apaga o checkpoint: a próxima reconcilia tudo
+    if not dual_write():
+        print(
+            "FAVORITES_DUAL_WRITE desativado: os favoritos gravados durante "
+            "a migração e até a troca não serão copiados."
+        )
+    migrate = (
+        migrate_to_embedded if target == "embedded" else migrate_to_documents
+    )
+    try:
+        report = await migrate(restart=restart)
+    except RuntimeError as error:
+        print(error)
+        await shutdown_database()
+        return
+
+    print(
+        f"Favoritos copiados: {report['migrated']} "
+        f"e {report['removed']} removidos em {report['batches']} lotes."
+    )
+    # Com a escrita dupla ativa desde antes da migração, os dois formatos
+    # recebem todas as gravações e a troca não perde favoritos
+    print(
+        f"Com FAVORITES_DUAL_WRITE=true, ajuste FAVORITES_STORAGE={target}."
+    )
+    print("Desative FAVORITES_DUAL_WRITE depois da troca em todas as")
+    print("instâncias da API.")
+
+    await shutdown_database()
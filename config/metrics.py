@@ -0,0 +1,30 @@
+from collections import Counter
+
+counters: Counter = Counter()
+
+
+def incr(name: str, amount: int = 1):
+    """
+    Increments a process-wide counter.
+
+    Args:
+        name (str): The dot-separated counter name (ex: "token_cache.hits").
+        amount (int, optional): The increment. Default is 1.
+    """
+    counters[name] += amount
+
+
+def snapshot(prefix: str = "") -> dict:
+    """
+    Returns a copy of the counters, optionally filtered by a name prefix.
+
+    Args:
+        prefix (str, optional): Only counters starting with it are returned.
+
+    Returns:
+        dict: The counter names mapped to their current values.
+    """
+    return {
+        name: value for name, value in sorted(counters.items())
+        if name.startswith(prefix)
+    }
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional
+
+from beanie import Document
+from fastapi import HTTPException
+
+from config.config import get_settings
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+
+def parse_ids(ids: Optional[str]) -> List[int]:
+    """
+    Parses the comma-separated IDs of a batch multi-get.
+
+    Repeated IDs are only kept once, in the order of their first occurrence.
+
+    Args:
+        ids (Optional[str]): The comma-separated IDs.
+
+    Returns:
+        List[int]: The requested IDs.
+
+    Raises:
+        HTTPException: If an ID is not an integer, or more than MAX_BATCH_IDS
+        IDs are requested.
+    """
+    try:
+        parsed = [int(id) for id in (ids or "").split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.invalid_ids")
+        )
+
+    parsed = list(dict.fromkeys(parsed))
+    max_ids = get_settings().MAX_BATCH_IDS
+    if len(parsed) > max_ids:
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.too_many_ids").format(max_ids)
+        )
+    return parsed
+
+
+async def find_by_ids(
+    model: type[Document], ids: List[int]
+) -> Dict[int, Document]:
+    """
+    Fetches the documents with the given IDs in a single `$in` query.
+
+    Args:
+        model (type[Document]): The document model.
+        ids (List[int]): The IDs of the documents.
+
+    Returns:
+        Dict[int, Document]: The found documents by ID.
+    """
+    if not ids:
+        return {}
+    documents = await model.find({"_id": {"$in": ids}}).to_list()
+    return {document.id: document for document in documents}
+
+
+def in_request_order(ids: List[int], found: Dict[int, Document]) -> dict:
+    """
+    Builds the result of a batch multi-get.
+
+    Args:
+        ids (List[int]): The requested IDs.
+        found (Dict[int, Document]): The found documents by ID.
+
+    Returns:
+        dict: The found documents in the order of the request, and the IDs
+        that were not found.
+    """
+    return {
+        "items": [found[id] for id in ids if id in found],
+        "missing": [id for id in ids if id not in found],
+    }
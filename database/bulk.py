@@ -0,0 +1,174 @@
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from beanie import Document
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from config.config import get_settings
+from database.update import draw_created_nonce
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+# Receives a batch of valid documents and returns the errors of the ones that
+# can not be inserted, indexed by their position in the batch
+BatchCheck = Callable[[List[Document]], Awaitable[Dict[int, str]]]
+# Writes a batch of valid documents instead of `insert_many`, and returns the
+# errors of the ones that were not written, indexed the same way
+BatchWrite = Callable[[List[Document]], Awaitable[Dict[int, str]]]
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes]
+) -> AsyncIterator[tuple[int, bytes]]:
+    """
+    Splits a stream of bytes in NDJSON lines as the chunks arrive.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The body of the request.
+
+    Yields:
+        tuple[int, bytes]: The line number (starting at 1) and the content of
+        every non-empty line.
+    """
+    line_number = 0
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if pending.strip():
+        yield line_number + 1, pending
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    Formats a validation error as a single line.
+
+    Args:
+        error (ValidationError): The validation error.
+
+    Returns:
+        str: The location and message of every error.
+    """
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+async def insert_documents(
+    model: type[Document], documents: List[Document]
+) -> Dict[int, str]:
+    """
+    Inserts documents with one unordered `insert_many`.
+
+    Args:
+        model (type[Document]): The model of the documents.
+        documents (List[Document]): The documents to insert.
+
+    Returns:
+        Dict[int, str]: The error of each document that was not inserted,
+        indexed by its position in the list.
+    """
+    for document in documents:
+        draw_created_nonce(document)
+    try:
+        await model.insert_many(documents, ordered=False)
+    except BulkWriteError as error:
+        return {
+            write_error["index"]: (
+                resources.get("bulk.duplicate")
+                if write_error["code"] == DUPLICATE_KEY_ERROR
+                else write_error["errmsg"]
+            )
+            for write_error in error.details["writeErrors"]
+        }
+    return {}
+
+
+def _reject(
+    batch: List[tuple[int, Document]], rejected: Dict[int, str], report: dict
+) -> List[tuple[int, Document]]:
+    for index in sorted(rejected):
+        report["errors"].append(
+            {"line": batch[index][0], "error": rejected[index]}
+        )
+    return [row for i, row in enumerate(batch) if i not in rejected]
+
+
+async def _insert_batch(
+    model: type[Document],
+    batch: List[tuple[int, Document]],
+    report: dict,
+    check_batch: Optional[BatchCheck],
+    write_batch: Optional[BatchWrite],
+):
+    if check_batch:
+        rejected = await check_batch([document for _, document in batch])
+        batch = _reject(batch, rejected, report)
+    if not batch:
+        return
+
+    write = write_batch or partial(insert_documents, model)
+    rejected = await write([document for _, document in batch])
+    report["inserted"] += len(_reject(batch, rejected, report))
+
+
+async def bulk_insert(
+    model: type[Document],
+    chunks: AsyncIterator[bytes],
+    check_batch: Optional[BatchCheck] = None,
+    batch_size: Optional[int] = None,
+    write_batch: Optional[BatchWrite] = None,
+) -> dict:
+    """
+    Inserts the documents of an NDJSON stream in batches.
+
+    Lines are parsed and validated against the model as they arrive, and
+    every BULK_BATCH_SIZE valid documents are written with one unordered
+    `insert_many`, so invalid or duplicate rows never stop the import and
+    the body is never held in memory as a whole.
+
+    Args:
+        model (type[Document]): The model of the imported documents.
+        chunks (AsyncIterator[bytes]): The NDJSON body.
+        check_batch (Optional[BatchCheck]): Extra validation that needs the
+        database, done once per batch.
+        batch_size (Optional[int]): Documents per write. Default is the
+        BULK_BATCH_SIZE setting.
+        write_batch (Optional[BatchWrite]): Writes the batches instead of
+        `insert_many`, for documents stored in another layout.
+
+    Returns:
+        dict: The number of inserted documents and the errors of the rejected
+        rows, with their line numbers.
+    """
+    batch_size = batch_size or get_settings().BULK_BATCH_SIZE
+    report = {"inserted": 0, "errors": []}
+    batch = []
+    async for line_number, line in iter_ndjson(chunks):
+        try:
+            batch.append((line_number, model.model_validate_json(line)))
+        except ValidationError as error:
+            report["errors"].append(
+                {"line": line_number, "error": validation_message(error)}
+            )
+            continue
+
+        if len(batch) >= batch_size:
+            await _insert_batch(
+                model, batch, report, check_batch, write_batch
+            )
+            batch = []
+
+    if batch:
+        await _insert_batch(model, batch, report, check_batch, write_batch)
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
@@ -0,0 +1,211 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from config import metrics
+
+# Returned by TTLCache.get when the key is not cached. A cached None means
+# the key is known not to exist (negative caching).
+NOT_CACHED = object()
+
+
+class CountCache:
+    """
+    A cached document count, kept up to date by the writers and refreshed
+    from the database once its TTL expires.
+
+    Attributes:
+        name (str): The prefix of the metrics of this cache.
+        ttl (float): Seconds the count is trusted before being refreshed.
+    """
+
+    def __init__(self, name: str, ttl: float):
+        """
+        Initializes an empty count cache, loaded on the first read.
+
+        Args:
+            name (str): The prefix of the metrics of this cache.
+            ttl (float): Seconds the count is trusted before being refreshed.
+        """
+        self.name = name
+        self.ttl = ttl
+        self._value: Optional[int] = None
+        self._expires_at = 0.0
+
+    async def get(self, count: Callable[[], Awaitable[int]]) -> int:
+        """
+        Returns the cached count, calling `count` if it expired.
+
+        Args:
+            count (Callable[[], Awaitable[int]]): Counts the documents in the
+            database.
+
+        Returns:
+            int: The number of documents.
+        """
+        if self._value is not None and time.monotonic() < self._expires_at:
+            metrics.incr(f"{self.name}.hits")
+            return self._value
+
+        metrics.incr(f"{self.name}.misses")
+        self._value = await count()
+        self._expires_at = time.monotonic() + self.ttl
+        return self._value
+
+    def adjust(self, delta: int):
+        """
+        Applies a write to the cached count, if it is loaded.
+
+        Args:
+            delta (int): The number of documents inserted (positive) or
+            deleted (negative).
+        """
+        if self._value is not None:
+            self._value = max(0, self._value + delta)
+
+    def invalidate(self):
+        """
+        Discards the cached count, so the next read hits the database.
+        """
+        self._value = None
+
+
+class TTLCache:
+    """
+    A bounded in-process LRU cache whose entries expire after a TTL.
+
+    None values are cached too, with their own (usually shorter) TTL, to
+    remember keys that do not exist in the database.
+
+    Read-through callers take a `generation()` before reading the database
+    and pass it to `put`, which then drops the value if the key was
+    invalidated in the meantime, so a slow read cannot cache a stale value.
+
+    Attributes:
+        name (str): The prefix of the metrics of this cache.
+        max_size (int): The maximum number of entries.
+        ttl (float): Seconds an entry is kept.
+        negative_ttl (float): Seconds a None entry is kept.
+    """
+
+    def __init__(
+        self, name: str, max_size: int, ttl: float, negative_ttl: float
+    ):
+        """
+        Initializes an empty cache.
+
+        Args:
+            name (str): The prefix of the metrics of this cache.
+            max_size (int): The maximum number of entries.
+            ttl (float): Seconds an entry is kept.
+            negative_ttl (float): Seconds a None entry is kept.
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[Hashable, tuple] = OrderedDict()
+        self._generation = 0
+        # The generation of the last invalidation of each key, bounded like
+        # the entries. Every generation up to `_floor` is treated as
+        # invalidated, for the keys that were dropped from `_invalidated`.
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._floor = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the cached value of a key.
+
+        Args:
+            key (Hashable): The key.
+
+        Returns:
+            Any: The cached value (None for a missing key cached as such), or
+            NOT_CACHED if the key is not in the cache or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            metrics.incr(f"{self.name}.misses")
+            return NOT_CACHED
+
+        self._entries.move_to_end(key)
+        metrics.incr(f"{self.name}.hits")
+        return entry[0]
+
+    def generation(self) -> int:
+        """
+        Returns the current generation, to be passed to `put` after reading
+        the value from the database.
+
+        Returns:
+            int: The current generation.
+        """
+        return self._generation
+
+    def put(self, key: Hashable, value: Any, generation: int = None):
+        """
+        Caches a value, evicting the least recently used entries if the cache
+        is full.
+
+        Args:
+            key (Hashable): The key.
+            value (Any): The value, or None if the key does not exist.
+            generation (int): The generation taken before the value was read.
+            If the key was invalidated since, the value is not cached.
+        """
+        if generation is not None and (
+            generation <= self._floor
+            or self._invalidated.get(key, -1) >= generation
+        ):
+            metrics.incr(f"{self.name}.stale_puts")
+            return
+
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            metrics.incr(f"{self.name}.evictions")
+
+    def invalidate(self, key: Hashable):
+        """
+        Removes a key from the cache, if present.
+
+        Args:
+            key (Hashable): The key.
+        """
+        self._entries.pop(key, None)
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        self._generation += 1
+        while len(self._invalidated) > self.max_size:
+            _, dropped = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, dropped)
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        self._entries.clear()
+        self._invalidated.clear()
+        self._floor = self._generation
+        self._generation += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the cache size, its counters and its hit ratio.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        counters = metrics.snapshot(f"{self.name}.")
+        hits = counters.get(f"{self.name}.hits", 0)
+        lookups = hits + counters.get(f"{self.name}.misses", 0)
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_ratio": hits / lookups if lookups else None,
+            **counters,
+        }
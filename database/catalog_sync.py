@@ -0,0 +1,165 @@
+import hashlib
+import json
+from typing import Iterable, List, Optional
+
+from pydantic import ValidationError
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from config.config import get_settings
+from database.bulk import validation_message
+from database.facets import mark_facets_stale
+from database.favorite import delete_products_favorites
+from database.product import get_product_cache, get_product_count_cache
+from database.projection import model_fields
+from database.update import draw_created_nonce
+from models.product import Product
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+# Product fields that come from the feed. `revision` is managed by the API.
+# The hash of these fields is stored in the `content_hash` field of the
+# product document, which is not part of the Product model.
+CATALOG_FIELDS = [
+    field for field in model_fields(Product)
+    if field not in ("id", "revision")
+]
+
+
+def content_hash(product: Product) -> str:
+    """
+    Computes the hash of the catalog content of a product.
+
+    Args:
+        product (Product): The product.
+
+    Returns:
+        str: The SHA-256 hex digest of the catalog fields.
+    """
+    content = {field: getattr(product, field) for field in CATALOG_FIELDS}
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+async def stored_hashes() -> dict:
+    """
+    Loads the content hash of every stored product.
+
+    Returns:
+        dict: The content hash (None if unknown) by product ID.
+    """
+    cursor = Product.get_motor_collection().find({}, {"content_hash": 1})
+    return {
+        document["_id"]: document.get("content_hash")
+        async for document in cursor
+    }
+
+
+async def _write(operations: list, report: dict):
+    if operations:
+        await Product.get_motor_collection().bulk_write(
+            operations, ordered=False
+        )
+        report["batches"] += 1
+        operations.clear()
+
+
+async def sync_catalog(
+    lines: Iterable[str],
+    delete_missing: bool = True,
+    batch_size: Optional[int] = None,
+) -> dict:
+    """
+    Applies a product feed to the catalog, writing only what changed.
+
+    The feed is read line by line (one JSON product per line). Products whose
+    content hash matches the stored `content_hash` are not written; new and
+    changed products are written with unordered `bulk_write` batches.
+    Products of the catalog that are missing from the feed are deleted with
+    their favorites, unless the feed had invalid rows.
+
+    The product caches of this process are dropped after any write; other
+    workers see the changes when their cache entries expire.
+
+    Args:
+        lines (Iterable[str]): The NDJSON lines of the feed.
+        delete_missing (bool, optional): Delete the products missing from
+        the feed. Default is True.
+        batch_size (Optional[int]): Operations per write. Default is the
+        BULK_BATCH_SIZE setting.
+
+    Returns:
+        dict: The number of inserted, updated, deleted and unchanged
+        products, and the errors of the invalid rows with their line
+        numbers.
+    """
+    batch_size = batch_size or get_settings().BULK_BATCH_SIZE
+    report = {
+        "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0,
+        "batches": 0, "errors": [],
+    }
+    stored = await stored_hashes()
+    seen = set()
+    operations: List = []
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            product = Product.model_validate_json(line)
+        except ValidationError as error:
+            report["errors"].append(
+                {"line": line_number, "error": validation_message(error)}
+            )
+            continue
+
+        if product.id in seen:
+            report["errors"].append({
+                "line": line_number, "error": resources.get("bulk.duplicate")
+            })
+            continue
+        seen.add(product.id)
+
+        digest = content_hash(product)
+        fields = {field: getattr(product, field) for field in CATALOG_FIELDS}
+        fields["content_hash"] = digest
+        if product.id not in stored:
+            draw_created_nonce(product)
+            operations.append(
+                InsertOne({
+                    "_id": product.id,
+                    **fields,
+                    "revision": 0,
+                    "created_nonce": product.created_nonce,
+                })
+            )
+            report["inserted"] += 1
+        elif stored[product.id] != digest:
+            operations.append(UpdateOne(
+                {"_id": product.id},
+                {"$set": fields, "$inc": {"revision": 1}},
+            ))
+            report["updated"] += 1
+        else:
+            report["unchanged"] += 1
+
+        if len(operations) >= batch_size:
+            await _write(operations, report)
+
+    await _write(operations, report)
+
+    if delete_missing and not report["errors"]:
+        missing = [id for id in stored if id not in seen]
+        for start in range(0, len(missing), batch_size):
+            ids = missing[start:start + batch_size]
+            await delete_products_favorites(ids)
+            operations.append(DeleteMany({"_id": {"$in": ids}}))
+            await _write(operations, report)
+        report["deleted"] = len(missing)
+
+    if report["batches"]:
+        get_product_count_cache().invalidate()
+        get_product_cache().clear()
+        await mark_facets_stale()
+    return report
@@ -1,22 +1,73 @@
-from typing import List, Union
+from typing import List, Optional, Union
 
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo.errors import DuplicateKeyError
+
+from database.batch import find_by_ids, in_request_order
+from database.pagination import find_page
+from database.projection import build_projection, to_public
+from database.update import draw_created_nonce, update_document
 from models.client import Client
+from models.pagination import CursorPage
+from resources.resources import ResourceManager
 
+resources = ResourceManager()
 client_collection = Client
 
 
-async def list_clients() -> List[Client]:
+async def list_clients(fields: Optional[List[str]] = None) -> List[Client]:
     """
     Lists all available clients.
 
+    Args:
+        fields (Optional[List[str]]): Only fetch these fields. The clients
+        are then returned as dicts, without model validation.
+
     Returns:
         List[Client]: A list of Client objects representing
         all clients in the collection.
     """
+    if fields:
+        cursor = client_collection.get_motor_collection().find(
+            {}, build_projection(fields)
+        )
+        return [to_public(client) async for client in cursor]
+
     clients = await client_collection.find_all().to_list()
     return clients
 
 
+async def list_clients_page(
+    cursor: Optional[str],
+    page_size: int,
+    fields: Optional[List[str]] = None
+) -> CursorPage:
+    """
+    Lists clients with cursor (keyset) pagination.
+
+    Args:
+        cursor (Optional[str]): The cursor of the page, or None for the
+        first page.
+        page_size (int): The number of clients per page.
+        fields (Optional[List[str]]): Only fetch these fields. The clients
+        are then returned as dicts, without model validation.
+
+    Returns:
+        CursorPage: The clients of the page and the cursor of the next one.
+    """
+    clients, next_cursor = await find_page(
+        client_collection, {}, cursor, page_size, fields
+    )
+    if fields:
+        clients = [to_public(client) for client in clients]
+    return CursorPage(
+        page_size=page_size,
+        next_cursor=next_cursor,
+        items=clients,
+    )
+
+
 async def get_client(id: int) -> Client:
     """
     Retrieves a specific client by ID.
@@ -33,6 +84,20 @@ async def get_client(id: int) -> Client:
         return client
 
 
+async def get_clients_by_ids(ids: List[int]) -> dict:
+    """
+    Retrieves several clients by ID in a single query.
+
+    Args:
+        ids (List[int]): The IDs of the clients.
+
+    Returns:
+        dict: The found clients in the order of the IDs, and the IDs that
+        were not found.
+    """
+    return in_request_order(ids, await find_by_ids(client_collection, ids))
+
+
 async def add_client(new_client: Client) -> Client:
     """
     Adds a new client to the collection.
@@ -43,25 +108,39 @@ async def add_client(new_client: Client) -> Client:
 
     Returns:
         Client: The Client object that was created.
+
+    Raises:
+        HTTPException: If a client with the same ID or email already exists.
     """
-    client = await new_client.create()
+    draw_created_nonce(new_client)
+    try:
+        client = await new_client.create()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("client.client_already_exists")
+        )
     return client
 
 
-async def delete_client(id: int) -> bool:
+async def delete_client(
+    id: int, session: Optional[AsyncIOMotorClientSession] = None
+) -> bool:
     """
     Removes a client from the collection by ID.
 
     Args:
         id (int): The ID of the client to be removed.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
 
     Returns:
         bool: True if the client was found and removed, False otherwise.
     """
-    client = await client_collection.get(id)
-    if client:
-        await client.delete()
-        return True
+    result = await client_collection.get_motor_collection().delete_one(
+        {"_id": id}, session=session
+    )
+    return result.deleted_count > 0
 
 
 async def update_client(
@@ -73,18 +152,27 @@ async def update_client(
 
     Args:
         id (int): The ID of the client to be updated.
-        data (dict): A dictionary containing the fields and values to update.
+        data (dict): A dictionary containing the fields and values to update,
+        and optionally the expected revision of the client.
 
     Returns:
         Union[bool, Client]: The updated Client object if the operation is
         successful, or False if the client is not found.
+
+    Raises:
+        HTTPException: If another client already has the new email, or the
+        client was modified since the informed revision.
     """
-    des_body = {k: v for k, v in data.items() if v is not None}
-    update_query = {
-        "$set": {field: value for field, value in des_body.items()}
-    }
-    client = await client_collection.get(id)
-    if client:
-        await client.update(update_query)
-        return client
-    return False
+    try:
+        client = await update_document(
+            client_collection,
+            id,
+            data,
+            resources.get("client.revision_conflict").format(id)
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("client.client_already_exists")
+        )
+    return client or False
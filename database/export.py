@@ -0,0 +1,108 @@
+from typing import AsyncIterator, List, Optional
+
+from beanie import Document
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ASCENDING
+
+from database.projection import build_projection, to_public
+from models.client import Client
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+from models.product import Product
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+exportable_collections: dict[str, type[Document]] = {
+    "client": Client,
+    "product": Product,
+    "favorite": Favorite,
+    "client_favorites": ClientFavorites,
+}
+
+
+def get_exportable_model(collection: str) -> type[Document]:
+    """
+    Returns the document model of an exportable collection.
+
+    Args:
+        collection (str): The collection name (client, product, favorite
+        or client_favorites).
+
+    Returns:
+        type[Document]: The document model.
+
+    Raises:
+        HTTPException: If the collection can not be exported.
+    """
+    model = exportable_collections.get(collection)
+    if not model:
+        raise HTTPException(
+            status_code=404,
+            detail=resources.get("export.collection_not_found")
+            .format(collection)
+        )
+    return model
+
+
+def parse_after(model: type[Document], after: Optional[str]):
+    """
+    Parses the ID the export resumes after.
+
+    Args:
+        model (type[Document]): The exported document model.
+        after (Optional[str]): The last ID received by the client.
+
+    Returns:
+        The `_id` to resume after (ObjectId for favorites, int otherwise),
+        or None to start from the beginning.
+
+    Raises:
+        HTTPException: If the ID is not valid for the collection.
+    """
+    if after is None:
+        return None
+    try:
+        if model is Favorite:
+            return ObjectId(after)
+        return int(after)
+    except (InvalidId, ValueError):
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.invalid_cursor")
+        )
+
+
+async def export_documents(
+    model: type[Document],
+    fields: Optional[List[str]],
+    after=None,
+    batch_size: int = 1000,
+) -> AsyncIterator[dict]:
+    """
+    Streams the raw documents of a collection ordered by `_id`.
+
+    Documents are read from a MongoDB cursor `batch_size` at a time and are
+    not validated by the models, so memory use does not depend on the size
+    of the collection.
+
+    Args:
+        model (type[Document]): The document model to export.
+        fields (Optional[List[str]]): The fields to export, or None for all.
+        after (optional): The `_id` the export starts after.
+        batch_size (int, optional): Documents fetched per round trip.
+
+    Yields:
+        dict: The documents, with `_id` renamed to `id`.
+    """
+    query = {"_id": {"$gt": after}} if after is not None else {}
+    cursor = (
+        model.get_motor_collection()
+        .find(query, build_projection(fields))
+        .sort("_id", ASCENDING)
+        .batch_size(batch_size)
+    )
+    async for document in cursor:
+        yield to_public(document)
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
+from config import metrics
+from config.config import get_settings
+from models.facets import CATALOG_FACETS_ID, BrandTop, CatalogFacets
+from models.product import Product
+
+logger = logging.getLogger(__name__)
+
+facets_snapshot: "FacetsSnapshot" = None
+
+
+def facets_pipeline(boundaries: List[float], top_size: int) -> List[dict]:
+    """
+    Builds the aggregation that computes every facet in one pass.
+
+    Args:
+        boundaries (List[float]): The lower bounds of the price buckets.
+        top_size (int): The number of products of each leaderboard.
+
+    Returns:
+        List[dict]: The aggregation pipeline.
+    """
+    return [{"$facet": {
+        "total": [{"$count": "count"}],
+        "brands": [
+            {"$group": {"_id": "$brand", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ],
+        "prices": [{"$bucket": {
+            "groupBy": "$price",
+            "boundaries": boundaries,
+            # Prices above the last boundary fall in the last bucket
+            "default": boundaries[-1],
+            "output": {"count": {"$sum": 1}},
+        }}],
+        "top": [
+            {"$match": {"reviewScore": {"$ne": None}}},
+            {"$sort": {"brand": 1, "reviewScore": -1, "_id": 1}},
+            {"$group": {"_id": "$brand", "products": {"$push": {
+                "id": "$_id",
+                "title": "$title",
+                "price": "$price",
+                "reviewScore": "$reviewScore",
+            }}}},
+            {"$project": {"products": {"$slice": ["$products", top_size]}}},
+            {"$sort": {"_id": 1}},
+        ],
+    }}]
+
+
+async def compute_facets() -> dict:
+    """
+    Computes the catalog facets from the product collection.
+
+    Returns:
+        dict: The fields of CatalogFacets holding the facets.
+    """
+    settings = get_settings()
+    boundaries = sorted(settings.FACETS_PRICE_BOUNDARIES)
+    cursor = Product.get_motor_collection().aggregate(
+        facets_pipeline(boundaries, settings.FACETS_TOP_SIZE),
+        allowDiskUse=True,
+    )
+    result = (await cursor.to_list(1))[0]
+
+    counts = {bucket["_id"]: bucket["count"] for bucket in result["prices"]}
+    upper = boundaries[1:] + [None]
+    return {
+        "total_products": (
+            result["total"][0]["count"] if result["total"] else 0
+        ),
+        "brands": [
+            {"brand": brand["_id"], "count": brand["count"]}
+            for brand in result["brands"]
+        ],
+        "price_histogram": [
+            {"min": low, "max": high, "count": counts.get(low, 0)}
+            for low, high in zip(boundaries, upper)
+        ],
+        "top_rated": [
+            {"brand": top["_id"], "products": top["products"]}
+            for top in result["top"]
+        ],
+    }
+
+
+async def mark_facets_stale():
+    """
+    Records a product write, so the next refresh check recomputes the
+    facets.
+    """
+    await CatalogFacets.get_motor_collection().update_one(
+        {"_id": CATALOG_FACETS_ID}, {"$inc": {"version": 1}}, upsert=True
+    )
+
+
+def note_product_write():
+    """
+    Records a product write made by this worker, without any I/O.
+
+    The facets are marked stale by the next refresh of this worker, so
+    product writes never wait for it.
+    """
+    get_facets_snapshot().pending_writes = True
+
+
+async def refresh_facets(force: bool = False) -> CatalogFacets:
+    """
+    Recomputes the materialized facets if products were written since the
+    last refresh.
+
+    The product writes noted by this worker are published first. The
+    version is read before the facets are computed, so a write that happens
+    during the computation triggers the next refresh.
+
+    Args:
+        force (bool, optional): Recompute even if no product was written.
+
+    Returns:
+        CatalogFacets: The current facets, also published to the in-memory
+        snapshot of this worker.
+    """
+    snapshot = get_facets_snapshot()
+    if snapshot.pending_writes:
+        snapshot.pending_writes = False
+        await mark_facets_stale()
+
+    collection = CatalogFacets.get_motor_collection()
+    stored = await collection.find_one({"_id": CATALOG_FACETS_ID}) or {}
+    version = stored.get("version", 0)
+    if force or stored.get("refreshed_version") != version:
+        stored = await collection.find_one_and_update(
+            {"_id": CATALOG_FACETS_ID},
+            {"$set": {
+                **await compute_facets(),
+                "refreshed_version": version,
+                "refreshed_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        metrics.incr("facets.refreshes")
+
+    facets = CatalogFacets.model_validate(stored)
+    snapshot.publish(facets)
+    return facets
+
+
+async def run_facets_refresher():
+    """
+    Refreshes the facets every FACETS_REFRESH_INTERVAL seconds, until
+    cancelled.
+    """
+    while True:
+        await asyncio.sleep(get_settings().FACETS_REFRESH_INTERVAL)
+        try:
+            await refresh_facets()
+        except Exception:
+            # The previous facets are still served, try again later
+            logger.exception("Catalog facets refresh failed")
+
+
+class FacetsSnapshot:
+    """
+    The catalog facets held in memory by this worker.
+
+    Readers never query the database while the snapshot is fresh, and the
+    leaderboards are indexed by brand.
+
+    Attributes:
+        ttl (float): Seconds the snapshot is served before it is reloaded.
+        pending_writes (bool): If this worker wrote products since its last
+        refresh.
+    """
+
+    def __init__(self, ttl: float):
+        """
+        Initializes an empty snapshot, loaded on the first read.
+
+        Args:
+            ttl (float): Seconds the snapshot is served before it is
+            reloaded.
+        """
+        self.ttl = ttl
+        self.pending_writes = False
+        self.facets: Optional[CatalogFacets] = None
+        self._top_by_brand: dict = {}
+        self._loaded_at = 0.0
+
+    def publish(self, facets: CatalogFacets):
+        """
+        Replaces the snapshot.
+
+        Args:
+            facets (CatalogFacets): The current facets.
+        """
+        self.facets = facets
+        self._top_by_brand = {top.brand: top for top in facets.top_rated}
+        self._loaded_at = time.monotonic()
+
+    async def get(self) -> CatalogFacets:
+        """
+        Returns the facets, reloading them when the snapshot expired.
+
+        Facets that were never computed are computed on the spot.
+
+        Returns:
+            CatalogFacets: The catalog facets.
+        """
+        if (
+            self.facets is None
+            or time.monotonic() - self._loaded_at >= self.ttl
+        ):
+            metrics.incr("facets.reloads")
+            stored = await CatalogFacets.get(CATALOG_FACETS_ID)
+            if stored is None or stored.refreshed_at is None:
+                return await refresh_facets(force=True)
+            self.publish(stored)
+        return self.facets
+
+    async def top(self, brand: str) -> BrandTop:
+        """
+        Returns the leaderboard of a brand.
+
+        Args:
+            brand (str): The brand.
+
+        Returns:
+            BrandTop: The best rated products of the brand, empty if the
+            brand has no rated products.
+        """
+        await self.get()
+        return self._top_by_brand.get(
+            brand, BrandTop(brand=brand, products=[])
+        )
+
+
+def get_facets_snapshot() -> FacetsSnapshot:
+    """
+    Returns the process-wide facets snapshot.
+
+    Returns:
+        FacetsSnapshot: The facets snapshot of this worker.
+    """
+    global facets_snapshot
+    if facets_snapshot is None:
+        facets_snapshot = FacetsSnapshot(
+            get_settings().FACETS_REFRESH_INTERVAL
+        )
+    return facets_snapshot
@@ -1,26 +1,104 @@
-from typing import Optional
+import asyncio
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
 
 from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+import database.favorite_embedded as embedded
+from config.config import get_settings
+from database.bulk import DUPLICATE_KEY_ERROR, bulk_insert, insert_documents
 from database.client import client_collection
-from database.product import product_collection
+from database.favorite_migration import (mirror_changes, mirror_client_removed,
+                                         mirror_products_removed)
+from database.pagination import decode_cursor, encode_cursor, find_page
+from database.popularity import delete_popularity, increment_popularity
+from database.product import find_product, product_collection
 from models.favorite import Favorite
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
 favorites_collection = Favorite
 
+# Sort orders of the expanded favorites, by product field
+EXPANDED_SORTS = {
+    "price": {"product.price": ASCENDING, "_id": ASCENDING},
+    "-price": {"product.price": DESCENDING, "_id": ASCENDING},
+    "reviewScore": {"product.reviewScore": ASCENDING, "_id": ASCENDING},
+    "-reviewScore": {"product.reviewScore": DESCENDING, "_id": ASCENDING},
+}
 
-async def get_favorites(client_id: int) -> list[Favorite]:
+
+async def existing_ids(collection, ids: Iterable[int]) -> Set[int]:
+    """
+    Returns which of the given IDs exist in a collection, in one query.
+
+    Args:
+        collection: The document model to look up.
+        ids (Iterable[int]): The IDs to check.
+
+    Returns:
+        Set[int]: The IDs found.
+    """
+    cursor = collection.get_motor_collection().find(
+        {"_id": {"$in": list(ids)}}, {"_id": 1}
+    )
+    return {document["_id"] async for document in cursor}
+
+
+async def check_favorites_batch(favorites: List[Favorite]) -> Dict[int, str]:
+    """
+    Checks that the clients and products of a batch of favorites exist,
+    with a single query per collection.
+
+    Args:
+        favorites (List[Favorite]): The favorites to be inserted.
+
+    Returns:
+        Dict[int, str]: The error of each rejected favorite, indexed by its
+        position in the batch.
+    """
+    clients, products = await asyncio.gather(
+        existing_ids(
+            client_collection, {favorite.client_id for favorite in favorites}
+        ),
+        existing_ids(
+            product_collection, {favorite.product_id for favorite in favorites}
+        ),
+    )
+    errors = {}
+    for index, favorite in enumerate(favorites):
+        if favorite.client_id not in clients:
+            errors[index] = resources.get("favorites.client_not_found")\
+                .format(favorite.client_id)
+        elif favorite.product_id not in products:
+            errors[index] = resources.get("favorites.products_not_found")\
+                .format(favorite.product_id)
+    return errors
+
+
+async def get_favorites(
+    client_id: int,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None
+) -> dict:
     """
     Retrieves the list of favorite products for a client.
 
     Args:
         client (Client): The client whose favorites will be retrieved.
+        cursor (Optional[str]): The cursor of the page, when paginating.
+        page_size (Optional[int]): The number of favorites per page. If not
+        informed, all favorites are returned.
 
     Returns:
-        list[Favorite]: List of favorite products
+        dict: The client id, the favorite product ids and, when paginating,
+        the cursor of the next page.
     """
+    if embedded.embedded_storage():
+        return await embedded.get_favorites(client_id, cursor, page_size)
 
     # Verify if the client exists
     client = await client_collection.find_one({"_id": client_id})
@@ -30,6 +108,17 @@ async def get_favorites(client_id: int) -> list[Favorite]:
             detail=resources.get("client.not_found").format(client_id),
         )
 
+    if page_size:
+        favorites, next_cursor = await find_page(
+            favorites_collection, {"client_id": client_id}, cursor, page_size
+        )
+        return {
+            "client_id": client_id,
+            "favorites": [favorite.product_id for favorite in favorites],
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        }
+
     favorites = await favorites_collection\
         .find({"client_id": client_id}).to_list()
 
@@ -41,50 +130,275 @@ async def get_favorites(client_id: int) -> list[Favorite]:
     return response
 
 
-async def add_favorite(client_id: int, product_id: int) -> Favorite:
+async def iter_clients_by_product(
+    product_id: int,
+    after: Optional[int] = None,
+    limit: int = 0,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[int]:
     """
-    Adds a product to the client's list of favorites.
+    Iterates over the clients that favorited a product, in client ID order.
+
+    The query is covered by the (product_id, client_id) index, so only the
+    matching index entries are read.
 
     Args:
-        client (Client): The client adding the favorite.
-        product (Product): The product to be added as a favorite.
+        product_id (int): The ID of the product.
+        after (Optional[int]): Only clients with a greater ID.
+        limit (int, optional): The maximum number of clients, or 0 for all.
+        batch_size (Optional[int]): Clients fetched per round trip.
+
+    Yields:
+        int: The ID of each client.
+    """
+    if embedded.embedded_storage():
+        async for client_id in embedded.iter_clients_by_product(
+            product_id, after, limit, batch_size
+        ):
+            yield client_id
+        return
+
+    query = {"product_id": product_id}
+    if after is not None:
+        query["client_id"] = {"$gt": after}
+    cursor = favorites_collection.get_motor_collection()\
+        .find(query, {"_id": 0, "client_id": 1})\
+        .sort("client_id", ASCENDING)\
+        .limit(limit)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    async for favorite in cursor:
+        yield favorite["client_id"]
+
+
+async def get_clients_by_product(
+    product_id: int, cursor: Optional[str], page_size: int
+) -> dict:
+    """
+    Retrieves a page of the clients that favorited a product.
+
+    The page starts right after the client ID encoded in the cursor, so the
+    cost of a page does not depend on how deep it is. The product is only
+    looked up when the page is empty.
+
+    Args:
+        product_id (int): The ID of the product.
+        cursor (Optional[str]): The cursor of the page, or None for the
+        first page.
+        page_size (int): The number of clients per page.
 
     Returns:
-        Favorite: The favorite inclued
+        dict: The product id, the client ids of the page and the cursor of
+        the next page.
+
+    Raises:
+        HTTPException: If the product does not exist.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    client_ids = [
+        client_id async for client_id in iter_clients_by_product(
+            product_id, after, limit=page_size + 1
+        )
+    ]
+    if not client_ids:
+        await raise_if_product_not_found(product_id)
+
+    next_cursor = None
+    if len(client_ids) > page_size:
+        client_ids = client_ids[:page_size]
+        next_cursor = encode_cursor(client_ids[-1])
+    return {
+        "product_id": product_id,
+        "client_ids": client_ids,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+    }
+
+
+async def raise_if_product_not_found(product_id: int):
+    """
+    Checks that a product exists, through the product cache.
+
+    Args:
+        product_id (int): The ID of the product.
+
+    Raises:
+        HTTPException: If the product does not exist.
+    """
+    if await find_product(product_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=resources.get("favorites.products_not_found")
+            .format(product_id)
+        )
+
+
+async def get_expanded_favorites(
+    client_id: int,
+    sort: Optional[str] = None,
+    page: int = 1,
+    page_size: Optional[int] = None,
+) -> dict:
+    """
+    Retrieves the favorites of a client with the details of each product,
+    in a single aggregation.
+
+    Favorites of products that no longer exist are skipped, and are not
+    counted in the pages.
+
+    Each favorite has an opaque `version` of its product, which changes
+    whenever the product is updated, deleted or created again.
+
+    Args:
+        client_id (int): The ID of the client.
+        sort (Optional[str]): One of the keys of EXPANDED_SORTS. Default is
+        the order the favorites were added.
+        page (int, optional): The current page number. Default is 1.
+        page_size (Optional[int]): The number of favorites per page. If not
+        informed, all favorites are returned.
+
+    Returns:
+        dict: The client id, the favorites with their product details and,
+        when paginating, whether there is a next page.
+
+    Raises:
+        HTTPException: If the client does not exist.
     """
+    window = []
+    if page_size:
+        # One extra favorite tells if there is a next page
+        window = [
+            {"$skip": (page - 1) * page_size}, {"$limit": page_size + 1}
+        ]
+    join = [
+        {"$lookup": {
+            "from": product_collection.get_motor_collection().name,
+            "localField": "product_id",
+            "foreignField": "_id",
+            "as": "product",
+        }},
+        {"$unwind": "$product"},
+    ]
+    if embedded.embedded_storage():
+        collection = embedded.client_favorites_collection
+        pipeline = embedded.favorites_stages(client_id)
+    else:
+        collection = favorites_collection
+        pipeline = [{"$match": {"client_id": client_id}}]
+    # The page is cut after the join, so that the favorites of deleted
+    # products are skipped before they are counted
+    if sort:
+        pipeline += join + [{"$sort": EXPANDED_SORTS[sort]}] + window
+    else:
+        pipeline += [{"$sort": {"_id": ASCENDING}}] + join + window
+    pipeline.append({"$project": {
+        "_id": 0,
+        "product_id": 1,
+        "title": "$product.title",
+        "price": "$product.price",
+        "image": "$product.image",
+        "reviewScore": "$product.reviewScore",
+        # Changes with the product, for the ETag of the page
+        "version": {"$concat": [
+            {"$ifNull": ["$product.created_nonce", ""]},
+            ".",
+            {"$toString": {"$ifNull": ["$product.revision", 0]}},
+        ]},
+    }})
+
+    favorites = await collection.get_motor_collection()\
+        .aggregate(pipeline).to_list(None)
+
+    # A client with favorites exists, only an empty result needs a check
+    if not favorites:
+        await embedded.raise_if_client_not_found(client_id)
+
+    response = {"client_id": client_id, "favorites": favorites}
+    if page_size:
+        response.update({
+            "favorites": favorites[:page_size],
+            "page": page,
+            "page_size": page_size,
+            "has_next": len(favorites) > page_size,
+        })
+    return response
+
 
-    # Validate if the client exists
-    client_exists = await client_collection.get(client_id)
-    if not client_exists:
+async def raise_if_client_or_product_not_found(
+    client_id: int, product_id: int
+):
+    """
+    Checks concurrently that the client and the product of a favorite
+    exist, the product through the product cache.
+
+    Args:
+        client_id (int): The ID of the client.
+        product_id (int): The ID of the product.
+
+    Raises:
+        HTTPException: If the client or the product does not exist.
+    """
+    client, product = await asyncio.gather(
+        client_collection.get_motor_collection().find_one(
+            {"_id": client_id}, {"_id": 1}
+        ),
+        find_product(product_id),
+    )
+    if not client:
         raise HTTPException(
             status_code=404,
             detail=resources.get("favorites.client_not_found")
             .format(client_id)
         )
-
-    # Validate if the product exists
-    product_exists = await product_collection.get(product_id)
-    if not product_exists:
+    if not product:
         raise HTTPException(
             status_code=404,
             detail=resources.get("favorites.products_not_found")
             .format(product_id)
         )
 
-    # Check if the favorite already exists
-    existing_favorite = await favorites_collection.find_one(
-        {"client_id": client_id, "product_id": product_id}
-    )
-    if existing_favorite:
+
+async def add_favorite(client_id: int, product_id: int) -> Favorite:
+    """
+    Adds a product to the client's list of favorites.
+
+    The client and the product are checked concurrently, the product
+    through the cache, before the favorite is inserted, so the critical
+    path stays about one round trip without ever storing an invalid
+    favorite. Duplicates are rejected by the unique (client_id, product_id)
+    index. The favorite counter of the product is incremented once the
+    favorite is added.
+
+    Args:
+        client (Client): The client adding the favorite.
+        product (Product): The product to be added as a favorite.
+
+    Returns:
+        Favorite: The favorite inclued
+
+    Raises:
+        HTTPException: If the client or the product does not exist, or the
+        product is already a favorite of the client.
+    """
+
+    await raise_if_client_or_product_not_found(client_id, product_id)
+    if embedded.embedded_storage():
+        new_favorite = await embedded.add_favorite(client_id, product_id)
+        await mirror_changes(client_id, [product_id], [])
+        await increment_popularity({product_id: 1})
+        return new_favorite
+
+    new_favorite = Favorite(client_id=client_id, product_id=product_id)
+    try:
+        await new_favorite.create()
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=409,
             detail=resources.get("favorites.already_exists")
             .format(product_id)
         )
-
-    # Create the favorite
-    new_favorite = Favorite(client_id=client_id, product_id=product_id)
-    await new_favorite.create()
+    await mirror_changes(client_id, [product_id], [])
+    await increment_popularity({product_id: 1})
     return new_favorite
 
 
@@ -99,49 +413,339 @@ async def delete_favorite(client_id: int, product_id: int) -> bool:
     Returns:
         bool: The result of the operation.
     """
-
-    # Check if the favorite exists
-    favorite_to_delete = await favorites_collection.find_one(
+    if embedded.embedded_storage():
+        await embedded.delete_favorite(client_id, product_id)
+        await mirror_changes(client_id, [], [product_id])
+        await increment_popularity({product_id: -1})
+        return True
+
+    # Only the request that actually removes the favorite counts it
+    result = await favorites_collection.get_motor_collection().delete_one(
         {"client_id": client_id, "product_id": product_id}
     )
-    if not favorite_to_delete:
+    if result.deleted_count != 1:
         raise HTTPException(
             status_code=404,
             detail=resources.get("favorites.not_found_for_product")
             .format(product_id)
         )
-
-    # Remove the favorite
-    await favorite_to_delete.delete()
+    await mirror_changes(client_id, [], [product_id])
+    await increment_popularity({product_id: -1})
 
     return True
 
 
+async def delete_client_favorites(
+    client_id: int, session: Optional[AsyncIOMotorClientSession] = None
+) -> List[int]:
+    """
+    Removes all the favorite documents of a client.
+
+    The product IDs are read just before the removal, so that the
+    favorite counters of the products can be decremented.
+
+    Args:
+        client_id (int): The ID of the client.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+
+    Returns:
+        List[int]: The removed favorite product IDs.
+    """
+    collection = favorites_collection.get_motor_collection()
+    favorites = await collection.find(
+        {"client_id": client_id}, {"product_id": 1}, session=session
+    ).to_list(None)
+    # A single delete_many, so no favorite of the client is left behind;
+    # one added between the two calls is counted by the reconciliation
+    await collection.delete_many({"client_id": client_id}, session=session)
+    return [favorite["product_id"] for favorite in favorites]
+
+
 async def delete_all_favorites(
     client_id: Optional[int] = None,
-    product_id: Optional[int] = None
-) -> bool:
+    product_id: Optional[int] = None,
+    session: Optional[AsyncIOMotorClientSession] = None
+) -> int:
     """
     Removes all products from the clientes or products from the favorites list.
 
     Args:
         client (Client): The client removing the favorite.
         product (Product): The product to be removed from favorites.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
 
     Returns:
-        bool: The result of the operation.
+        int: The number of favorites removed.
     """
+    if client_id:
+        if embedded.embedded_storage():
+            product_ids = await embedded.delete_client_favorites(
+                client_id, session
+            )
+        else:
+            product_ids = await delete_client_favorites(client_id, session)
+        await mirror_client_removed(client_id, session)
+        await increment_popularity(
+            {product_id: -1 for product_id in product_ids}, session=session
+        )
+        return len(product_ids)
 
     # Antes de excluir o produto é necessário excluir os favoritos dele
-    # Fazendo sem transação por não ter os replicasets configurados
-    query = {}
-    if client_id:
-        query = {"client_id": client_id}
-    elif product_id:
-        query = {"product_id": product_id}
+    return await delete_products_favorites([product_id], session=session)
 
-    favorites = await favorites_collection.find_many(query).to_list()
-    for favorite in favorites:
-        await favorite.delete()
 
-    return True
+async def delete_products_favorites(
+    product_ids: List[int],
+    session: Optional[AsyncIOMotorClientSession] = None
+) -> int:
+    """
+    Removes products from the favorites of every client, with their
+    favorite counters.
+
+    Args:
+        product_ids (List[int]): The IDs of the removed products.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+
+    Returns:
+        int: The number of favorites removed (of clients that had one of
+        the products, with the embedded storage).
+    """
+    await delete_popularity(product_ids, session=session)
+    await mirror_products_removed(product_ids, session=session)
+    if embedded.embedded_storage():
+        return await embedded.delete_products_favorites(
+            product_ids, session=session
+        )
+
+    result = await favorites_collection.get_motor_collection().delete_many(
+        {"product_id": {"$in": product_ids}}, session=session
+    )
+    return result.deleted_count
+
+
+async def stored_product_ids(client_id: int) -> List[int]:
+    """
+    Retrieves the favorite product IDs of a client, in the order they were
+    added.
+
+    Args:
+        client_id (int): The ID of the client.
+
+    Returns:
+        List[int]: The favorite product IDs.
+    """
+    if embedded.embedded_storage():
+        return await embedded.stored_product_ids(client_id)
+    cursor = favorites_collection.get_motor_collection().find(
+        {"client_id": client_id}, {"product_id": 1}
+    ).sort("_id", ASCENDING)
+    return [favorite["product_id"] async for favorite in cursor]
+
+
+async def apply_favorite_changes(
+    client_id: int, stored: List[int], added: List[int], removed: List[int]
+) -> Tuple[List[int], List[int]]:
+    """
+    Adds and removes favorites of a client, with one unordered
+    `insert_many` and concurrent deletes, or a single guarded update of the
+    embedded favorites.
+
+    Args:
+        client_id (int): The ID of the client.
+        stored (List[int]): The favorite product IDs the changes are based
+        on.
+        added (List[int]): The product IDs to add, none of them a favorite
+        yet.
+        removed (List[int]): The product IDs to remove.
+
+    Returns:
+        Tuple[List[int], List[int]]: The product IDs actually added and
+        removed, without the ones added or removed concurrently by another
+        request.
+
+    Raises:
+        HTTPException: If the embedded favorites of the client changed
+        concurrently.
+    """
+    if embedded.embedded_storage():
+        await embedded.apply_changes(client_id, stored, added, removed)
+        return added, removed
+
+    collection = favorites_collection.get_motor_collection()
+    # Only the request that actually removes a favorite counts it, as in
+    # `delete_favorite`
+    results = await asyncio.gather(*(
+        collection.delete_one(
+            {"client_id": client_id, "product_id": product_id}
+        )
+        for product_id in removed
+    ))
+    removed = [
+        product_id for product_id, result in zip(removed, results)
+        if result.deleted_count == 1
+    ]
+    if not added:
+        return added, removed
+
+    try:
+        await collection.insert_many([
+            {"client_id": client_id, "product_id": product_id}
+            for product_id in added
+        ], ordered=False)
+    except BulkWriteError as error:
+        # Favorites added concurrently by another request are kept, and
+        # were counted by that request
+        errors = error.details["writeErrors"]
+        if any(e["code"] != DUPLICATE_KEY_ERROR for e in errors):
+            raise
+        duplicates = {e["index"] for e in errors}
+        added = [
+            product_id for index, product_id in enumerate(added)
+            if index not in duplicates
+        ]
+    return added, removed
+
+
+async def update_favorites(
+    client_id: int, product_ids: List[int], mode: str
+) -> dict:
+    """
+    Adds, removes or replaces several favorites of a client at once.
+
+    The client, the submitted products and the stored favorites are read
+    concurrently, with a single `$in` query for the products, and the
+    difference is written by `apply_favorite_changes`. The favorite
+    counters follow the favorites actually added and removed, so a change
+    made concurrently by another request is not counted twice.
+
+    Args:
+        client_id (int): The ID of the client.
+        product_ids (List[int]): The submitted product IDs.
+        mode (str): "add" to add the products, "remove" to remove them, or
+        "replace" to make them the exact set of favorites of the client.
+
+    Returns:
+        dict: The client id, the added and removed product IDs, the
+        submitted IDs of products that do not exist (never added) and the
+        number of favorites of the client.
+
+    Raises:
+        HTTPException: If the client does not exist, too many products were
+        submitted, the client would have more favorites than allowed by the
+        embedded storage, or its embedded favorites changed meanwhile.
+    """
+    max_ids = get_settings().FAVORITES_MAX_PER_CLIENT
+    product_ids = list(dict.fromkeys(product_ids))
+    if len(product_ids) > max_ids:
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.too_many_ids").format(max_ids)
+        )
+
+    # Removed products do not need to exist
+    checked_ids = [] if mode == "remove" else product_ids
+    client, products, stored = await asyncio.gather(
+        client_collection.get_motor_collection().find_one(
+            {"_id": client_id}, {"_id": 1}
+        ),
+        existing_ids(product_collection, checked_ids),
+        stored_product_ids(client_id),
+    )
+    if not client:
+        raise HTTPException(
+            status_code=404,
+            detail=resources.get("favorites.client_not_found")
+            .format(client_id)
+        )
+
+    stored_set = set(stored)
+    missing = []
+    if mode == "remove":
+        added = []
+        removed = [id for id in product_ids if id in stored_set]
+    else:
+        missing = [id for id in product_ids if id not in products]
+        added = [
+            id for id in product_ids if id in products and id not in stored_set
+        ]
+        removed = []
+        if mode == "replace":
+            submitted = set(product_ids)
+            removed = [id for id in stored if id not in submitted]
+
+    count = len(stored) + len(added) - len(removed)
+    if embedded.embedded_storage() and count > max_ids:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("favorites.limit_reached")
+            .format(client_id, max_ids)
+        )
+
+    added, removed = await apply_favorite_changes(
+        client_id, stored, added, removed
+    )
+    await mirror_changes(client_id, added, removed)
+    await increment_popularity({
+        **{product_id: 1 for product_id in added},
+        **{product_id: -1 for product_id in removed},
+    })
+    return {
+        "client_id": client_id,
+        "added": added,
+        "removed": removed,
+        "missing": missing,
+        "favorites_count": count,
+    }
+
+
+async def write_favorites_batch(favorites: List[Favorite]) -> Dict[int, str]:
+    """
+    Writes a batch of imported favorites to the configured storage, and
+    increments the favorite counters of their products.
+
+    Args:
+        favorites (List[Favorite]): The favorites to add.
+
+    Returns:
+        Dict[int, str]: The error of each favorite that was not added,
+        indexed by its position in the batch.
+    """
+    if embedded.embedded_storage():
+        rejected = await embedded.write_favorites_batch(favorites)
+    else:
+        rejected = await insert_documents(Favorite, favorites)
+    written: Dict[int, List[int]] = {}
+    for index, favorite in enumerate(favorites):
+        if index not in rejected:
+            written.setdefault(favorite.client_id, []).append(
+                favorite.product_id
+            )
+    for client_id, product_ids in written.items():
+        await mirror_changes(client_id, product_ids, [])
+    await increment_popularity(Counter(
+        product_id for product_ids in written.values()
+        for product_id in product_ids
+    ))
+    return rejected
+
+
+async def import_favorites(chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Imports favorites from an NDJSON stream into the configured storage.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The NDJSON body.
+
+    Returns:
+        dict: The number of imported favorites and the errors of the
+        rejected rows, with their line numbers.
+    """
+    return await bulk_insert(
+        Favorite,
+        chunks,
+        check_batch=check_favorites_batch,
+        write_batch=write_favorites_batch,
+    )
@@ -0,0 +1,382 @@
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config.config import get_settings
+from database.client import client_collection
+from database.pagination import decode_cursor, encode_cursor
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+client_favorites_collection = ClientFavorites
+
+
+def embedded_storage() -> bool:
+    """
+    Tells if the favorites are stored embedded in one document per client.
+
+    Returns:
+        bool: True with FAVORITES_STORAGE=embedded.
+    """
+    return get_settings().FAVORITES_STORAGE == "embedded"
+
+
+def favorites_stages(client_id: int) -> List[dict]:
+    """
+    Builds the aggregation stages that list the favorites of a client, one
+    document per favorite with its position as `_id`.
+
+    Args:
+        client_id (int): The ID of the client.
+
+    Returns:
+        List[dict]: The aggregation stages.
+    """
+    return [
+        {"$match": {"_id": client_id}},
+        {"$unwind": {
+            "path": "$product_ids", "includeArrayIndex": "position"
+        }},
+        {"$project": {"_id": "$position", "product_id": "$product_ids"}},
+    ]
+
+
+async def raise_if_client_not_found(client_id: int):
+    """
+    Checks that a client exists.
+
+    Args:
+        client_id (int): The ID of the client.
+
+    Raises:
+        HTTPException: If the client does not exist.
+    """
+    if not await client_collection.get_motor_collection().find_one(
+        {"_id": client_id}, {"_id": 1}
+    ):
+        raise HTTPException(
+            status_code=404,
+            detail=resources.get("client.not_found").format(client_id),
+        )
+
+
+async def get_favorites(
+    client_id: int,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None
+) -> dict:
+    """
+    Retrieves the favorite product IDs of a client with a single point
+    read.
+
+    Pages are sliced from the array by the database; the cursor holds the
+    position the next page starts at.
+
+    Args:
+        client_id (int): The ID of the client.
+        cursor (Optional[str]): The cursor of the page, when paginating.
+        page_size (Optional[int]): The number of favorites per page. If not
+        informed, all favorites are returned.
+
+    Returns:
+        dict: The client id, the favorite product ids and, when paginating,
+        the cursor of the next page.
+
+    Raises:
+        HTTPException: If the client does not exist.
+    """
+    projection = {"product_ids": 1}
+    start = 0
+    if page_size:
+        start = decode_cursor(cursor) if cursor else 0
+        if not isinstance(start, int) or start < 0:
+            start = 0
+        projection = {"product_ids": {"$slice": [start, page_size + 1]}}
+
+    document = await client_favorites_collection.get_motor_collection()\
+        .find_one({"_id": client_id}, projection)
+    if document is None:
+        await raise_if_client_not_found(client_id)
+    product_ids = (document or {}).get("product_ids", [])
+
+    if page_size:
+        next_cursor = None
+        if len(product_ids) > page_size:
+            next_cursor = encode_cursor(start + page_size)
+        return {
+            "client_id": client_id,
+            "favorites": product_ids[:page_size],
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        }
+    return {"client_id": client_id, "favorites": product_ids}
+
+
+async def iter_clients_by_product(
+    product_id: int,
+    after: Optional[int] = None,
+    limit: int = 0,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[int]:
+    """
+    Iterates over the clients that have a product among their embedded
+    favorites, in client ID order, from the multikey index on
+    (product_ids, _id).
+
+    Args:
+        product_id (int): The ID of the product.
+        after (Optional[int]): Only clients with a greater ID.
+        limit (int, optional): The maximum number of clients, or 0 for all.
+        batch_size (Optional[int]): Clients fetched per round trip.
+
+    Yields:
+        int: The ID of each client.
+    """
+    query = {"product_ids": product_id}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    cursor = client_favorites_collection.get_motor_collection()\
+        .find(query, {"_id": 1})\
+        .sort("_id", ASCENDING)\
+        .limit(limit)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    async for document in cursor:
+        yield document["_id"]
+
+
+async def add_favorite(client_id: int, product_id: int) -> Favorite:
+    """
+    Adds a product to the embedded favorites of a client.
+
+    The product is added with `$addToSet` only if it is not a favorite yet
+    and the array is not full. The client and the product are checked by
+    the caller beforehand.
+
+    Args:
+        client_id (int): The ID of the client.
+        product_id (int): The ID of the product.
+
+    Returns:
+        Favorite: The added favorite.
+
+    Raises:
+        HTTPException: If the product is already a favorite, or the client
+        has the maximum number of favorites.
+    """
+    max_favorites = get_settings().FAVORITES_MAX_PER_CLIENT
+    collection = client_favorites_collection.get_motor_collection()
+    try:
+        await collection.update_one(
+            {
+                "_id": client_id,
+                "product_ids": {"$ne": product_id},
+                f"product_ids.{max_favorites - 1}": {"$exists": False},
+            },
+            {"$addToSet": {"product_ids": product_id}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The filter failed on an existing document: duplicate or full
+        if await collection.find_one(
+            {"_id": client_id, "product_ids": product_id}, {"_id": 1}
+        ):
+            raise HTTPException(
+                status_code=409,
+                detail=resources.get("favorites.already_exists")
+                .format(product_id)
+            )
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("favorites.limit_reached")
+            .format(client_id, max_favorites)
+        )
+    return Favorite(client_id=client_id, product_id=product_id)
+
+
+async def delete_favorite(client_id: int, product_id: int) -> bool:
+    """
+    Removes a product from the embedded favorites of a client.
+
+    Args:
+        client_id (int): The ID of the client.
+        product_id (int): The ID of the product.
+
+    Returns:
+        bool: The result of the operation.
+
+    Raises:
+        HTTPException: If the product is not a favorite of the client.
+    """
+    result = await client_favorites_collection.get_motor_collection()\
+        .update_one(
+            {"_id": client_id, "product_ids": product_id},
+            {"$pull": {"product_ids": product_id}},
+        )
+    if not result.modified_count:
+        raise HTTPException(
+            status_code=404,
+            detail=resources.get("favorites.not_found_for_product")
+            .format(product_id)
+        )
+    return True
+
+
+async def delete_client_favorites(
+    client_id: int, session: Optional[AsyncIOMotorClientSession] = None
+) -> List[int]:
+    """
+    Removes all the embedded favorites of a client.
+
+    Args:
+        client_id (int): The ID of the client.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+
+    Returns:
+        List[int]: The removed favorite product IDs.
+    """
+    document = await client_favorites_collection.get_motor_collection()\
+        .find_one_and_delete({"_id": client_id}, session=session)
+    return (document or {}).get("product_ids", [])
+
+
+async def delete_products_favorites(
+    product_ids: List[int],
+    session: Optional[AsyncIOMotorClientSession] = None
+) -> int:
+    """
+    Removes products from the embedded favorites of every client.
+
+    Args:
+        product_ids (List[int]): The IDs of the removed products.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+
+    Returns:
+        int: The number of clients that had one of the products among their
+        favorites.
+    """
+    # Served by the multikey index on product_ids
+    result = await client_favorites_collection.get_motor_collection()\
+        .update_many(
+            {"product_ids": {"$in": product_ids}},
+            {"$pull": {"product_ids": {"$in": product_ids}}},
+            session=session,
+        )
+    return result.modified_count
+
+
+async def write_favorites_batch(favorites: List[Favorite]) -> Dict[int, str]:
+    """
+    Adds a batch of favorites to the embedded arrays, with one update per
+    client in a single `bulk_write`.
+
+    Args:
+        favorites (List[Favorite]): The favorites to add.
+
+    Returns:
+        Dict[int, str]: The error of each favorite that was not added
+        (duplicate, or over the maximum of the client), indexed by its
+        position in the batch.
+    """
+    max_favorites = get_settings().FAVORITES_MAX_PER_CLIENT
+    collection = client_favorites_collection.get_motor_collection()
+    current = {
+        document["_id"]: set(document["product_ids"])
+        async for document in collection.find(
+            {"_id": {"$in": list({f.client_id for f in favorites})}},
+            {"product_ids": 1},
+        )
+    }
+
+    errors = {}
+    added: Dict[int, List[int]] = {}
+    for index, favorite in enumerate(favorites):
+        product_ids = current.setdefault(favorite.client_id, set())
+        if favorite.product_id in product_ids:
+            errors[index] = resources.get("bulk.duplicate")
+        elif len(product_ids) >= max_favorites:
+            errors[index] = resources.get("favorites.limit_reached")\
+                .format(favorite.client_id, max_favorites)
+        else:
+            product_ids.add(favorite.product_id)
+            added.setdefault(favorite.client_id, []).append(
+                favorite.product_id
+            )
+
+    if added:
+        await collection.bulk_write([
+            UpdateOne(
+                {"_id": client_id},
+                {"$addToSet": {"product_ids": {"$each": product_ids}}},
+                upsert=True,
+            )
+            for client_id, product_ids in added.items()
+        ], ordered=False)
+    return errors
+
+
+async def stored_product_ids(client_id: int) -> List[int]:
+    """
+    Retrieves the embedded favorite product IDs of a client.
+
+    Args:
+        client_id (int): The ID of the client.
+
+    Returns:
+        List[int]: The favorite product IDs, in the order they were added.
+    """
+    document = await client_favorites_collection.get_motor_collection()\
+        .find_one({"_id": client_id}, {"product_ids": 1})
+    return (document or {}).get("product_ids", [])
+
+
+async def apply_changes(
+    client_id: int, stored: List[int], added: List[int], removed: List[int]
+):
+    """
+    Adds and removes favorites of a client with a single update.
+
+    The new array replaces the stored one only if the favorites did not
+    change since `stored` was read, so the changes are applied entirely or
+    not at all, and the counters of the products stay exact.
+
+    Args:
+        client_id (int): The ID of the client.
+        stored (List[int]): The favorite product IDs the changes are based
+        on, as returned by `stored_product_ids`.
+        added (List[int]): The product IDs to add, none of them in `stored`.
+        removed (List[int]): The product IDs to remove, all of them in
+        `stored`.
+
+    Raises:
+        HTTPException: If the favorites of the client changed concurrently.
+    """
+    if not added and not removed:
+        return
+
+    removed_ids = set(removed)
+    product_ids = [id for id in stored if id not in removed_ids] + added
+    try:
+        # A client without favorites may have no document yet: the upsert
+        # creates it, and fails on the `_id` if it was created meanwhile
+        result = await client_favorites_collection.get_motor_collection()\
+            .update_one(
+                {"_id": client_id, "product_ids": stored},
+                {"$set": {"product_ids": product_ids}},
+                upsert=not stored,
+            )
+        applied = result.matched_count or result.upserted_id is not None
+    except DuplicateKeyError:
+        applied = False
+    if not applied:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("favorites.changed").format(client_id)
+        )
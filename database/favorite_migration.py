@@ -0,0 +1,352 @@
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config.config import get_settings
+from database.bulk import DUPLICATE_KEY_ERROR
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+
+# Checkpoints of the migrations, one document per direction
+MIGRATION_STATE_COLLECTION = "migration_state"
+TO_EMBEDDED = "favorites_to_embedded"
+TO_DOCUMENTS = "favorites_to_documents"
+
+
+def _state_collection():
+    return Favorite.get_motor_collection().database[
+        MIGRATION_STATE_COLLECTION
+    ]
+
+
+async def _load_checkpoint(migration: str, restart: bool) -> Optional[dict]:
+    state = _state_collection()
+    if restart:
+        await state.delete_one({"_id": migration})
+        return None
+    return await state.find_one({"_id": migration})
+
+
+async def _save_checkpoint(migration: str, checkpoint: dict):
+    await _state_collection().update_one(
+        {"_id": migration}, {"$set": checkpoint}, upsert=True
+    )
+
+
+async def _clear_checkpoint(migration: str):
+    # A complete pass starts the next run from the beginning
+    await _state_collection().delete_one({"_id": migration})
+
+
+def _check_target(target: str):
+    # Copying the old layout over the live one would revert the favorites
+    # written since the switch, unless the old layout received them too
+    settings = get_settings()
+    live = settings.FAVORITES_STORAGE == target
+    if live and not settings.FAVORITES_DUAL_WRITE:
+        raise RuntimeError(
+            f"FAVORITES_STORAGE is already {target}: enable "
+            "FAVORITES_DUAL_WRITE to migrate to the storage in use"
+        )
+
+
+def dual_write() -> bool:
+    """
+    Tells if the favorites are also written to the storage that is not in
+    use, so that both layouts stay in sync during a migration.
+
+    Returns:
+        bool: True with FAVORITES_DUAL_WRITE enabled.
+    """
+    return get_settings().FAVORITES_DUAL_WRITE
+
+
+def _mirror_embedded() -> bool:
+    # The mirror is the layout that is not read
+    return get_settings().FAVORITES_STORAGE != "embedded"
+
+
+async def mirror_changes(
+    client_id: int, added: List[int], removed: List[int]
+):
+    """
+    Applies favorite changes of a client to the storage that is not in use,
+    with FAVORITES_DUAL_WRITE enabled.
+
+    Favorites already in the mirror are kept as they are, and the maximum
+    of favorites per client is not checked again.
+
+    Args:
+        client_id (int): The ID of the client.
+        added (List[int]): The added product IDs.
+        removed (List[int]): The removed product IDs.
+    """
+    if not dual_write() or not (added or removed):
+        return
+
+    if _mirror_embedded():
+        collection = ClientFavorites.get_motor_collection()
+        if removed:
+            await collection.update_one(
+                {"_id": client_id},
+                {"$pull": {"product_ids": {"$in": removed}}},
+            )
+        if added:
+            await collection.update_one(
+                {"_id": client_id},
+                {"$addToSet": {"product_ids": {"$each": added}}},
+                upsert=True,
+            )
+        return
+
+    collection = Favorite.get_motor_collection()
+    if removed:
+        await collection.delete_many(
+            {"client_id": client_id, "product_id": {"$in": removed}}
+        )
+    if added:
+        try:
+            await collection.insert_many([
+                {"client_id": client_id, "product_id": product_id}
+                for product_id in added
+            ], ordered=False)
+        except BulkWriteError as error:
+            errors = error.details["writeErrors"]
+            if any(e["code"] != DUPLICATE_KEY_ERROR for e in errors):
+                raise
+
+
+async def mirror_client_removed(
+    client_id: int, session: Optional[AsyncIOMotorClientSession] = None
+):
+    """
+    Removes every favorite of a client from the storage that is not in use,
+    with FAVORITES_DUAL_WRITE enabled.
+
+    Args:
+        client_id (int): The ID of the client.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+    """
+    if not dual_write():
+        return
+    if _mirror_embedded():
+        await ClientFavorites.get_motor_collection().delete_one(
+            {"_id": client_id}, session=session
+        )
+    else:
+        await Favorite.get_motor_collection().delete_many(
+            {"client_id": client_id}, session=session
+        )
+
+
+async def mirror_products_removed(
+    product_ids: List[int],
+    session: Optional[AsyncIOMotorClientSession] = None
+):
+    """
+    Removes products from the favorites of every client in the storage that
+    is not in use, with FAVORITES_DUAL_WRITE enabled.
+
+    Args:
+        product_ids (List[int]): The IDs of the removed products.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+    """
+    if not dual_write():
+        return
+    if _mirror_embedded():
+        await ClientFavorites.get_motor_collection().update_many(
+            {"product_ids": {"$in": product_ids}},
+            {"$pull": {"product_ids": {"$in": product_ids}}},
+            session=session,
+        )
+    else:
+        await Favorite.get_motor_collection().delete_many(
+            {"product_id": {"$in": product_ids}}, session=session
+        )
+
+
+async def migrate_to_embedded(
+    batch_size: Optional[int] = None, restart: bool = False
+) -> dict:
+    """
+    Synchronizes the embedded per-client arrays with the favorite documents.
+
+    Clients are read in ID order, and the array of each client is set to
+    its favorites in the order they were added; the arrays of the clients
+    without favorite documents are removed. A checkpoint is saved after
+    every batch and an interrupted migration resumes after it. A complete
+    pass clears the checkpoint, so running the migration again reconciles
+    every client, including the favorites added or removed behind the
+    checkpoint while the previous pass ran. The favorite documents are not
+    removed.
+
+    The favorite documents are the reference, so the migration must run
+    with FAVORITES_DUAL_WRITE enabled for the favorites written while it
+    runs or after the switch to be kept; it refuses to run against the
+    storage in use without it. A favorite written while its client is
+    copied may still be missed, and is copied by the next pass.
+
+    Args:
+        batch_size (Optional[int]): Favorites per batch. Default is the
+        BULK_BATCH_SIZE setting.
+        restart (bool, optional): Ignore the checkpoint and reconcile every
+        client again.
+
+    Returns:
+        dict: The number of copied favorites, removed client arrays and
+        batches.
+
+    Raises:
+        RuntimeError: If FAVORITES_STORAGE is already embedded and
+        FAVORITES_DUAL_WRITE is disabled.
+    """
+    _check_target("embedded")
+    batch_size = batch_size or get_settings().BULK_BATCH_SIZE
+    checkpoint = await _load_checkpoint(TO_EMBEDDED, restart)
+    report = {"migrated": 0, "removed": 0, "batches": 0}
+    source = Favorite.get_motor_collection()
+    target = ClientFavorites.get_motor_collection()
+
+    while True:
+        after = checkpoint["client_id"] if checkpoint else None
+        query = {} if after is None else {"client_id": {"$gt": after}}
+        favorites = await source.find(query)\
+            .sort([("client_id", ASCENDING), ("_id", ASCENDING)])\
+            .limit(batch_size)\
+            .to_list(batch_size)
+        if not favorites:
+            removed = {} if after is None else {"_id": {"$gt": after}}
+            result = await target.delete_many(removed)
+            report["removed"] += result.deleted_count
+            await _clear_checkpoint(TO_EMBEDDED)
+            return report
+
+        # The batch ends on a whole client
+        last = favorites[-1]
+        favorites += await source.find(
+            {"client_id": last["client_id"], "_id": {"$gt": last["_id"]}}
+        ).sort("_id", ASCENDING).to_list(None)
+
+        product_ids = {}
+        for favorite in favorites:
+            product_ids.setdefault(favorite["client_id"], []).append(
+                favorite["product_id"]
+            )
+        await target.bulk_write([
+            UpdateOne(
+                {"_id": client_id}, {"$set": {"product_ids": ids}},
+                upsert=True,
+            )
+            for client_id, ids in product_ids.items()
+        ], ordered=False)
+
+        # Clients of this range whose favorites were all removed
+        in_range = {"$lte": last["client_id"], "$nin": list(product_ids)}
+        if after is not None:
+            in_range["$gt"] = after
+        result = await target.delete_many({"_id": in_range})
+
+        checkpoint = {"client_id": last["client_id"]}
+        await _save_checkpoint(TO_EMBEDDED, checkpoint)
+        report["migrated"] += len(favorites)
+        report["removed"] += result.deleted_count
+        report["batches"] += 1
+
+
+async def migrate_to_documents(
+    batch_size: Optional[int] = None, restart: bool = False
+) -> dict:
+    """
+    Synchronizes the favorite documents with the embedded per-client arrays.
+
+    Clients are read in ID order. The favorites missing from the documents
+    are inserted in array order with unordered `insert_many`, and the
+    favorite documents that are not in the arrays are deleted. A checkpoint
+    is saved after every batch and an interrupted migration resumes after
+    it. A complete pass clears the checkpoint, so running the migration
+    again reconciles every client, including the favorites added or removed
+    behind the checkpoint while the previous pass ran. The embedded arrays
+    are not removed.
+
+    The embedded arrays are the reference, so the migration must run with
+    FAVORITES_DUAL_WRITE enabled for the favorites written while it runs
+    or after the switch to be kept; it refuses to run against the storage
+    in use without it. A favorite written while its client is copied may
+    still be missed, and is copied by the next pass.
+
+    Args:
+        batch_size (Optional[int]): Clients per batch. Default is the
+        BULK_BATCH_SIZE setting.
+        restart (bool, optional): Ignore the checkpoint and reconcile every
+        client again.
+
+    Returns:
+        dict: The number of copied and removed favorites, and of batches.
+
+    Raises:
+        RuntimeError: If FAVORITES_STORAGE is already documents and
+        FAVORITES_DUAL_WRITE is disabled.
+    """
+    _check_target("documents")
+    batch_size = batch_size or get_settings().BULK_BATCH_SIZE
+    checkpoint = await _load_checkpoint(TO_DOCUMENTS, restart)
+    report = {"migrated": 0, "removed": 0, "batches": 0}
+    source = ClientFavorites.get_motor_collection()
+    target = Favorite.get_motor_collection()
+
+    while True:
+        after = checkpoint["client_id"] if checkpoint else None
+        query = {} if after is None else {"_id": {"$gt": after}}
+        clients = await source.find(query)\
+            .sort("_id", ASCENDING)\
+            .limit(batch_size)\
+            .to_list(batch_size)
+        if not clients:
+            removed = {} if after is None else {"client_id": {"$gt": after}}
+            result = await target.delete_many(removed)
+            report["removed"] += result.deleted_count
+            await _clear_checkpoint(TO_DOCUMENTS)
+            return report
+
+        in_range = {"$lte": clients[-1]["_id"]}
+        if after is not None:
+            in_range["$gt"] = after
+        stored = {
+            (favorite["client_id"], favorite["product_id"]): favorite["_id"]
+            async for favorite in target.find(
+                {"client_id": in_range}, {"client_id": 1, "product_id": 1}
+            )
+        }
+        wanted = {
+            (client["_id"], product_id): None
+            for client in clients
+            for product_id in client.get("product_ids", [])
+        }
+        favorites = [
+            {"client_id": client_id, "product_id": product_id}
+            for client_id, product_id in wanted
+            if (client_id, product_id) not in stored
+        ]
+        inserted = len(favorites)
+        if favorites:
+            try:
+                await target.insert_many(favorites, ordered=False)
+            except BulkWriteError as error:
+                errors = error.details["writeErrors"]
+                if any(e["code"] != DUPLICATE_KEY_ERROR for e in errors):
+                    raise
+                inserted -= len(errors)
+
+        extra = [id for key, id in stored.items() if key not in wanted]
+        if extra:
+            await target.delete_many({"_id": {"$in": extra}})
+
+        checkpoint = {"client_id": clients[-1]["_id"]}
+        await _save_checkpoint(TO_DOCUMENTS, checkpoint)
+        report["migrated"] += inserted
+        report["removed"] += len(extra)
+        report["batches"] += 1
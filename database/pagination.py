@@ -0,0 +1,137 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Tuple, Union
+
+from beanie import Document
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ASCENDING
+
+from config.config import get_settings
+from database.projection import build_projection, strip_internal
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+
+def encode_cursor(last_id: Any) -> str:
+    """
+    Encodes the `_id` of the last item of a page as an opaque cursor.
+
+    Args:
+        last_id (Any): The `_id` of the last item (int or ObjectId).
+
+    Returns:
+        str: The cursor of the next page.
+    """
+    if isinstance(last_id, ObjectId):
+        value = {"oid": str(last_id)}
+    else:
+        value = {"id": last_id}
+    return base64.urlsafe_b64encode(
+        json.dumps(value, separators=(",", ":")).encode()
+    ).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    """
+    Decodes a cursor generated by `encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor.
+
+    Returns:
+        Any: The `_id` the next page starts after.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        value = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        if "oid" in value:
+            return ObjectId(value["oid"])
+        return value["id"]
+    except (
+        binascii.Error, ValueError, TypeError, KeyError, InvalidId
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.invalid_cursor")
+        )
+
+
+def resolve_page_size(page_size: Optional[int]) -> int:
+    """
+    Applies the default and the maximum page size from the settings.
+
+    Args:
+        page_size (Optional[int]): The requested page size.
+
+    Returns:
+        int: The page size to use.
+    """
+    settings = get_settings()
+    if not page_size:
+        return settings.PAGE_SIZE
+    return max(1, min(page_size, settings.MAX_PAGE_SIZE))
+
+
+async def find_page(
+    model: type[Document],
+    query: dict,
+    cursor: Optional[str],
+    page_size: int,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[Union[Document, dict]], Optional[str]]:
+    """
+    Fetches a page of documents ordered by `_id`.
+
+    The page starts right after the `_id` encoded in the cursor, so the
+    cost of a page does not depend on how deep it is.
+
+    Args:
+        model (type[Document]): The collection to query.
+        query (dict): The filter of the listing.
+        cursor (Optional[str]): The cursor of the page, or None for the
+        first page.
+        page_size (int): The number of documents per page.
+        fields (Optional[List[str]]): Only fetch these fields. The documents
+        are then returned as raw dicts, without model validation.
+
+    Returns:
+        Tuple[List[Union[Document, dict]], Optional[str]]: The documents of
+        the page and the cursor of the next page, or None if this is the
+        last page.
+    """
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+
+    if fields:
+        documents = await (
+            model.get_motor_collection()
+            .find(query, build_projection(fields))
+            .sort("_id", ASCENDING)
+            .limit(page_size + 1)
+            .to_list(page_size + 1)
+        )
+        documents = [strip_internal(document) for document in documents]
+    else:
+        documents = (
+            await model
+            .find(query)
+            .sort([("_id", ASCENDING)])
+            .limit(page_size + 1)
+            .to_list()
+        )
+    if len(documents) <= page_size:
+        return documents, None
+
+    documents = documents[:page_size]
+    last = documents[-1]
+    return documents, encode_cursor(
+        last["_id"] if isinstance(last, dict) else last.id
+    )
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, DESCENDING, DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import metrics
+from config.config import get_settings
+from database.bulk import DUPLICATE_KEY_ERROR
+from database.favorite_embedded import embedded_storage
+from database.product import get_products_by_ids
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+from models.popularity import ProductPopularity
+
+logger = logging.getLogger(__name__)
+
+popularity_collection = ProductPopularity
+
+
+async def increment_popularity(
+    changes: Dict[int, int],
+    session: Optional[AsyncIOMotorClientSession] = None
+):
+    """
+    Applies favorite count changes to the products with a single `$inc`
+    `bulk_write`.
+
+    Args:
+        changes (Dict[int, int]): The change of the favorite count of each
+        product ID.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the change is part of.
+    """
+    operations = [
+        UpdateOne(
+            {"_id": product_id}, {"$inc": {"favorites": change}}, upsert=True
+        )
+        for product_id, change in changes.items() if change
+    ]
+    if operations:
+        await popularity_collection.get_motor_collection().bulk_write(
+            operations, ordered=False, session=session
+        )
+
+
+async def delete_popularity(
+    product_ids: Iterable[int],
+    session: Optional[AsyncIOMotorClientSession] = None
+):
+    """
+    Removes the favorite counters of deleted products.
+
+    Args:
+        product_ids (Iterable[int]): The IDs of the deleted products.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
+    """
+    await popularity_collection.get_motor_collection().delete_many(
+        {"_id": {"$in": list(product_ids)}}, session=session
+    )
+
+
+async def count_favorites() -> Dict[int, int]:
+    """
+    Counts the favorites of every product from the configured storage.
+
+    Returns:
+        Dict[int, int]: The number of favorites of each favorited product.
+    """
+    if embedded_storage():
+        collection = ClientFavorites.get_motor_collection()
+        pipeline = [
+            {"$unwind": "$product_ids"},
+            {"$group": {"_id": "$product_ids", "favorites": {"$sum": 1}}},
+        ]
+    else:
+        collection = Favorite.get_motor_collection()
+        pipeline = [
+            {"$group": {"_id": "$product_id", "favorites": {"$sum": 1}}},
+        ]
+    cursor = collection.aggregate(pipeline, allowDiskUse=True)
+    return {count["_id"]: count["favorites"] async for count in cursor}
+
+
+async def reconcile_popularity() -> int:
+    """
+    Recomputes the favorite counters from the favorites and fixes the ones
+    that drifted.
+
+    The counters are read before the favorites are counted, only the ones
+    that differ are written, and each write only applies if the counter
+    still holds the value read, so an increment made during the recount is
+    never overwritten. A favorite written just before the counters are read
+    but counted just after may be counted twice; the next reconciliation
+    fixes it.
+
+    Returns:
+        int: The number of fixed counters.
+    """
+    collection = popularity_collection.get_motor_collection()
+    stored = {
+        counter["_id"]: counter["favorites"]
+        async for counter in collection.find({}, {"favorites": 1})
+    }
+    counts = await count_favorites()
+
+    operations = []
+    for product_id, favorites in stored.items():
+        if product_id not in counts:
+            operations.append(
+                DeleteOne({"_id": product_id, "favorites": favorites})
+            )
+        elif counts[product_id] != favorites:
+            operations.append(UpdateOne(
+                {"_id": product_id, "favorites": favorites},
+                {"$set": {"favorites": counts[product_id]}},
+            ))
+    for product_id, favorites in counts.items():
+        if product_id not in stored:
+            operations.append(UpdateOne(
+                {"_id": product_id},
+                {"$setOnInsert": {"favorites": favorites}},
+                upsert=True,
+            ))
+
+    batch_size = get_settings().BULK_BATCH_SIZE
+    for start in range(0, len(operations), batch_size):
+        try:
+            await collection.bulk_write(
+                operations[start:start + batch_size], ordered=False
+            )
+        except BulkWriteError as error:
+            # Counters created concurrently are fixed by the next run
+            if any(
+                write_error["code"] != DUPLICATE_KEY_ERROR
+                for write_error in error.details["writeErrors"]
+            ):
+                raise
+    metrics.incr("popularity.reconciled")
+    metrics.incr("popularity.fixed", len(operations))
+    return len(operations)
+
+
+async def run_popularity_reconciler():
+    """
+    Reconciles the favorite counters every POPULARITY_RECONCILE_INTERVAL
+    seconds, until cancelled.
+    """
+    while True:
+        await asyncio.sleep(get_settings().POPULARITY_RECONCILE_INTERVAL)
+        try:
+            await reconcile_popularity()
+        except Exception:
+            # The counters keep being incremented, try again later
+            logger.exception("Product popularity reconciliation failed")
+
+
+async def get_popular_products(limit: int) -> List[dict]:
+    """
+    Retrieves the most favorited products, most favorited first.
+
+    The counters are read in order from the `favorites` index, and the
+    products through the product cache.
+
+    Args:
+        limit (int): The number of products.
+
+    Returns:
+        List[dict]: The products with their number of favorites.
+    """
+    counters = await popularity_collection.get_motor_collection()\
+        .find({"favorites": {"$gt": 0}})\
+        .sort([("favorites", DESCENDING), ("_id", ASCENDING)])\
+        .limit(limit)\
+        .to_list(limit)
+    products = await get_products_by_ids(
+        [counter["_id"] for counter in counters]
+    )
+    by_id = {product.id: product for product in products["items"]}
+    return [
+        {"product": by_id[counter["_id"]], "favorites": counter["favorites"]}
+        for counter in counters if counter["_id"] in by_id
+    ]
@@ -1,16 +1,94 @@
 from math import ceil
-from typing import Union
+from typing import List, Optional, Union
 
 from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
 
-from models.product import PaginatedProducts, Product
+from config.config import get_settings
+from database.batch import find_by_ids, in_request_order
+from database.cache import NOT_CACHED, CountCache, TTLCache
+from database.facets import note_product_write
+from database.pagination import find_page
+from database.projection import build_projection, strip_internal
+from database.update import draw_created_nonce, update_document
+from models.pagination import CursorPage
+from models.product import PaginatedProducts, Product, ProductSearchResults
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
 product_collection = Product
+product_count: CountCache = None
+product_cache: TTLCache = None
 
+# Search sort orders. Each one is the order (or the reverse order) of one of
+# the compound indexes of Product, `_id` included.
+SEARCH_SORTS = {
+    "price": [("price", ASCENDING), ("_id", ASCENDING)],
+    "-price": [("price", DESCENDING), ("_id", DESCENDING)],
+    "reviewScore": [("reviewScore", ASCENDING), ("_id", DESCENDING)],
+    "-reviewScore": [("reviewScore", DESCENDING), ("_id", ASCENDING)],
+}
 
-async def list_products(page: int, page_size: int = 10) -> PaginatedProducts:
+
+def get_product_count_cache() -> CountCache:
+    """
+    Returns the cache of the number of products.
+
+    Returns:
+        CountCache: The product count cache.
+    """
+    global product_count
+    if product_count is None:
+        product_count = CountCache(
+            "product_count", get_settings().PRODUCT_COUNT_TTL
+        )
+    return product_count
+
+
+def get_product_cache() -> TTLCache:
+    """
+    Returns the read-through cache of products by ID.
+
+    Returns:
+        TTLCache: The product cache.
+    """
+    global product_cache
+    if product_cache is None:
+        settings = get_settings()
+        product_cache = TTLCache(
+            "product_cache",
+            settings.PRODUCT_CACHE_SIZE,
+            settings.PRODUCT_CACHE_TTL,
+            settings.PRODUCT_CACHE_NEGATIVE_TTL,
+        )
+    return product_cache
+
+
+async def count_products() -> int:
+    """
+    Counts the products, from the count cache when possible.
+
+    With PRODUCT_COUNT_ESTIMATED, the count comes from the collection
+    metadata (`estimated_document_count`) instead of an index scan.
+
+    Returns:
+        int: The number of products.
+    """
+    collection = product_collection.get_motor_collection()
+    if get_settings().PRODUCT_COUNT_ESTIMATED:
+        return await get_product_count_cache().get(
+            collection.estimated_document_count
+        )
+    return await get_product_count_cache().get(
+        lambda: collection.count_documents({})
+    )
+
+
+async def list_products(
+    page: int, page_size: int = 10, fields: Optional[List[str]] = None
+) -> PaginatedProducts:
     """
     List products with pagination.
 
@@ -18,6 +96,8 @@ async def list_products(page: int, page_size: int = 10) -> PaginatedProducts:
         page (int): The current page number.
         page_size (int, optional): The number of items per page.
         Default is 10.
+        fields (Optional[List[str]]): Only fetch these fields. The products
+        are then returned as raw dicts, without model validation.
 
     Returns:
         PaginatedProducts: Paginated product data.
@@ -25,7 +105,7 @@ async def list_products(page: int, page_size: int = 10) -> PaginatedProducts:
     Raises:
         HTTPException: If the requested page exceeds the total number of pages.
     """
-    total_items = await product_collection.count()
+    total_items = await count_products()
     total_pages = ceil(total_items / page_size)
     to_skip = (page - 1) * page_size
 
@@ -35,6 +115,22 @@ async def list_products(page: int, page_size: int = 10) -> PaginatedProducts:
             detail=resources.get("product.out_of_pages")
         )
 
+    if fields:
+        products = await (
+            product_collection.get_motor_collection()
+            .find({}, build_projection(fields))
+            .skip(to_skip)
+            .limit(page_size)
+            .to_list(page_size)
+        )
+        return PaginatedProducts.model_construct(
+            current_page=page,
+            page_size=page_size,
+            total_items=total_items,
+            total_pages=total_pages,
+            products=[strip_internal(product) for product in products],
+        )
+
     products = (
         await product_collection
         .find()
@@ -51,6 +147,172 @@ async def list_products(page: int, page_size: int = 10) -> PaginatedProducts:
     )
 
 
+async def list_products_page(
+    cursor: Optional[str],
+    page_size: int,
+    fields: Optional[List[str]] = None
+) -> CursorPage:
+    """
+    List products with cursor (keyset) pagination.
+
+    Args:
+        cursor (Optional[str]): The cursor of the page, or None for the
+        first page.
+        page_size (int): The number of products per page.
+        fields (Optional[List[str]]): Only fetch these fields. The products
+        are then returned as raw dicts, without model validation.
+
+    Returns:
+        CursorPage: The products of the page and the cursor of the next one.
+    """
+    products, next_cursor = await find_page(
+        product_collection, {}, cursor, page_size, fields
+    )
+    return CursorPage(
+        page_size=page_size,
+        next_cursor=next_cursor,
+        items=products,
+    )
+
+
+def build_search_query(
+    text: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_score: Optional[float] = None,
+) -> dict:
+    """
+    Builds the filter of a product search.
+
+    Args:
+        text (Optional[str]): Words searched in the title and the brand.
+        brand (Optional[str]): The exact brand of the products.
+        min_price (Optional[float]): The minimum price.
+        max_price (Optional[float]): The maximum price.
+        min_score (Optional[float]): The minimum review score.
+
+    Returns:
+        dict: The MongoDB filter.
+    """
+    query = {}
+    if text:
+        query["$text"] = {"$search": text}
+    if brand:
+        query["brand"] = brand
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        query["price"] = price
+    if min_score is not None:
+        query["reviewScore"] = {"$gte": min_score}
+    return query
+
+
+async def search_products(
+    query: dict,
+    sort: Optional[str],
+    page: int,
+    page_size: int,
+) -> ProductSearchResults:
+    """
+    Search products with a filter built by `build_search_query`.
+
+    Text searches are served by the text index and, without an explicit
+    sort, ordered by relevance. Every other filter and sort combination is
+    served by one of the compound indexes of Product.
+
+    Args:
+        query (dict): The search filter.
+        sort (Optional[str]): One of the keys of SEARCH_SORTS.
+        page (int): The current page number.
+        page_size (int): The number of items per page.
+
+    Returns:
+        ProductSearchResults: The products of the page.
+    """
+    if sort:
+        order = SEARCH_SORTS[sort]
+    elif "$text" in query:
+        order = [("score", {"$meta": "textScore"}), ("_id", ASCENDING)]
+    else:
+        order = [("_id", ASCENDING)]
+
+    documents = await (
+        product_collection.get_motor_collection()
+        .find(query)
+        .sort(order)
+        .skip((page - 1) * page_size)
+        .limit(page_size + 1)
+        .to_list(page_size + 1)
+    )
+    return ProductSearchResults(
+        page=page,
+        page_size=page_size,
+        has_next=len(documents) > page_size,
+        products=[
+            Product.model_validate(document)
+            for document in documents[:page_size]
+        ],
+    )
+
+
+async def find_product(id: int) -> Optional[Product]:
+    """
+    Find a product by its ID, through the product cache.
+
+    Missing IDs are cached too, for PRODUCT_CACHE_NEGATIVE_TTL seconds.
+
+    Args:
+        id (int): The ID of the product.
+
+    Returns:
+        Optional[Product]: The product, or None if it does not exist.
+    """
+    cache = get_product_cache()
+    product = cache.get(id)
+    if product is NOT_CACHED:
+        generation = cache.generation()
+        product = await product_collection.get(id)
+        cache.put(id, product, generation)
+    return product
+
+
+async def get_products_by_ids(ids: List[int]) -> dict:
+    """
+    Retrieves several products by ID, through the product cache.
+
+    The IDs that are not cached are fetched in a single query, and cached
+    (as missing, if not found).
+
+    Args:
+        ids (List[int]): The IDs of the products.
+
+    Returns:
+        dict: The found products in the order of the IDs, and the IDs that
+        were not found.
+    """
+    cache = get_product_cache()
+    found = {}
+    uncached = []
+    for id in ids:
+        product = cache.get(id)
+        if product is NOT_CACHED:
+            uncached.append(id)
+        elif product is not None:
+            found[id] = product
+
+    generation = cache.generation()
+    fetched = await find_by_ids(product_collection, uncached)
+    for id in uncached:
+        cache.put(id, fetched.get(id), generation)
+    found.update(fetched)
+    return in_request_order(ids, found)
+
+
 async def get_product(id: int) -> Product:
     """
     Get a product by its ID.
@@ -62,7 +324,7 @@ async def get_product(id: int) -> Product:
         Product: The product with the specified ID, if it exists.
     """
 
-    product = await product_collection.get(id)
+    product = await find_product(id)
     if product:
         return product
     else:
@@ -81,26 +343,47 @@ async def add_product(new_product: Product) -> Product:
 
     Returns:
         Product: The newly added product.
+
+    Raises:
+        HTTPException: If a product with the same ID already exists.
     """
-    product = await new_product.create()
+    draw_created_nonce(new_product)
+    try:
+        product = await new_product.create()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("product.product_already_exists")
+        )
+    get_product_count_cache().adjust(1)
+    get_product_cache().invalidate(product.id)
+    note_product_write()
     return product
 
 
-async def delete_product(id: int) -> bool:
+async def delete_product(
+    id: int, session: Optional[AsyncIOMotorClientSession] = None
+) -> bool:
     """
     Delete a product by its ID.
 
     Args:
         id (int): The ID of the product to delete.
+        session (Optional[AsyncIOMotorClientSession]): The session of the
+        transaction the removal is part of.
 
     Returns:
         bool: True if the product was deleted, False otherwise.
     """
 
-    product = await product_collection.get(id)
-    if product:
-        await product.delete()
-        return True
+    result = await product_collection.get_motor_collection().delete_one(
+        {"_id": id}, session=session
+    )
+    get_product_count_cache().adjust(-result.deleted_count)
+    get_product_cache().invalidate(id)
+    if result.deleted_count:
+        note_product_write()
+    return result.deleted_count > 0
 
 
 async def update_product_data(
@@ -109,29 +392,39 @@ async def update_product_data(
     """
     Update a product's data by its ID.
 
+    The product ID can not be changed, so an informed `id` must be the ID
+    of the product.
+
     Args:
         id_product (int): The ID of the product to update.
-        data (dict): The updated data for the product.
+        data (dict): The updated data for the product, and optionally the
+        expected revision of the product.
 
     Returns:
         Union[bool, Product]: The updated product if successful, or
         False if the product does not exist.
+
+    Raises:
+        HTTPException: If another ID is informed, or the product was
+        modified since the informed revision.
     """
-    if data["id"]:
-        if await product_collection.get(data["id"]):
-            raise HTTPException(
-                status_code=409,
-                detail=resources.get("product.product_id_already_exists")
-            )
+    data = dict(data)
+    new_id = data.pop("id", None)
+    if new_id and new_id != id_product:
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("product.id_immutable").format(id_product)
+        )
 
-    product = await product_collection.get(id_product)
+    product = await update_document(
+        product_collection,
+        id_product,
+        data,
+        resources.get("product.revision_conflict").format(id_product),
+        # The next catalog sync compares the feed with the edited product
+        unset=["content_hash"],
+    )
+    get_product_cache().invalidate(id_product)
     if product:
-        des_body = {k: v for k, v in data.items() if v is not None}
-        update_query = {
-            "$set": {
-                field: value for field, value in des_body.items()
-            }
-        }
-        await product.update(update_query)
-        return product
-    return False
+        note_product_write()
+    return product or False
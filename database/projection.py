@@ -0,0 +1,113 @@
+from typing import List, Optional
+
+from beanie import Document
+from fastapi import HTTPException
+
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+# Fields managed by Beanie or by the API that are never exposed
+INTERNAL_FIELDS = {"revision_id", "created_nonce", "content_hash"}
+
+
+def model_fields(model: type[Document]) -> List[str]:
+    """
+    Returns the public fields of a document model, starting with `id`.
+
+    Args:
+        model (type[Document]): The document model.
+
+    Returns:
+        List[str]: The field names.
+    """
+    return ["id"] + [
+        field for field in model.model_fields
+        if field != "id" and field not in INTERNAL_FIELDS
+    ]
+
+
+def parse_fields(
+    model: type[Document], fields: Optional[str]
+) -> Optional[List[str]]:
+    """
+    Parses a comma-separated list of fields requested by a client.
+
+    `id` is always included in the result.
+
+    Args:
+        model (type[Document]): The document model the fields belong to.
+        fields (Optional[str]): The comma-separated field names.
+
+    Returns:
+        Optional[List[str]]: The requested fields in the model order, or
+        None if no field was requested.
+
+    Raises:
+        HTTPException: If a field does not exist in the model.
+    """
+    if not fields:
+        return None
+
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    available = model_fields(model)
+    unknown = requested - set(available)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=resources.get("requests.invalid_fields")
+            .format(", ".join(sorted(unknown)))
+        )
+    return [
+        field for field in available
+        if field == "id" or field in requested
+    ]
+
+
+def build_projection(fields: Optional[List[str]]) -> Optional[dict]:
+    """
+    Builds a MongoDB projection for the given fields.
+
+    `_id` is always listed, so that a request for `id` alone does not
+    build an empty projection, which fetches every field.
+
+    Args:
+        fields (Optional[List[str]]): The fields returned by `parse_fields`.
+
+    Returns:
+        Optional[dict]: The projection, or None to fetch every field.
+    """
+    if fields is None:
+        return None
+    return {"_id": 1, **{field: 1 for field in fields if field != "id"}}
+
+
+def strip_internal(document: dict) -> dict:
+    """
+    Removes the internal fields from a raw MongoDB document.
+
+    Args:
+        document (dict): The raw document.
+
+    Returns:
+        dict: The same document, without INTERNAL_FIELDS.
+    """
+    for field in INTERNAL_FIELDS:
+        document.pop(field, None)
+    return document
+
+
+def to_public(document: dict) -> dict:
+    """
+    Converts a raw MongoDB document to the API representation, renaming
+    `_id` to `id`.
+
+    Args:
+        document (dict): The raw document.
+
+    Returns:
+        dict: The document with `id` as its first key.
+    """
+    public = {"id": document.pop("_id")}
+    public.update(strip_internal(document))
+    return public
@@ -0,0 +1,98 @@
+import secrets
+from typing import Iterable, Optional
+
+from beanie import Document
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from database.projection import build_projection, model_fields
+
+
+def draw_created_nonce(document: Document):
+    """
+    Draws the random creation nonce of a document about to be inserted,
+    which tells apart in the ETags a document deleted and created again
+    with the same ID.
+
+    Args:
+        document (Document): The new document. Models without a
+        `created_nonce` field are left unchanged.
+    """
+    if "created_nonce" in type(document).model_fields:
+        document.created_nonce = secrets.token_hex(8)
+
+
+def revision_filter(revision: int):
+    """
+    Builds the filter matching a stored revision.
+
+    Documents created before the revision field existed count as revision 0.
+
+    Args:
+        revision (int): The expected revision.
+
+    Returns:
+        The filter value for the `revision` field.
+    """
+    return {"$in": [0, None]} if revision == 0 else revision
+
+
+async def update_document(
+    model: type[Document],
+    id: int,
+    data: dict,
+    conflict_detail: str,
+    unset: Iterable[str] = (),
+) -> Optional[Document]:
+    """
+    Updates a document and returns its new state in a single round trip.
+
+    The informed fields are set and the revision is incremented atomically
+    with `find_one_and_update`. When `data` has a `revision`, the update only
+    applies if it matches the stored one (optimistic concurrency).
+
+    Args:
+        model (type[Document]): The document model.
+        id (int): The ID of the document.
+        data (dict): The fields to update. None values are ignored.
+        conflict_detail (str): The error message if the revision does not
+        match.
+        unset (Iterable[str], optional): Fields removed from the document.
+
+    Returns:
+        Optional[Document]: The updated document, or None if it does not
+        exist.
+
+    Raises:
+        HTTPException: If the document was modified since the informed
+        revision.
+    """
+    data = dict(data)
+    expected_revision = data.pop("revision", None)
+    query = {"_id": id}
+    if expected_revision is not None:
+        query["revision"] = revision_filter(expected_revision)
+
+    update = {"$inc": {"revision": 1}}
+    fields = {k: v for k, v in data.items() if v is not None}
+    if fields:
+        update["$set"] = fields
+    if unset:
+        update["$unset"] = {field: "" for field in unset}
+
+    collection = model.get_motor_collection()
+    document = await collection.find_one_and_update(
+        query,
+        update,
+        projection=build_projection(model_fields(model)),
+        return_document=ReturnDocument.AFTER,
+    )
+    if document:
+        return model.model_validate(document)
+
+    # Only a failed conditional update needs a second look
+    if expected_revision is not None and await collection.find_one(
+        {"_id": id}, {"_id": 1}
+    ):
+        raise HTTPException(status_code=409, detail=conflict_detail)
+    return None
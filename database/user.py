@@ -0,0 +1,67 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from auth.password import hash_password_async
+from config.config import get_settings
+from models.user import User
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+user_collection = User
+
+
+async def get_user(username: str) -> Optional[User]:
+    """
+    Retrieves a user by its username.
+
+    Args:
+        username (str): The login of the user.
+
+    Returns:
+        Optional[User]: The user, if found.
+    """
+    return await user_collection.find_one(User.username == username)
+
+
+async def add_user(username: str, password: str) -> User:
+    """
+    Adds a new user, storing only the salted hash of the password.
+
+    Args:
+        username (str): The login of the user.
+        password (str): The plain text password.
+
+    Returns:
+        User: The created user.
+
+    Raises:
+        HTTPException: If a user with the same username already exists.
+    """
+    user = User(
+        username=username,
+        password_hash=await hash_password_async(password)
+    )
+    try:
+        await user.create()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail=resources.get("auth.user_already_exists")
+        )
+    return user
+
+
+async def ensure_default_user():
+    """
+    Creates the API_USER/API_PASS user from the settings if it does not
+    exist yet, so a fresh database always has one user to log in with.
+    """
+    settings = get_settings()
+    if not await get_user(settings.API_USER):
+        try:
+            await add_user(settings.API_USER, settings.API_PASS)
+        except HTTPException:
+            # Another worker created it in the meantime
+            pass
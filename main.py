@@ -2,6 +2,8 @@ import sys
 
 import uvicorn
 
+from config.database.catalog_sync import catalog_sync
+from config.database.migrate_favorites import migrate_favorites
 from config.database.populate import populate_database
 from config.database.reset import reset_database
 
@@ -18,9 +20,27 @@ if __name__ == "__main__":
             print("Limpando o banco de dados...")
             import asyncio
             asyncio.run(reset_database())
+        elif command == "--catalog_sync" and len(sys.argv) > 2:
+            print("Sincronizando o catálogo de produtos...")
+            import asyncio
+            asyncio.run(catalog_sync(sys.argv[2]))
+        elif (
+            command == "--migrate_favorites"
+            and len(sys.argv) > 2
+            and sys.argv[2] in ("embedded", "documents")
+        ):
+            print("Migrando os favoritos...")
+            import asyncio
+            asyncio.run(
+                migrate_favorites(sys.argv[2], "--restart" in sys.argv[3:])
+            )
         else:
             print(f"Comando '{command}' não reconhecido.")
-            print("Opções disponíveis: db_populate, db_reset.")
+            print(
+                "Opções disponíveis: db_populate, db_reset, "
+                "catalog_sync <feed.jsonl>, "
+                "migrate_favorites <embedded|documents> [--restart]."
+            )
     else:
         # Comportamento padrão
         uvicorn.run("app:app", host="0.0.0.0", port=8080, reload=True)
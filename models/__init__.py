@@ -1,5 +1,14 @@
 from models.client import Client
+from models.client_favorites import ClientFavorites
+from models.facets import CatalogFacets
 from models.favorite import Favorite
+from models.popularity import ProductPopularity
 from models.product import Product
+from models.refresh_token import RefreshToken
+from models.revoked_token import RevokedToken
+from models.user import User
 
-__all__ = [Client, Product, Favorite]
+__all__ = [
+    Client, Product, Favorite, User, RevokedToken, RefreshToken,
+    CatalogFacets, ClientFavorites, ProductPopularity,
+]
@@ -2,12 +2,18 @@ from typing import Any, List, Optional, Union
 
 from beanie import Document
 from pydantic import BaseModel, EmailStr, Field
+from pymongo import ASCENDING, IndexModel
 
 
 class Client(Document):
     id: int = Field(alias="_id")
     name: str
     email: EmailStr
+    revision: int = 0
+    # Drawn when the client is inserted, so that a client deleted and
+    # created again gets new ETags. None for clients stored before it
+    # existed. Not exposed by the API.
+    created_nonce: Optional[str] = Field(None, exclude=True)
 
     class Config:
         json_schema_extra = {
@@ -20,6 +26,15 @@ class Client(Document):
 
     class Settings:
         name = "clients"
+        indexes = [
+            # Case-insensitive unique email
+            IndexModel(
+                [("email", ASCENDING)],
+                name="email_unique",
+                unique=True,
+                collation={"locale": "en", "strength": 2},
+            ),
+        ]
 
 
 class Response(BaseModel):
@@ -46,11 +61,14 @@ class Response(BaseModel):
 class UpdateClientModel(BaseModel):
     name: Optional[str]
     email: Optional[EmailStr]
+    # When informed, the update only succeeds if the stored revision matches
+    revision: Optional[int] = None
 
     class Config:
         json_schema_extra = {
             "example": {
                 "name": "Silvão Joilva",
-                "email": "silva.joao@exemple.com"
+                "email": "silva.joao@exemple.com",
+                "revision": 0
             }
         }
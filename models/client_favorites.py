@@ -0,0 +1,32 @@
+from typing import List
+
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class ClientFavorites(Document):
+    """
+    Represents the favorites of a client in the embedded storage mode.
+
+    Attributes:
+        id (int): The ID of the client.
+        product_ids (List[int]): The favorite product IDs, in the order they
+        were added, capped at FAVORITES_MAX_PER_CLIENT.
+    """
+    id: int = Field(alias="_id")
+    product_ids: List[int] = []
+
+    class Settings:
+        """
+        Beanie-specific settings for the ClientFavorites document.
+
+        Attributes:
+            name (str): The name of the collection in the database.
+            indexes (list): Multikey index to find the clients that have a
+            product among their favorites, in client ID order.
+        """
+        name = "client_favorites"
+        indexes = [
+            IndexModel([("product_ids", ASCENDING), ("_id", ASCENDING)]),
+        ]
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import List, Optional
+
+from beanie import Document
+from pydantic import BaseModel, Field
+
+# The catalog facets are kept in a single document
+CATALOG_FACETS_ID = "catalog"
+
+
+class BrandCount(BaseModel):
+    """
+    Represents the number of products of a brand.
+
+    Attributes:
+        brand (str): The brand.
+        count (int): The number of products of the brand.
+    """
+    brand: str
+    count: int
+
+
+class PriceBucket(BaseModel):
+    """
+    Represents a bar of the price histogram.
+
+    Attributes:
+        min (float): The minimum price of the bucket (inclusive).
+        max (Optional[float]): The maximum price of the bucket (exclusive),
+        or None for the last bucket.
+        count (int): The number of products in the bucket.
+    """
+    min: float
+    max: Optional[float]
+    count: int
+
+
+class TopProduct(BaseModel):
+    """
+    Represents a product of a top rated leaderboard.
+
+    Attributes:
+        id (int): The ID of the product.
+        title (str): The title of the product.
+        price (float): The price of the product.
+        reviewScore (Optional[float]): The review score of the product.
+    """
+    id: int
+    title: str
+    price: float
+    reviewScore: Optional[float]
+
+
+class BrandTop(BaseModel):
+    """
+    Represents the top rated products of a brand.
+
+    Attributes:
+        brand (str): The brand.
+        products (List[TopProduct]): The best rated products, best first.
+    """
+    brand: str
+    products: List[TopProduct]
+
+
+class CatalogFacets(Document):
+    """
+    Represents the materialized facets of the product catalog.
+
+    Product writes increment `version`; the facets are recomputed when it
+    differs from `refreshed_version`.
+
+    Attributes:
+        id (str): Always CATALOG_FACETS_ID.
+        total_products (int): The number of products.
+        brands (List[BrandCount]): The product count per brand, largest
+        first.
+        price_histogram (List[PriceBucket]): The product count per price
+        range.
+        top_rated (List[BrandTop]): The best rated products of each brand.
+        version (int): Incremented on every product write.
+        refreshed_version (int): The version the facets were computed at.
+        refreshed_at (Optional[datetime]): When the facets were computed.
+    """
+    id: str = Field(default=CATALOG_FACETS_ID, alias="_id")
+    total_products: int = 0
+    brands: List[BrandCount] = []
+    price_histogram: List[PriceBucket] = []
+    top_rated: List[BrandTop] = []
+    version: int = 0
+    refreshed_version: int = -1
+    refreshed_at: Optional[datetime] = None
+
+    class Settings:
+        """
+        Beanie-specific settings for the CatalogFacets document.
+
+        Attributes:
+            name (str): The name of the collection in the database.
+        """
+        name = "catalog_facets"
@@ -1,7 +1,8 @@
-from typing import Any, Union
+from typing import Any, List, Union
 
 from beanie import Document
 from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
 
 
 class Favorite(Document):
@@ -18,6 +19,35 @@ class Favorite(Document):
 
     class Settings:
         name = "favorite"
+        indexes = [
+            IndexModel([("client_id", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel(
+                [("client_id", ASCENDING), ("product_id", ASCENDING)],
+                name="client_product_unique",
+                unique=True,
+            ),
+            # Beanie merges the indexes that have the same fields, the
+            # trailing _id keeps this one apart from the unique index
+            IndexModel(
+                [
+                    ("product_id", ASCENDING),
+                    ("client_id", ASCENDING),
+                    ("_id", ASCENDING),
+                ],
+                name="product_client",
+            ),
+        ]
+
+
+class FavoriteProducts(BaseModel):
+    product_ids: List[int]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "product_ids": [1, 2, 3],
+            }
+        }
 
 
 class Response(BaseModel):
@@ -0,0 +1,36 @@
+from typing import Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class CursorPage(BaseModel):
+    """
+    Represents a page of a cursor (keyset) paginated listing.
+
+    Attributes:
+        page_size (int): The maximum number of items per page.
+        next_cursor (Optional[str]): The opaque cursor of the next page, or
+        None if this is the last page.
+        items (List[Any]): The items of the current page.
+    """
+    page_size: int
+    next_cursor: Optional[str]
+    items: List[Any]
+
+    class Config:
+        """
+        Pydantic configuration for additional settings.
+        """
+        json_schema_extra = {
+            "example": {
+                "page_size": 10,
+                "next_cursor": "eyJpZCI6IDEwfQ",
+                "items": [
+                    {
+                        "id": 1,
+                        "name": "João Silva",
+                        "email": "joao.silva@example.com"
+                    }
+                ],
+            }
+        }
@@ -0,0 +1,33 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+class ProductPopularity(Document):
+    """
+    Represents the number of clients that have a product among their
+    favorites.
+
+    Attributes:
+        id (int): The ID of the product.
+        favorites (int): The number of clients that favorited the product.
+    """
+    id: int = Field(alias="_id")
+    favorites: int = 0
+
+    class Settings:
+        """
+        Beanie-specific settings for the ProductPopularity document.
+
+        Attributes:
+            name (str): The name of the collection in the database.
+            indexes (list): Index that serves the most favorited products
+            in order.
+        """
+        name = "product_popularity"
+        indexes = [
+            IndexModel(
+                [("favorites", DESCENDING), ("_id", ASCENDING)],
+                name="favorites",
+            ),
+        ]
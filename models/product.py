@@ -1,7 +1,8 @@
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from beanie import Document, Indexed
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 
 
 class Product(Document):
@@ -15,6 +16,11 @@ class Product(Document):
         image (str): The URL to the product's image.
         brand (str): The brand of the product.
         reviewScore (Optional[float]): The review score of the product.
+        revision (int): Incremented on every update of the product.
+        created_nonce (Optional[str]): Random value drawn when the product is
+        inserted, so that a product deleted and created again gets new
+        ETags. None for products stored before it existed. Not exposed by
+        the API.
     """
 
     id: Indexed(int)
@@ -23,6 +29,8 @@ class Product(Document):
     image: str
     brand: str
     reviewScore: Optional[float]
+    revision: int = 0
+    created_nonce: Optional[str] = Field(None, exclude=True)
 
     class Config:
         """
@@ -46,8 +54,35 @@ class Product(Document):
 
         Attributes:
             name (str): The name of the collection in the database.
+            indexes (list): The indexes backing the product search. `_id`
+            closes every compound index so sorted pages are deterministic.
         """
         name = "product"
+        indexes = [
+            IndexModel(
+                [("title", TEXT), ("brand", TEXT)],
+                name="title_brand_text",
+                weights={"title": 2, "brand": 1},
+            ),
+            IndexModel(
+                [("brand", ASCENDING), ("price", ASCENDING),
+                 ("_id", ASCENDING)],
+                name="brand_price",
+            ),
+            IndexModel(
+                [("brand", ASCENDING), ("reviewScore", DESCENDING),
+                 ("_id", ASCENDING)],
+                name="brand_review_score",
+            ),
+            IndexModel(
+                [("price", ASCENDING), ("_id", ASCENDING)],
+                name="price",
+            ),
+            IndexModel(
+                [("reviewScore", DESCENDING), ("_id", ASCENDING)],
+                name="review_score",
+            ),
+        ]
 
 
 class PaginatedProducts(BaseModel):
@@ -59,13 +94,15 @@ class PaginatedProducts(BaseModel):
         page_size (int): The number of items per page.
         total_pages (int): The total number of pages available.
         total_items (int): The total number of items available.
-        products (List[Product]): The list of products for the current page.
+        products (List[Union[Product, Dict[str, Any]]]): The list of products
+        for the current page, as raw dicts when only some fields were
+        requested.
     """
     current_page: int
     page_size: int
     total_pages: int
     total_items: int
-    products: List[Product]
+    products: List[Union[Product, Dict[str, Any]]]
 
     class Config:
         """
@@ -99,6 +136,22 @@ class PaginatedProducts(BaseModel):
         }
 
 
+class ProductSearchResults(BaseModel):
+    """
+    Represents a page of product search results.
+
+    Attributes:
+        page (int): The current page number.
+        page_size (int): The number of items per page.
+        has_next (bool): Whether there are more results after this page.
+        products (List[Product]): The products of the current page.
+    """
+    page: int
+    page_size: int
+    has_next: bool
+    products: List[Product]
+
+
 class UpdateProductModel(BaseModel):
     """
     Represents a model for updating product information.
@@ -110,6 +163,8 @@ class UpdateProductModel(BaseModel):
         image (Optional[str]): The URL of the product's image.
         brand (Optional[str]): The brand of the product.
         reviewScore (Optional[float]): The review score of the product.
+        revision (Optional[int]): The revision the update is based on. When
+        informed, the update only succeeds if it matches the stored one.
     """
     id: Union[int, None] = None
     title: Union[str, None] = None
@@ -117,6 +172,7 @@ class UpdateProductModel(BaseModel):
     image: Union[str, None] = None
     brand: Union[str, None] = None
     reviewScore: Union[float, None] = None
+    revision: Union[int, None] = None
 
     class Collection:
         """
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class RefreshToken(Document):
+    """
+    Represents an issued refresh token.
+
+    Only the SHA-256 digest of the token is stored. Every refresh token
+    belongs to a family started at login; rotating a token marks it as used
+    and issues the next one in the same family.
+
+    Attributes:
+        id (bytes): The SHA-256 digest of the token.
+        family (str): The identifier of the login session.
+        login (str): The login the token was issued to.
+        expires_at (datetime): When the token expires.
+        used (bool): If the token was already rotated.
+    """
+    id: bytes = Field(alias="_id")
+    family: str
+    login: str
+    expires_at: datetime
+    used: bool = False
+
+    class Settings:
+        """
+        Beanie-specific settings for the RefreshToken document.
+
+        Attributes:
+            name (str): The name of the collection in the database.
+            indexes (list): TTL index on the expiration and an index on the
+            family to revoke a whole session at once.
+        """
+        name = "refresh_token"
+        indexes = [
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+            IndexModel([("family", ASCENDING)]),
+        ]
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class RevokedToken(Document):
+    """
+    Represents a JWT token revoked before its expiration.
+
+    Documents are removed by a TTL index once the token would have expired
+    anyway, so the collection only holds tokens that are still revocable.
+
+    Attributes:
+        id (str): The `jti` claim of the revoked token.
+        revoked_at (datetime): When the token was revoked, assigned by the
+        database server.
+        expires_at (datetime): When the token expires.
+    """
+    id: str = Field(alias="_id")
+    revoked_at: datetime
+    expires_at: datetime
+
+    class Settings:
+        """
+        Beanie-specific settings for the RevokedToken document.
+
+        Attributes:
+            name (str): The name of the collection in the database.
+            indexes (list): TTL index on the expiration and an index on the
+            revocation date for the incremental refresh.
+        """
+        name = "revoked_token"
+        indexes = [
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+            IndexModel([("revoked_at", ASCENDING)]),
+        ]
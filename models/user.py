@@ -1,16 +1,24 @@
-from beanie import Document
+from beanie import Document, Indexed
 from fastapi.security import HTTPBasicCredentials
+from pydantic import BaseModel
 
 
 class User(Document):
-    username: str
-    password: str
+    """
+    Represents an API user in the database.
+
+    Attributes:
+        username (str): The unique login of the user.
+        password_hash (str): The salted scrypt hash of the user's password.
+    """
+    username: Indexed(str, unique=True)
+    password_hash: str
 
     class Config:
         json_schema_extra = {
             "example": {
                 "username": "admin",
-                "password": "admin",
+                "password_hash": "scrypt$16384$8$1$<salt>$<hash>",
             }
         }
 
@@ -23,3 +31,21 @@ class UserLogin(HTTPBasicCredentials):
         json_schema_extra = {
             "example": {"username": "admin", "password": "admin"}
         }
+
+
+class RevokeToken(BaseModel):
+    token: str
+
+    class Config:
+        json_schema_extra = {
+            "example": {"token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9..."}
+        }
+
+
+class RefreshCredentials(BaseModel):
+    refresh_token: str
+
+    class Config:
+        json_schema_extra = {
+            "example": {"refresh_token": "Zm9vYmFyYmF6cXV4..."}
+        }
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Body, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi import Response as HTTPResponse
 
 import database.client as DatabaseClient
 import database.favorite as DatabaseFavorite
+from config.config import transaction
+from database.batch import parse_ids
+from database.bulk import bulk_insert
+from database.pagination import resolve_page_size
+from database.projection import parse_fields
 from models.client import Client, Response, UpdateClientModel
 from resources.resources import ResourceManager
+from routes.etag import conditional_response, document_version
 
 resources = ResourceManager()
 
@@ -15,17 +24,73 @@ router = APIRouter()
     response_description=resources.get("client.client_retrived"),
     response_model=Response
 )
-async def get_clients():
+async def get_clients(
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None
+):
     """
     Retrieve all clients from the database.
 
+    When a cursor or a page size is informed, the clients are returned one
+    page at a time, ordered by ID.
+
+    Args:
+        cursor (Optional[str]): The cursor returned by the previous page.
+        page_size (Optional[int]): The number of clients per page, capped by
+        the MAX_PAGE_SIZE setting.
+        fields (Optional[str]): Comma-separated fields to return. The ID is
+        always returned.
+
     Returns:
         dict: A dictionary containing the status code, response type,
-        description, and the list of all clients.
+        description, and the list of all clients or the requested page.
+    """
+    selected_fields = parse_fields(Client, fields)
+    if cursor or page_size:
+        page = await DatabaseClient.list_clients_page(
+            cursor, resolve_page_size(page_size), selected_fields
+        )
+        if not selected_fields:
+            page.items = [client.dict() for client in page.items]
+        return Response(
+            status_code=200,
+            response_type=resources.get("requests.success"),
+            description=resources.get("client.client_retrived"),
+            data=page
+        )
+
+    clients = await DatabaseClient.list_clients(selected_fields)
+    if not selected_fields:
+        clients = [client.dict() for client in clients]
+
+    return Response(
+        status_code=200,
+        response_type=resources.get("requests.success"),
+        description=resources.get("client.client_retrived"),
+        data=clients
+    )
+
+
+@router.get(
+    path="/batch",
+    response_description=resources.get("client.client_retrived"),
+    response_model=Response
+)
+async def get_clients_batch(ids: str):
     """
-    clients = await DatabaseClient.list_clients()
-    clients = [client.dict() for client in clients]
+    Retrieve several clients by ID in a single request.
 
+    Args:
+        ids (str): The comma-separated IDs, at most MAX_BATCH_IDS.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, the found clients in the order of the IDs, and the
+        IDs that were not found.
+    """
+    clients = await DatabaseClient.get_clients_by_ids(parse_ids(ids))
+    clients["items"] = [client.dict() for client in clients["items"]]
     return Response(
         status_code=200,
         response_type=resources.get("requests.success"),
@@ -39,12 +104,19 @@ async def get_clients():
     response_description=resources.get("client.client_retrived"),
     response_model=Response
 )
-async def get_client_data(id: int):
+async def get_client_data(
+    id: int, request: Request, response: HTTPResponse
+):
     """
     Retrieve a specific client data by ID.
 
+    The response has an ETag, and a request with a matching If-None-Match
+    header gets an empty `304 Not Modified` response.
+
     Args:
         id (int): The ID of the client to retrieve.
+        request (Request): The request, with its conditional headers.
+        response (HTTPResponse): The response, where the ETag is set.
 
     Returns:
         dict: A dictionary containing the status code, response type,
@@ -52,6 +124,11 @@ async def get_client_data(id: int):
     """
     client = await DatabaseClient.get_client(id)
     if client:
+        not_modified = conditional_response(
+            request, response, document_version(client)
+        )
+        if not_modified:
+            return not_modified
         return Response(
             status_code=200,
             response_type=resources.get("requests.success"),
@@ -77,19 +154,13 @@ async def add_client_data(client: Client = Body(...)):
         cliente (Client): The cliente data to add.
 
     Raises:
-        HTTPException: If a cliente with the same email already exists.
+        HTTPException: If a cliente with the same ID or email (ignoring case)
+        already exists.
 
     Returns:
         dict: A dictionary containing the status code, response type,
         description, and the newly created cliente data.
     """
-    client_exists = await Client.find_one(Client.email == client.email)
-    if client_exists:
-        raise HTTPException(
-            status_code=409,
-            detail=resources.get("client.client_already_exists")
-        )
-
     new_client = await DatabaseClient.add_client(client)
     return Response(
         status_code=200,
@@ -112,21 +183,25 @@ async def delete_client_data(id: int):
 
     Returns:
         dict: A dictionary containing the status code, response type,
-        description, and a confirmation of deletion or an error
-        message if not found.
+        description, and the number of favorites removed with the client,
+        or an error message if not found.
     """
 
     # Antes de excluir o produto é necessário excluir os favoritos dele
-    # Fazendo sem transação por não ter os replicasets configurados
-    await DatabaseFavorite.delete_all_favorites(client_id=id)
-
-    deleted_client = await DatabaseClient.delete_client(id)
+    # Em transação apenas com USE_TRANSACTIONS (requer replicaset)
+    async with transaction() as session:
+        favorites_removed = await DatabaseFavorite.delete_all_favorites(
+            client_id=id, session=session
+        )
+        deleted_client = await DatabaseClient.delete_client(
+            id, session=session
+        )
     if deleted_client:
         return Response(
             status_code=200,
             response_type=resources.get("requests.success"),
             description=resources.get("client.client_removed").format(id),
-            data=None
+            data={"favorites_removed": favorites_removed}
         )
     raise HTTPException(
         status_code=404,
@@ -164,3 +239,32 @@ async def update_client(id: int, req: UpdateClientModel = Body(...)):
         status_code=404,
         detail=resources.get("client.client_not_found").format(id)
     )
+
+
+@router.post(
+    "/bulk",
+    response_description=resources.get("bulk.imported"),
+)
+async def add_clients_bulk(request: Request):
+    """
+    Import clients from an NDJSON body, one client per line.
+
+    The body is read as it arrives and written in unordered batches. Invalid
+    or duplicate rows are reported by line number and do not stop the
+    import.
+
+    Args:
+        request (Request): The request with the NDJSON body.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the number of inserted clients with the errors
+        of the rejected rows.
+    """
+    report = await bulk_insert(Client, request.stream())
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("bulk.imported"),
+        "data": report,
+    }
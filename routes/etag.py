@@ -0,0 +1,92 @@
+import hashlib
+from typing import Optional
+
+from beanie import Document
+from fastapi import Request, Response
+
+# Clients may keep the responses but must revalidate them on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(version: tuple) -> str:
+    """
+    Computes a strong ETag from the version of a resource, without rendering
+    the resource itself.
+
+    Args:
+        version (tuple): Values that change whenever the resource changes,
+        such as its ID, creation nonce and revision.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    return '"' + hashlib.sha1(repr(version).encode()).hexdigest() + '"'
+
+
+def document_version(document: Document) -> tuple:
+    """
+    Returns the version of a stored document, for `compute_etag`.
+
+    The revision is incremented on every update, and the creation nonce
+    tells apart a document deleted and created again with the same ID.
+    Documents stored before the nonce existed have none, and use a constant
+    instead, so that their ETag stays the same between reads.
+
+    Args:
+        document (Document): A document with `revision` and `created_nonce`
+        fields.
+
+    Returns:
+        tuple: The ID, creation nonce and revision of the document.
+    """
+    return document.id, document.created_nonce or "", document.revision
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks the If-None-Match header of a request against an ETag.
+
+    Args:
+        request (Request): The request.
+        etag (str): The current ETag of the resource.
+
+    Returns:
+        bool: True if the client already has the current version.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = [value.strip() for value in header.split(",")]
+    return any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+def conditional_response(
+    request: Request, response: Response, version: tuple
+) -> Optional[Response]:
+    """
+    Handles a conditional GET of a resource.
+
+    Sets the ETag and Cache-Control headers of the response and, when the
+    client already has the current version, builds the `304 Not Modified`
+    response to return instead of the body.
+
+    Args:
+        request (Request): The request.
+        response (Response): The response of the route.
+        version (tuple): The version of the resource, see `compute_etag`.
+
+    Returns:
+        Optional[Response]: The 304 response, or None if the body must be
+        sent.
+    """
+    etag = compute_etag(version)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+import database.export as DatabaseExport
+from database.projection import model_fields, parse_fields
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+router = APIRouter()
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+media_types = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+async def ndjson_chunks(
+    documents: AsyncIterator[dict], batch_size: int
+) -> AsyncIterator[str]:
+    """
+    Formats the documents as NDJSON, one chunk per batch of documents.
+    """
+    lines = []
+    async for document in documents:
+        lines.append(json.dumps(document, default=str))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def csv_chunks(
+    documents: AsyncIterator[dict], fields: List[str], batch_size: int
+) -> AsyncIterator[str]:
+    """
+    Formats the documents as CSV with a header row, one chunk per batch of
+    documents.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    async for document in documents:
+        writer.writerow(document)
+        rows += 1
+        if rows >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+
+@router.get(
+    "/{collection}",
+    response_description=resources.get("export.exported"),
+)
+async def export_collection(
+    collection: str,
+    format: ExportFormat = ExportFormat.ndjson,
+    fields: Optional[str] = None,
+    after: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Stream every document of a collection as NDJSON or CSV.
+
+    Documents are ordered by ID, so an interrupted export can be resumed
+    by passing the last ID received as `after`.
+
+    Args:
+        collection (str): The collection to export (client, product,
+        favorite or client_favorites).
+        format (ExportFormat): The output format, ndjson or csv.
+        fields (Optional[str]): Comma-separated fields to export. The ID is
+        always exported.
+        after (Optional[str]): Only export documents after this ID.
+        batch_size (int): Documents fetched from the database per round
+        trip and written per chunk.
+
+    Returns:
+        StreamingResponse: The exported documents.
+    """
+    model = DatabaseExport.get_exportable_model(collection)
+    selected_fields = parse_fields(model, fields)
+    documents = DatabaseExport.export_documents(
+        model,
+        selected_fields,
+        after=DatabaseExport.parse_after(model, after),
+        batch_size=batch_size,
+    )
+
+    if format == ExportFormat.csv:
+        chunks = csv_chunks(
+            documents, selected_fields or model_fields(model), batch_size
+        )
+    else:
+        chunks = ndjson_chunks(documents, batch_size)
+
+    return StreamingResponse(chunks, media_type=media_types[format])
@@ -1,30 +1,105 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi import Response as HTTPResponse
+from fastapi.responses import StreamingResponse
 
 import database.favorite as DatabaseFavorite
-from models.favorite import Response
+from database.pagination import resolve_page_size
+from models.favorite import FavoriteProducts, Response
 from resources.resources import ResourceManager
+from routes.etag import conditional_response
+from routes.export import ExportFormat, media_types, ndjson_chunks
 
 resources = ResourceManager()
 router = APIRouter()
 
+# Client IDs fetched per round trip and written per chunk when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+def favorites_version(favorites: dict) -> tuple:
+    """
+    Returns the version of a page of favorites, for `compute_etag`.
+
+    Plain favorites are product IDs, and expanded favorites carry the
+    version of their product, so the page is not rendered to get its ETag.
+
+    Args:
+        favorites (dict): The favorites, as returned by the database layer.
+
+    Returns:
+        tuple: The pagination fields and the version of each favorite.
+    """
+    items = tuple(
+        favorite if isinstance(favorite, int)
+        else (favorite["product_id"], favorite["version"])
+        for favorite in favorites["favorites"]
+    )
+    fields = sorted(
+        (key, value) for key, value in favorites.items()
+        if key != "favorites"
+    )
+    return tuple(fields) + (items,)
+
 
 @router.get(
     "/{client_id}",
     response_description=resources.get("favorites.retrieved"),
     response_model=Response,
 )
-async def get_favorites(client_id: int):
+async def get_favorites(
+    client_id: int,
+    request: Request,
+    response: HTTPResponse,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1),
+    expand: Optional[str] = Query(None, pattern="^product$"),
+    sort: Optional[str] = Query(None, pattern="^-?(price|reviewScore)$"),
+    page: int = Query(1, ge=1),
+):
     """
     Retrieve a list of favorite products for a client.
 
+    When a cursor or a page size is informed, the favorites are returned one
+    page at a time. The response has an ETag, and a request with a matching
+    If-None-Match header gets an empty `304 Not Modified` response.
+
+    With `expand=product`, each favorite comes with the title, price, image
+    and review score of its product, and the favorites can be sorted by a
+    product field. Expanded favorites are paginated by page number.
+
     Args:
         client_id (int): The ID of the client.
+        request (Request): The request, with its conditional headers.
+        response (HTTPResponse): The response, where the ETag is set.
+        cursor (Optional[str]): The cursor returned by the previous page.
+        page_size (Optional[int]): The number of favorites per page, capped
+        by the MAX_PAGE_SIZE setting.
+        expand (Optional[str]): "product" to include the product details.
+        sort (Optional[str]): "price" or "reviewScore", prefixed with "-"
+        for descending order. Only with `expand=product`.
+        page (int): The current page number. Only with `expand=product`.
 
     Returns:
         list[Favorite]: List of favorite products.
     """
 
-    favorites = await DatabaseFavorite.get_favorites(client_id=client_id)
+    if cursor or page_size or (expand and page > 1):
+        page_size = resolve_page_size(page_size)
+    if expand:
+        favorites = await DatabaseFavorite.get_expanded_favorites(
+            client_id=client_id, sort=sort, page=page, page_size=page_size
+        )
+    else:
+        favorites = await DatabaseFavorite.get_favorites(
+            client_id=client_id, cursor=cursor, page_size=page_size
+        )
+    not_modified = conditional_response(
+        request, response, favorites_version(favorites)
+    )
+    if not_modified:
+        return not_modified
     return Response(
         status_code=200,
         response_type=resources.get("requests.success"),
@@ -33,6 +108,60 @@ async def get_favorites(client_id: int):
     )
 
 
+@router.get(
+    "/by-product/{product_id}",
+    response_description=resources.get("favorites.clients_retrieved"),
+    response_model=Response,
+)
+async def get_clients_by_product(
+    product_id: int,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1),
+    stream: bool = False,
+):
+    """
+    Retrieve the IDs of the clients that favorited a product, in client ID
+    order, one page at a time.
+
+    With `stream=true` every client ID is streamed as NDJSON instead, for
+    audiences too large to page through.
+
+    Args:
+        product_id (int): The ID of the product.
+        cursor (Optional[str]): The cursor returned by the previous page.
+        page_size (Optional[int]): The number of clients per page, capped by
+        the MAX_PAGE_SIZE setting.
+        stream (bool): Stream all the clients as NDJSON.
+
+    Returns:
+        Response: The client IDs of the page and the cursor of the next
+        page, or a StreamingResponse with one `{"client_id": ...}` line per
+        client.
+    """
+    if stream:
+        await DatabaseFavorite.raise_if_product_not_found(product_id)
+        client_ids = DatabaseFavorite.iter_clients_by_product(
+            product_id, batch_size=STREAM_BATCH_SIZE
+        )
+        documents = (
+            {"client_id": client_id} async for client_id in client_ids
+        )
+        return StreamingResponse(
+            ndjson_chunks(documents, STREAM_BATCH_SIZE),
+            media_type=media_types[ExportFormat.ndjson],
+        )
+
+    clients = await DatabaseFavorite.get_clients_by_product(
+        product_id, cursor, resolve_page_size(page_size)
+    )
+    return Response(
+        status_code=200,
+        response_type=resources.get("requests.success"),
+        description=resources.get("favorites.clients_retrieved"),
+        data=clients,
+    )
+
+
 @router.post(
     "/",
     response_description=resources.get("favorites.added"),
@@ -99,3 +228,121 @@ async def delete_favorite(client_id: int, product_id: int):
             status_code=404,
             detail=resources.get("favorites.not_found").format(product_id),
         )
+
+
+async def update_favorites(
+    client_id: int, favorites: FavoriteProducts, mode: str
+) -> Response:
+    """
+    Apply a batch change to the favorites of a client.
+
+    Args:
+        client_id (int): The ID of the client.
+        favorites (FavoriteProducts): The products of the favorites.
+        mode (str): "add", "remove" or "replace".
+
+    Returns:
+        Response: The added, removed and missing product IDs.
+    """
+    result = await DatabaseFavorite.update_favorites(
+        client_id, favorites.product_ids, mode
+    )
+    return Response(
+        status_code=200,
+        response_type=resources.get("requests.success"),
+        description=resources.get("favorites.updated").format(client_id),
+        data=result,
+    )
+
+
+@router.put(
+    "/{client_id}",
+    response_description=resources.get("favorites.updated"),
+    response_model=Response,
+)
+async def replace_favorites(client_id: int, favorites: FavoriteProducts):
+    """
+    Replace the favorites of a client with the given products.
+
+    Products that do not exist are skipped and reported as missing.
+
+    Args:
+        client_id (int): The ID of the client.
+        favorites (FavoriteProducts): The products of the favorites.
+
+    Returns:
+        Response: The added, removed and missing product IDs.
+    """
+    return await update_favorites(client_id, favorites, "replace")
+
+
+@router.post(
+    "/{client_id}/add",
+    response_description=resources.get("favorites.updated"),
+    response_model=Response,
+)
+async def add_favorites(client_id: int, favorites: FavoriteProducts):
+    """
+    Add several products to the favorites of a client.
+
+    Products that are already favorites are left as they are, and products
+    that do not exist are skipped and reported as missing.
+
+    Args:
+        client_id (int): The ID of the client.
+        favorites (FavoriteProducts): The products to add.
+
+    Returns:
+        Response: The added and missing product IDs.
+    """
+    return await update_favorites(client_id, favorites, "add")
+
+
+@router.post(
+    "/{client_id}/remove",
+    response_description=resources.get("favorites.updated"),
+    response_model=Response,
+)
+async def remove_favorites(client_id: int, favorites: FavoriteProducts):
+    """
+    Remove several products from the favorites of a client.
+
+    Products that are not favorites are ignored.
+
+    Args:
+        client_id (int): The ID of the client.
+        favorites (FavoriteProducts): The products to remove.
+
+    Returns:
+        Response: The removed product IDs.
+    """
+    return await update_favorites(client_id, favorites, "remove")
+
+
+@router.post(
+    "/bulk",
+    response_description=resources.get("bulk.imported"),
+)
+async def add_favorites_bulk(request: Request):
+    """
+    Import favorites from an NDJSON body, one favorite per line.
+
+    The body is read as it arrives and written in unordered batches. Invalid
+    or duplicate rows are reported by line number and do not stop the
+    import.
+
+    Args:
+        request (Request): The request with the NDJSON body.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the number of inserted favorites with the errors
+        of the rejected rows.
+    """
+    report = await DatabaseFavorite.import_favorites(request.stream())
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("bulk.imported"),
+        "data": report,
+    }
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+
+from auth.token_cache import get_token_cache
+from config import metrics
+from database.product import get_product_cache
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+router = APIRouter()
+
+
+@router.get(
+    "/",
+    response_description=resources.get("metrics.retrieved"),
+)
+async def get_metrics():
+    """
+    Retrieve the in-process counters and cache statistics.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the counters of this worker.
+    """
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("metrics.retrieved"),
+        "data": {
+            "counters": metrics.snapshot(),
+            "token_cache": get_token_cache().stats(),
+            "product_cache": get_product_cache().stats(),
+        },
+    }
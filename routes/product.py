@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Body, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi import Response as HTTPResponse
 
 import database.favorite as DatabaseFavorite
 import database.product as DatabaseProduct
+from config.config import transaction
+from database.batch import parse_ids
+from database.bulk import bulk_insert
+from database.facets import get_facets_snapshot, note_product_write
+from database.pagination import resolve_page_size
+from database.popularity import get_popular_products
+from database.projection import parse_fields
 from models.product import Product, Response, UpdateProductModel
 from resources.resources import ResourceManager
+from routes.etag import conditional_response, document_version
 
 resources = ResourceManager()
 router = APIRouter()
@@ -14,21 +25,218 @@ router = APIRouter()
     response_description=resources.get("requests.product_retrived_request"),
     response_model=Response
 )
-async def get_products(page: int):
+async def get_products(
+    page: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None
+):
     """
     Retrieve a paginated list of products.
 
+    Without a page number, the products are paginated by cursor: each page
+    returns the cursor of the next one.
+
     Args:
-        page (int): The current page number.
+        page (Optional[int]): The current page number.
+        cursor (Optional[str]): The cursor returned by the previous page.
+        page_size (Optional[int]): The number of products per page, capped
+        by the MAX_PAGE_SIZE setting.
+        fields (Optional[str]): Comma-separated fields to return. The ID is
+        always returned.
 
     Returns:
         dict: A dictionary containing the status code, response type,
         description, and product data.
     """
+    page_size = resolve_page_size(page_size)
+    selected_fields = parse_fields(Product, fields)
+    if page is None:
+        products = await DatabaseProduct.list_products_page(
+            cursor, page_size, selected_fields
+        )
+    else:
+        products = await DatabaseProduct.list_products(
+            page=page, page_size=page_size, fields=selected_fields
+        )
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("product.product_retrived"),
+        "data": products,
+    }
+
+
+@router.get(
+    "/search",
+    response_description=resources.get("product.product_retrived"),
+    response_model=Response
+)
+async def search_products(
+    q: Optional[str] = Query(None, min_length=1),
+    brand: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_score: Optional[float] = None,
+    sort: Optional[str] = Query(
+        None, pattern="^-?(price|reviewScore)$"
+    ),
+    page: int = Query(1, ge=1),
+    page_size: Optional[int] = Query(None, ge=1),
+):
     """
-    Não colocado o tamanho da pagina pois não estava na documentação
+    Search products by text, brand, price range and review score.
+
+    Args:
+        q (Optional[str]): Words searched in the title and the brand.
+        brand (Optional[str]): The exact brand of the products.
+        min_price (Optional[float]): The minimum price.
+        max_price (Optional[float]): The maximum price.
+        min_score (Optional[float]): The minimum review score.
+        sort (Optional[str]): "price" or "reviewScore", prefixed with "-"
+        for descending order. Text searches default to relevance order.
+        page (int): The current page number.
+        page_size (Optional[int]): The number of products per page, capped
+        by the MAX_PAGE_SIZE setting.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the products of the page.
     """
-    products = await DatabaseProduct.list_products(page=page)
+    query = DatabaseProduct.build_search_query(
+        q, brand, min_price, max_price, min_score
+    )
+    products = await DatabaseProduct.search_products(
+        query, sort, page, resolve_page_size(page_size)
+    )
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("product.product_retrived"),
+        "data": products,
+    }
+
+
+@router.get(
+    "/facets",
+    response_description=resources.get("product.facets_retrieved"),
+    response_model=Response
+)
+async def get_product_facets():
+    """
+    Retrieve the catalog facets: the product count per brand and the price
+    histogram.
+
+    The facets are precomputed and served from memory, so they may lag
+    behind the last product writes by up to FACETS_REFRESH_INTERVAL
+    seconds.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the catalog facets.
+    """
+    facets = await get_facets_snapshot().get()
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("product.facets_retrieved"),
+        "data": {
+            "total_products": facets.total_products,
+            "brands": facets.brands,
+            "price_histogram": facets.price_histogram,
+            "refreshed_at": facets.refreshed_at,
+        },
+    }
+
+
+@router.get(
+    "/top",
+    response_description=resources.get("product.facets_retrieved"),
+    response_model=Response
+)
+async def get_top_products(
+    brand: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Retrieve the best rated products of a brand, or of every brand.
+
+    The leaderboards are precomputed with the catalog facets.
+
+    Args:
+        brand (Optional[str]): The brand. All brands if not informed.
+        limit (Optional[int]): The number of products per brand, capped by
+        the FACETS_TOP_SIZE setting.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the leaderboards.
+    """
+    snapshot = get_facets_snapshot()
+    if brand is None:
+        leaderboards = (await snapshot.get()).top_rated
+    else:
+        leaderboards = [await snapshot.top(brand)]
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("product.facets_retrieved"),
+        "data": [
+            {"brand": top.brand, "products": top.products[:limit]}
+            for top in leaderboards
+        ],
+    }
+
+
+@router.get(
+    "/popular",
+    response_description=resources.get("product.product_retrived"),
+    response_model=Response
+)
+async def get_most_favorited_products(
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Retrieve the most favorited products.
+
+    The products are read in order from the index on their favorite
+    counters, which are kept up to date on every favorite write.
+
+    Args:
+        limit (Optional[int]): The number of products. Default is PAGE_SIZE,
+        capped by MAX_PAGE_SIZE.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the products with their number of favorites.
+    """
+    products = await get_popular_products(resolve_page_size(limit))
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("product.product_retrived"),
+        "data": products,
+    }
+
+
+@router.get(
+    "/batch",
+    response_description=resources.get("product.product_retrived"),
+    response_model=Response
+)
+async def get_products_batch(ids: str):
+    """
+    Retrieve several products by ID in a single request.
+
+    Args:
+        ids (str): The comma-separated IDs, at most MAX_BATCH_IDS.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, the found products in the order of the IDs, and the
+        IDs that were not found.
+    """
+    products = await DatabaseProduct.get_products_by_ids(parse_ids(ids))
     return {
         "status_code": 200,
         "response_type": resources.get("requests.success"),
@@ -42,12 +250,19 @@ async def get_products(page: int):
     response_description=resources.get("product.product_retrived"),
     response_model=Response
 )
-async def get_product_data(id: int):
+async def get_product_data(
+    id: int, request: Request, response: HTTPResponse
+):
     """
     Retrieve data for a specific product by ID.
 
+    The response has an ETag, and a request with a matching If-None-Match
+    header gets an empty `304 Not Modified` response.
+
     Args:
         id (int): The ID of the product to retrieve.
+        request (Request): The request, with its conditional headers.
+        response (HTTPResponse): The response, where the ETag is set.
 
     Returns:
         dict: A dictionary containing the status code, response type,
@@ -57,6 +272,11 @@ async def get_product_data(id: int):
 
     product = await DatabaseProduct.get_product(id)
     if product:
+        not_modified = conditional_response(
+            request, response, document_version(product)
+        )
+        if not_modified:
+            return not_modified
         return {
             "status_code": 200,
             "response_type": resources.get("requests.success"),
@@ -89,13 +309,6 @@ async def add_product_data(product: Product = Body(...)):
         HTTPException: If a product with the same ID already exists.
 """
 
-    product_exists = await Product.find_one(Product.id == product.id)
-    if product_exists:
-        raise HTTPException(
-            status_code=409,
-            detail=resources.get("product.product_already_exists")
-        )
-
     new_product = await DatabaseProduct.add_product(product)
     return {
         "status_code": 201,
@@ -118,20 +331,24 @@ async def delete_product(id: int):
 
     Returns:
         dict: A dictionary containing the status code, response type,
-        description, and a flag indicating whether the product was deleted.
+        description, and the number of favorites removed with the product.
     """
 
     # Antes de excluir o produto é necessário excluir os favoritos dele
-    # Fazendo sem transação por não ter os replicasets configurados
-    await DatabaseFavorite.delete_all_favorites(product_id=id)
-
-    deleted_product = await DatabaseProduct.delete_product(id)
+    # Em transação apenas com USE_TRANSACTIONS (requer replicaset)
+    async with transaction() as session:
+        favorites_removed = await DatabaseFavorite.delete_all_favorites(
+            product_id=id, session=session
+        )
+        deleted_product = await DatabaseProduct.delete_product(
+            id, session=session
+        )
     if deleted_product:
         return {
             "status_code": 200,
             "response_type": resources.get("requests.success"),
             "description": resources.get("product.product_removed").format(id),
-            "data": deleted_product,
+            "data": {"favorites_removed": favorites_removed},
         }
     raise HTTPException(
         status_code=404,
@@ -172,3 +389,37 @@ async def update_product(id_product: int, req: UpdateProductModel = Body(...)):
         status_code=404,
         detail=resources.get("product.product_not_found").format(id_product),
     )
+
+
+@router.post(
+    "/bulk",
+    response_description=resources.get("bulk.imported"),
+)
+async def add_products_bulk(request: Request):
+    """
+    Import products from an NDJSON body, one product per line.
+
+    The body is read as it arrives and written in unordered batches. Invalid
+    or duplicate rows are reported by line number and do not stop the
+    import.
+
+    Args:
+        request (Request): The request with the NDJSON body.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the number of inserted products with the errors
+        of the rejected rows.
+    """
+    report = await bulk_insert(Product, request.stream())
+    DatabaseProduct.get_product_count_cache().adjust(report["inserted"])
+    # The imported IDs may be cached as missing
+    DatabaseProduct.get_product_cache().clear()
+    if report["inserted"]:
+        note_product_write()
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("bulk.imported"),
+        "data": report,
+    }
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException
 
+import database.user as DatabaseUser
+from auth.jwt_bearer import get_claims, token_listener
 from auth.jwt_handler import sign_jwt
-from config.config import Settings
-from models.user import UserLogin
+from auth.password import reject_unknown_user, verify_password
+from auth.refresh import (issue_refresh_token, new_family,
+                          revoke_refresh_family, rotate_refresh_token)
+from auth.revocation import get_revocation_list
+from auth.token_cache import get_token_cache
+from config import metrics
+from models.user import RefreshCredentials, RevokeToken, UserLogin
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
@@ -14,27 +21,136 @@ async def user_login(user_credentials: UserLogin = Body(...)):
     """
     Handles user login by verifying credentials and returning a JWT token.
 
-    This function checks if the provided username and password match the values
-    stored in the application's settings.
-    If valid, it generates and returns a signed JWT token.
+    This function looks up the user in the users collection and checks the
+    password against its stored hash, off the event loop. Unknown usernames
+    are checked against a dummy hash, so they are not told apart by timing.
+    If valid, it generates and returns a signed JWT token and a refresh
+    token to renew it through `/auth/refresh`.
     Args:
         user_credentials (UserLogin): The user's login credentials.
     Returns:
-        dict: A dictionary containing the signed JWT token
-        if authentication is successful.
+        dict: A dictionary containing the signed JWT token and the refresh
+        token if authentication is successful.
 
     Raises:
         HTTPException: If the username or password is incorrect.
     """
-    """ Por ser uma demonstração estou usando o usuario e senha do .env """
-    """ para não precisar fazer o esquema de cadastro, função de hash, e etc"""
-    if (
-        user_credentials.username == Settings().API_USER
-        and user_credentials.password == Settings().API_PASS
+    user = await DatabaseUser.get_user(user_credentials.username)
+    if user is None:
+        await reject_unknown_user(user_credentials.password)
+    elif await verify_password(
+        user.username, user_credentials.password, user.password_hash
     ):
-        return sign_jwt(user_credentials.username)
+        metrics.incr("auth.logins")
+        family = new_family()
+        return {
+            **sign_jwt(user.username, family),
+            "refresh_token": await issue_refresh_token(user.username, family),
+        }
 
     raise HTTPException(
         status_code=401,
         detail=resources.get("auth.login_failure")
     )
+
+
+@router.post("/refresh")
+async def refresh_token(credentials: RefreshCredentials = Body(...)):
+    """
+    Renews an access token using a refresh token.
+
+    The refresh token is rotated: it can be used only once and a new one is
+    returned with the access token. Reusing a refresh token revokes the
+    whole session.
+    Args:
+        credentials (RefreshCredentials): The refresh token.
+    Returns:
+        dict: A dictionary containing the signed JWT token and the next
+        refresh token.
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired or reused.
+    """
+    rotated = await rotate_refresh_token(credentials.refresh_token)
+    if not rotated:
+        raise HTTPException(
+            status_code=401,
+            detail=resources.get("auth.invalid_refresh_token")
+        )
+
+    metrics.incr("auth.renewals")
+    return {
+        **sign_jwt(rotated.login, rotated.family),
+        "refresh_token": await issue_refresh_token(
+            rotated.login, rotated.family
+        ),
+    }
+
+
+@router.post(
+    "/users",
+    response_description=resources.get("auth.user_created"),
+    dependencies=[Depends(token_listener)]
+)
+async def add_user(user_credentials: UserLogin = Body(...)):
+    """
+    Registers a new API user. Requires an authenticated user.
+
+    Args:
+        user_credentials (UserLogin): The login and password of the new user.
+
+    Returns:
+        dict: A dictionary containing the status code, response type,
+        description, and the username of the created user.
+
+    Raises:
+        HTTPException: If a user with the same username already exists.
+    """
+    user = await DatabaseUser.add_user(
+        user_credentials.username, user_credentials.password
+    )
+    return {
+        "status_code": 201,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("auth.user_created"),
+        "data": {"username": user.username},
+    }
+
+
+@router.post(
+    "/revoke",
+    response_description=resources.get("auth.token_revoked"),
+    dependencies=[Depends(token_listener)]
+)
+async def revoke_token(req: RevokeToken = Body(...)):
+    """
+    Revokes a token before its expiration (ex: on logout), with the refresh
+    tokens of its session.
+
+    Args:
+        req (RevokeToken): The token to revoke.
+
+    Returns:
+        dict: A dictionary containing the status code, response type
+        and description.
+
+    Raises:
+        HTTPException: If the token is invalid or already expired.
+    """
+    claims = get_claims(req.token)
+    if not claims or "jti" not in claims:
+        raise HTTPException(
+            status_code=401,
+            detail=resources.get("auth.invalid_token")
+        )
+
+    await get_revocation_list().revoke(claims["jti"], claims["expires"])
+    if "family" in claims:
+        await revoke_refresh_family(claims["family"])
+    get_token_cache().discard(req.token)
+    return {
+        "status_code": 200,
+        "response_type": resources.get("requests.success"),
+        "description": resources.get("auth.token_revoked"),
+        "data": None,
+    }
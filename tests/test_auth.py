@@ -1,8 +1,16 @@
+import time
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
 
 from app import app
-from auth.jwt_bearer import verify_jwt
+from auth.bloom import BloomFilter
+from auth.jwt_bearer import get_claims, verify_jwt
+from auth.password import check_password, hash_password
+from auth.revocation import RevocationList, get_revocation_list
+from auth.token_cache import TokenCache, get_token_cache
+from config.config import get_settings, reload_settings
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
@@ -33,6 +41,67 @@ def test_login_failure(client):
     assert response.json() == {"detail": resources.get("auth.login_failure")}
 
 
+def test_login_unknown_user_checks_password(client, monkeypatch):
+    """
+    Testa que o login de um usuário inexistente também verifica a senha,
+    para não revelar pelo tempo quais usuários existem.
+    """
+    checked = []
+    monkeypatch.setattr(
+        "auth.password.check_password",
+        lambda password, password_hash: checked.append(password)
+    )
+    response = client.post(
+        "/auth/login",
+        json={"username": "username_errado", "password": "password_errado"}
+    )
+    assert response.status_code == 401
+    assert checked == ["password_errado"]
+
+
+def test_refresh_token(client):
+    """Testa a renovação do token com o refresh token."""
+    response_login = client.post(
+        "/auth/login",
+        json={"username": "admin", "password": "admin"}
+    )
+    refresh_token = response_login.json()["refresh_token"]
+
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 200
+    json_response = response.json()
+    assert verify_jwt(json_response["access_token"])
+    assert json_response["refresh_token"] != refresh_token
+
+
+def test_refresh_token_reuse(client):
+    """Testa que um refresh token já usado revoga toda a sessão."""
+    response_login = client.post(
+        "/auth/login",
+        json={"username": "admin", "password": "admin"}
+    )
+    refresh_token = response_login.json()["refresh_token"]
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    next_refresh_token = response.json()["refresh_token"]
+
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 401
+    assert response.json() == {
+        "detail": resources.get("auth.invalid_refresh_token")
+    }
+
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": next_refresh_token}
+    )
+    assert response.status_code == 401
+
+
 def test_valid_token(client):
     """Testa um acesso com token valido."""
     response_login = client.post(
@@ -41,3 +110,128 @@ def test_valid_token(client):
     )
     token = response_login.json()["access_token"]
     assert verify_jwt(token)
+
+
+def test_settings_snapshot_is_cached():
+    """Testa que as configurações são lidas uma única vez até o reload."""
+    assert get_settings() is get_settings()
+
+    reloaded = reload_settings()
+    assert get_settings() is reloaded
+    assert reloaded.SECRET_KEY
+
+
+def test_verified_token_is_cached(client):
+    """Testa que um token já verificado é servido pelo cache."""
+    response_login = client.post(
+        "/auth/login",
+        json={"username": "admin", "password": "admin"}
+    )
+    token = response_login.json()["access_token"]
+    assert verify_jwt(token)
+
+    hits = get_token_cache().stats().get("token_cache.hits", 0)
+    assert verify_jwt(token)
+    assert get_token_cache().stats()["token_cache.hits"] == hits + 1
+
+
+def test_token_cache_drops_expired_tokens():
+    """Testa que um token expirado não é retornado pelo cache."""
+    cache = TokenCache(max_size=10)
+    cache.put("expired", {"login": "admin", "expires": time.time() - 1})
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+
+def test_token_cache_evicts_least_recently_used():
+    """Testa a remoção do token menos usado quando o cache está cheio."""
+    cache = TokenCache(max_size=2)
+    claims = {"login": "admin", "expires": time.time() + 60}
+    cache.put("first", claims)
+    cache.put("second", claims)
+    cache.get("first")
+    cache.put("third", claims)
+    assert cache.get("second") is None
+    assert cache.get("first") == claims
+    assert cache.get("third") == claims
+
+
+def test_password_hash_is_salted():
+    """Testa que o hash da senha usa um salt aleatório."""
+    first_hash = hash_password("secret")
+    second_hash = hash_password("secret")
+    assert first_hash != second_hash
+    assert check_password("secret", first_hash)
+    assert not check_password("wrong", first_hash)
+
+
+def test_add_user_and_login(client):
+    """Testa o cadastro de um novo usuário e o login com ele."""
+    username = f"user-{uuid.uuid4().hex}"
+    credentials = {"username": username, "password": "s3cret"}
+
+    response = client.post("/auth/users", json=credentials)
+    assert response.status_code == 200
+    assert response.json()["data"] == {"username": username}
+
+    response = client.post("/auth/users", json=credentials)
+    assert response.status_code == 409
+    assert response.json() == {
+        "detail": resources.get("auth.user_already_exists")
+    }
+
+    response = client.post("/auth/login", json=credentials)
+    assert response.status_code == 200
+    assert "access_token" in response.json()
+
+
+def test_revoke_token(client, test_client):
+    """Testa a revogação de um token válido e do refresh token da sessão."""
+    response_login = client.post(
+        "/auth/login",
+        json={"username": "admin", "password": "admin"}
+    )
+    token = response_login.json()["access_token"]
+    refresh_token = response_login.json()["refresh_token"]
+
+    response = client.post("/auth/revoke", json={"token": token})
+    assert response.status_code == 200
+    assert (
+        response.json()["description"] == resources.get("auth.token_revoked")
+    )
+
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 401
+
+    # A autenticação é desativada nos testes: consulta a lista diretamente
+    jti = get_claims(token)["jti"]
+    revocations = get_revocation_list()
+    assert test_client.portal.call(revocations.is_revoked, jti)
+    test_client.portal.call(revocations.refresh)
+    assert test_client.portal.call(revocations.is_revoked, jti)
+
+    # Outro worker vê a revogação, sem contar duas vezes a mesma
+    other_worker = RevocationList(capacity=1000, refresh_interval=60)
+    assert test_client.portal.call(other_worker.is_revoked, jti)
+    count = other_worker._filter.count
+    test_client.portal.call(other_worker.refresh)
+    assert other_worker._filter.count == count
+
+
+def test_revoke_invalid_token(client):
+    """Testa a revogação de um token inválido."""
+    response = client.post("/auth/revoke", json={"token": "invalid"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": resources.get("auth.invalid_token")}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Testa que todo item adicionado ao filtro de Bloom é encontrado."""
+    bloom = BloomFilter(capacity=1000)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert sum(uuid.uuid4().hex in bloom for _ in range(1000)) < 20
@@ -263,3 +263,164 @@ def test_update_nonexistent_client(test_client):
         json_response["detail"]
         == resources.get("client.client_not_found").format(id_to_update)
     )
+
+
+def test_get_clients_by_cursor(test_client):
+    """
+    Testa a listagem de clientes paginada por cursor.
+    """
+    client_ids = [99801, 99802, 99803]
+    for client_id in client_ids:
+        test_client.delete(f"/client/{client_id}")
+        test_client.post("/client", json=get_default_client(client_id))
+
+    seen_ids = []
+    params = {"page_size": 2}
+    while True:
+        response = test_client.get("/client", params=params)
+        assert response.status_code == 200
+        page = response.json()["data"]
+        assert len(page["items"]) <= 2
+        seen_ids.extend(client["id"] for client in page["items"])
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen_ids == sorted(seen_ids)
+    assert set(client_ids) <= set(seen_ids)
+
+    for client_id in client_ids:
+        test_client.delete(f"/client/{client_id}")
+
+
+def test_get_clients_invalid_cursor(test_client):
+    """
+    Testa a listagem de clientes com um cursor inválido.
+    """
+    response = test_client.get("/client", params={"cursor": "invalid"})
+    assert response.status_code == 400
+    assert (
+        response.json()["detail"]
+        == resources.get("requests.invalid_cursor")
+    )
+
+
+def test_add_client_with_existing_email_other_case(test_client):
+    """
+    Testa que o e-mail único não diferencia maiúsculas de minúsculas.
+    """
+    client_id_1 = 1003
+    client_id_2 = 1004
+    client_data_1 = get_default_client(client_id_1)
+    client_data_1["email"] = "case@example.com"
+    client_data_2 = get_default_client(client_id_2)
+    client_data_2["email"] = "CASE@example.com"
+
+    try:
+        test_client.delete(f"/client/{client_id_1}")
+        test_client.delete(f"/client/{client_id_2}")
+
+        response_1 = test_client.post("/client", json=client_data_1)
+        assert response_1.status_code == 200
+
+        response_2 = test_client.post("/client", json=client_data_2)
+        assert response_2.status_code == 409
+        assert (
+            response_2.json()["detail"]
+            == resources.get("client.client_already_exists")
+        )
+    finally:
+        test_client.delete(f"/client/{client_id_1}")
+        test_client.delete(f"/client/{client_id_2}")
+
+
+def test_update_client_with_stale_revision(test_client):
+    """
+    Testa a atualização de um cliente com uma revisão desatualizada.
+    """
+    id_to_update = 9994
+    test_client.delete(f"/client/{id_to_update}")
+    test_client.post("/client", json=get_default_client(id_to_update))
+
+    response = test_client.put(
+        f"/client/{id_to_update}",
+        json={"name": "First", "email": None, "revision": 0}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["revision"] == 1
+
+    response = test_client.put(
+        f"/client/{id_to_update}",
+        json={"name": "Second", "email": None, "revision": 0}
+    )
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"]
+        == resources.get("client.revision_conflict").format(id_to_update)
+    )
+
+    test_client.delete(f"/client/{id_to_update}")
+
+
+def test_get_clients_with_fields(test_client):
+    """
+    Testa a listagem de clientes retornando apenas os campos pedidos.
+    """
+    id_to_get = 9995
+    test_client.delete(f"/client/{id_to_get}")
+    test_client.post("/client", json=get_default_client(id_to_get))
+
+    response = test_client.get("/client", params={"fields": "name"})
+    assert response.status_code == 200
+    clients = response.json()["data"]
+    assert {"id": id_to_get, "name": f"Client {id_to_get}"} in clients
+    assert all(set(client) == {"id", "name"} for client in clients)
+
+    test_client.delete(f"/client/{id_to_get}")
+
+
+def test_get_client_not_modified(test_client):
+    """
+    Testa a consulta condicional de um cliente com If-None-Match.
+    """
+    id_to_get = 9995
+    test_client.delete(f"/client/{id_to_get}")
+    test_client.post("/client", json=get_default_client(id_to_get))
+
+    etag = test_client.get(f"/client/{id_to_get}").headers["etag"]
+    response = test_client.get(
+        f"/client/{id_to_get}", headers={"If-None-Match": f"W/{etag}"}
+    )
+    assert response.status_code == 304
+
+    test_client.delete(f"/client/{id_to_get}")
+
+
+def test_get_clients_batch(test_client):
+    """
+    Testa a consulta de vários clientes em uma requisição, na ordem pedida.
+    """
+    ids = [9997, 9996]
+    for id_to_add in ids:
+        test_client.delete(f"/client/{id_to_add}")
+        test_client.post("/client", json=get_default_client(id_to_add))
+
+    response = test_client.get(
+        "/client/batch", params={"ids": "9997,9998,9996"}
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [client["id"] for client in data["items"]] == ids
+    assert data["missing"] == [9998]
+
+    response = test_client.get(
+        "/client/batch", params={"ids": ",".join(map(str, range(101)))}
+    )
+    assert response.status_code == 400
+    assert (
+        response.json()["detail"]
+        == resources.get("requests.too_many_ids").format(100)
+    )
+
+    for id_to_delete in ids:
+        test_client.delete(f"/client/{id_to_delete}")
@@ -0,0 +1,111 @@
+import json
+from functools import partial
+
+from database.catalog_sync import sync_catalog
+from resources.resources import ResourceManager
+
+resources = ResourceManager()
+
+
+def get_default_product(id):
+    return {
+        "id": id,
+        "title": f"Product {id}",
+        "price": 100.0,
+        "image": f"https://site.com/product{id}.jpg",
+        "brand": f"Brand {id}",
+        "reviewScore": 9.1,
+    }
+
+
+def test_export_products_ndjson(test_client):
+    """
+    Testa a exportação de produtos em NDJSON a partir de um ID.
+    """
+    product_ids = [99601, 99602]
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+
+    response = test_client.get(
+        "/export/product",
+        params={"after": 99600, "fields": "title", "batch_size": 1}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows[:2] == [
+        {"id": product_id, "title": f"Product {product_id}"}
+        for product_id in product_ids
+    ]
+
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_export_hides_internal_fields(test_client):
+    """
+    Testa que a exportação de todos os campos não inclui os campos
+    internos, como o hash do catálogo.
+    """
+    product_id = 99611
+    test_client.delete(f"/product/{product_id}")
+    line = json.dumps(get_default_product(product_id))
+    test_client.portal.call(
+        partial(sync_catalog, [line], delete_missing=False)
+    )
+
+    response = test_client.get(
+        "/export/product", params={"after": product_id - 1}
+    )
+    assert response.status_code == 200
+    row = json.loads(response.text.splitlines()[0])
+    assert row == {**get_default_product(product_id), "revision": 0}
+
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_export_products_csv(test_client):
+    """
+    Testa a exportação de produtos em CSV.
+    """
+    product_id = 99603
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+
+    response = test_client.get(
+        "/export/product",
+        params={"format": "csv", "fields": "price", "after": product_id - 1}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,price"
+    assert lines[1] == f"{product_id},100.0"
+
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_export_unknown_collection(test_client):
+    """
+    Testa a exportação de uma coleção inexistente.
+    """
+    response = test_client.get("/export/user")
+    assert response.status_code == 404
+    assert (
+        response.json()["detail"]
+        == resources.get("export.collection_not_found").format("user")
+    )
+
+
+def test_export_unknown_field(test_client):
+    """
+    Testa a exportação com um campo inexistente.
+    """
+    response = test_client.get(
+        "/export/client", params={"fields": "password"}
+    )
+    assert response.status_code == 400
+    assert (
+        response.json()["detail"]
+        == resources.get("requests.invalid_fields").format("password")
+    )
@@ -1,3 +1,17 @@
+import json
+from functools import partial
+
+import pytest
+from fastapi import HTTPException
+
+import config.config as config
+import database.favorite_embedded as embedded
+from config.config import get_settings
+from database.favorite import apply_favorite_changes
+from database.favorite_migration import migrate_to_embedded
+from models.client_favorites import ClientFavorites
+from models.favorite import Favorite
+from models.product import Product
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
@@ -150,3 +164,572 @@ def test_delete_favorite_nonexistent(test_client):
         json_response["detail"]
         == resources.get("favorites.not_found_for_product").format(product_id)
     )
+
+
+def test_get_favorites_by_cursor(test_client):
+    """
+    Testa a listagem de favoritos paginada por cursor.
+    """
+    client_id = 99871
+    product_ids = [99871, 99872, 99873]
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+        test_client.post("/favorite/", params={
+            "client_id": client_id, "product_id": product_id
+        })
+
+    favorites = []
+    params = {"page_size": 2}
+    while True:
+        response = test_client.get(f"/favorite/{client_id}", params=params)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        favorites.extend(data["favorites"])
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert sorted(favorites) == product_ids
+
+    test_client.delete(f"/client/{client_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_add_existing_favorite(test_client):
+    """
+    Testa a adição de um favorito já existente.
+    """
+    client_id = 99983
+    product_id = 99983
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+    params = {"client_id": client_id, "product_id": product_id}
+
+    test_client.post("/favorite/", params=params)
+    response = test_client.post("/favorite/", params=params)
+
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"]
+        == resources.get("favorites.already_exists").format(product_id)
+    )
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_delete_product_removes_favorites(test_client):
+    """
+    Testa que excluir um produto remove os favoritos dele.
+    """
+    client_ids = [99891, 99892]
+    product_id = 99891
+
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+    for client_id in client_ids:
+        test_client.delete(f"/client/{client_id}")
+        test_client.post("/client", json=get_default_client(client_id))
+        test_client.post("/favorite/", params={
+            "client_id": client_id, "product_id": product_id
+        })
+
+    response = test_client.delete(f"/product/{product_id}")
+    assert response.status_code == 200
+    assert response.json()["data"] == {"favorites_removed": len(client_ids)}
+
+    for client_id in client_ids:
+        response = test_client.get(f"/favorite/{client_id}")
+        assert response.json()["data"]["favorites"] == []
+        test_client.delete(f"/client/{client_id}")
+
+
+def test_add_favorites_bulk(test_client):
+    """
+    Testa a importação de favoritos em lote com um cliente inexistente.
+    """
+    client_id = 99893
+    missing_client_id = 99894
+    product_id = 99893
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/client/{missing_client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+
+    body = "\n".join([
+        json.dumps({"client_id": client_id, "product_id": product_id}),
+        json.dumps({"client_id": missing_client_id, "product_id": product_id}),
+    ])
+    response = test_client.post("/favorite/bulk", content=body)
+    assert response.status_code == 200
+    report = response.json()["data"]
+    assert report["inserted"] == 1
+    assert report["errors"] == [{
+        "line": 2,
+        "error": resources.get("favorites.client_not_found")
+        .format(missing_client_id)
+    }]
+
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == [product_id]
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_get_favorites_not_modified(test_client):
+    """
+    Testa que a consulta condicional de favoritos muda ao incluir um
+    favorito.
+    """
+    client_id = 9891
+    product_id = 9891
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    test_client.post("/product", json=get_default_product(product_id))
+
+    etag = test_client.get(f"/favorite/{client_id}").headers["etag"]
+    response = test_client.get(
+        f"/favorite/{client_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    test_client.post(
+        "/favorite",
+        params={"client_id": client_id, "product_id": product_id}
+    )
+    response = test_client.get(
+        f"/favorite/{client_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["favorites"] == [product_id]
+
+    expanded = f"/favorite/{client_id}?expand=product"
+    etag = test_client.get(expanded).headers["etag"]
+    response = test_client.get(expanded, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    test_client.put(f"/product/{product_id}", json={"price": 150.0})
+    response = test_client.get(expanded, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"]["favorites"][0]["price"] == 150.0
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_get_expanded_favorites(test_client):
+    """
+    Testa a listagem de favoritos com os dados dos produtos, ordenada por
+    preço e paginada.
+    """
+    client_id = 9892
+    prices = {9892: 30.0, 9893: 10.0, 9894: 20.0}
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    for product_id, price in prices.items():
+        test_client.delete(f"/product/{product_id}")
+        product = get_default_product(product_id)
+        product["price"] = price
+        test_client.post("/product", json=product)
+        test_client.post(
+            "/favorite",
+            params={"client_id": client_id, "product_id": product_id}
+        )
+
+    response = test_client.get(
+        f"/favorite/{client_id}",
+        params={"expand": "product", "sort": "price", "page_size": 2},
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [favorite["price"] for favorite in data["favorites"]] == [
+        10.0, 20.0
+    ]
+    assert data["favorites"][0]["title"] == "Product 9893"
+    assert data["has_next"]
+
+    response = test_client.get(
+        f"/favorite/{client_id}",
+        params={"expand": "product", "sort": "price", "page_size": 2,
+                "page": 2},
+    )
+    data = response.json()["data"]
+    assert [favorite["product_id"] for favorite in data["favorites"]] == [
+        9892
+    ]
+    assert not data["has_next"]
+
+    # O favorito de um produto removido não conta na página
+    test_client.portal.call(partial(
+        Product.get_motor_collection().delete_one, {"_id": 9892}
+    ))
+    response = test_client.get(
+        f"/favorite/{client_id}",
+        params={"expand": "product", "page_size": 1},
+    )
+    data = response.json()["data"]
+    assert [favorite["product_id"] for favorite in data["favorites"]] == [
+        9893
+    ]
+    assert data["has_next"]
+
+    test_client.delete(f"/client/{client_id}")
+    for product_id in prices:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_add_favorite_nonexistent_client_leaves_nothing(test_client):
+    """
+    Testa que um favorito de um cliente inexistente não é gravado.
+    """
+    client_id = 9895
+    product_id = 9895
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+
+    response = test_client.post(
+        "/favorite",
+        params={"client_id": client_id, "product_id": product_id}
+    )
+    assert response.status_code == 404
+    assert (
+        response.json()["detail"]
+        == resources.get("favorites.client_not_found").format(client_id)
+    )
+
+    test_client.post("/client", json=get_default_client(client_id))
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == []
+
+    test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+
+
+def test_update_favorites(test_client):
+    """
+    Testa a adição, remoção e substituição de vários favoritos de uma vez.
+    """
+    client_id = 9901
+    product_ids = [9901, 9902, 9903]
+    missing_product_id = 9904
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    test_client.delete(f"/product/{missing_product_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+
+    response = test_client.post(
+        f"/favorite/{client_id}/add",
+        json={"product_ids": [9901, 9902, missing_product_id]}
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["added"] == [9901, 9902]
+    assert data["missing"] == [missing_product_id]
+
+    response = test_client.put(
+        f"/favorite/{client_id}", json={"product_ids": [9902, 9903]}
+    )
+    data = response.json()["data"]
+    assert data["added"] == [9903]
+    assert data["removed"] == [9901]
+    assert data["favorites_count"] == 2
+
+    response = test_client.post(
+        f"/favorite/{client_id}/remove", json={"product_ids": [9901, 9902]}
+    )
+    assert response.json()["data"]["removed"] == [9902]
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == [9903]
+
+    response = test_client.post(
+        f"/favorite/{client_id + 1000}/add", json={"product_ids": [9901]}
+    )
+    assert response.status_code == 404
+
+    test_client.delete(f"/client/{client_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_update_favorites_counts_only_applied_changes(
+    test_client, monkeypatch
+):
+    """
+    Testa que a alteração em lote só conta os favoritos que ela mesma
+    removeu, e não os já removidos por outra requisição.
+    """
+    monkeypatch.setattr(config, "settings", get_settings().model_copy(
+        update={"FAVORITES_STORAGE": "documents"}
+    ))
+    client_id = 9912
+    product_ids = [9912, 9913]
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+    test_client.post(
+        "/favorite",
+        params={"client_id": client_id, "product_id": product_ids[0]}
+    )
+
+    # The stored favorites were read before another request removed one
+    added, removed = test_client.portal.call(partial(
+        apply_favorite_changes, client_id, product_ids, [], product_ids
+    ))
+    assert (added, removed) == ([], [product_ids[0]])
+
+    test_client.delete(f"/client/{client_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_get_clients_by_product(test_client):
+    """
+    Testa a listagem paginada e em streaming dos clientes que favoritaram
+    um produto.
+    """
+    client_ids = [9905, 9906, 9907]
+    product_id = 9905
+    test_client.delete(f"/product/{product_id}")
+    test_client.post("/product", json=get_default_product(product_id))
+    for client_id in client_ids:
+        test_client.delete(f"/client/{client_id}")
+        test_client.post("/client", json=get_default_client(client_id))
+        test_client.post(
+            "/favorite",
+            params={"client_id": client_id, "product_id": product_id}
+        )
+
+    url = f"/favorite/by-product/{product_id}"
+    response = test_client.get(url, params={"page_size": 2})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["client_ids"] == [9905, 9906]
+    response = test_client.get(
+        url, params={"page_size": 2, "cursor": data["next_cursor"]}
+    )
+    data = response.json()["data"]
+    assert data["client_ids"] == [9907]
+    assert data["next_cursor"] is None
+
+    response = test_client.get(url, params={"stream": True})
+    assert response.status_code == 200
+    assert [
+        json.loads(line) for line in response.text.splitlines()
+    ] == [{"client_id": client_id} for client_id in client_ids]
+
+    for client_id in client_ids:
+        test_client.delete(f"/client/{client_id}")
+    test_client.delete(f"/product/{product_id}")
+    response = test_client.get(url)
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def embedded_storage(monkeypatch):
+    monkeypatch.setattr(config, "settings", get_settings().model_copy(
+        update={"FAVORITES_STORAGE": "embedded", "FAVORITES_MAX_PER_CLIENT": 2}
+    ))
+
+
+def test_embedded_favorites(test_client, embedded_storage):
+    """
+    Testa os favoritos no modo de armazenamento embutido, incluindo o
+    limite de favoritos por cliente e a exclusão em cascata.
+    """
+    client_id = 9896
+    product_ids = [9896, 9897, 9898]
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+
+    def add(product_id):
+        return test_client.post(
+            "/favorite",
+            params={"client_id": client_id, "product_id": product_id}
+        )
+
+    assert add(9896).status_code == 200
+    assert add(9896).status_code == 409
+    assert add(9897).status_code == 200
+    response = add(9898)
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"]
+        == resources.get("favorites.limit_reached").format(client_id, 2)
+    )
+
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == [9896, 9897]
+
+    response = test_client.get(
+        f"/favorite/{client_id}", params={"page_size": 1}
+    )
+    data = response.json()["data"]
+    assert data["favorites"] == [9896]
+    response = test_client.get(
+        f"/favorite/{client_id}",
+        params={"page_size": 1, "cursor": data["next_cursor"]}
+    )
+    assert response.json()["data"]["favorites"] == [9897]
+
+    response = test_client.delete(f"/product/{9896}")
+    assert response.json()["data"]["favorites_removed"] == 1
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == [9897]
+
+    # A failed add for a missing client leaves the client missing
+    test_client.delete(f"/client/{client_id}")
+    assert add(9897).status_code == 404
+    assert test_client.get(f"/favorite/{client_id}").status_code == 404
+
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_embedded_changes_based_on_stale_favorites(
+    test_client, embedded_storage
+):
+    """
+    Testa que uma alteração em lote baseada em favoritos desatualizados não
+    é aplicada, nem em parte.
+    """
+    client_id = 9899
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    collection = ClientFavorites.get_motor_collection()
+
+    def apply(stored, added, removed):
+        return test_client.portal.call(partial(
+            embedded.apply_changes, client_id, stored, added, removed
+        ))
+
+    apply([], [1, 2], [])
+    with pytest.raises(HTTPException) as error:
+        apply([], [3], [])
+    assert error.value.detail == (
+        resources.get("favorites.changed").format(client_id)
+    )
+
+    with pytest.raises(HTTPException):
+        apply([1], [3], [1])
+    document = test_client.portal.call(collection.find_one, client_id)
+    assert document["product_ids"] == [1, 2]
+
+    apply([1, 2], [3], [1])
+    document = test_client.portal.call(collection.find_one, client_id)
+    assert document["product_ids"] == [2, 3]
+
+    test_client.delete(f"/client/{client_id}")
+
+
+def test_migrate_favorites_to_embedded(test_client, monkeypatch):
+    """
+    Testa a migração dos favoritos para o modo embutido, que pode ser
+    executada de novo sem duplicar favoritos e reconcilia os favoritos
+    incluídos ou removidos depois da passada anterior.
+    """
+    monkeypatch.setattr(config, "settings", get_settings().model_copy(
+        update={"FAVORITES_STORAGE": "documents"}
+    ))
+    client_id = 9899
+    product_ids = [9899, 9900, 9908]
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    favorites = []
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+        favorites.append(Favorite(client_id=client_id, product_id=product_id))
+    test_client.portal.call(favorites[0].insert)
+    test_client.portal.call(favorites[1].insert)
+
+    for _ in range(2):
+        test_client.portal.call(partial(migrate_to_embedded, restart=True))
+        document = test_client.portal.call(ClientFavorites.get, client_id)
+        assert document.product_ids == product_ids[:2]
+
+    test_client.portal.call(favorites[0].delete)
+    test_client.portal.call(favorites[2].insert)
+    test_client.portal.call(migrate_to_embedded)
+    document = test_client.portal.call(ClientFavorites.get, client_id)
+    assert document.product_ids == product_ids[1:]
+
+    test_client.portal.call(favorites[1].delete)
+    test_client.portal.call(favorites[2].delete)
+    test_client.portal.call(migrate_to_embedded)
+    assert test_client.portal.call(ClientFavorites.get, client_id) is None
+
+    test_client.delete(f"/client/{client_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_migrate_favorites_keeps_writes_after_switch(
+    test_client, monkeypatch
+):
+    """
+    Testa que, com a escrita dupla, os favoritos incluídos e removidos no
+    modo embutido depois da troca sobrevivem a uma nova migração, e que a
+    migração para o armazenamento em uso é recusada sem a escrita dupla.
+    """
+    def use_storage(storage, dual_write):
+        monkeypatch.setattr(config, "settings", get_settings().model_copy(
+            update={
+                "FAVORITES_STORAGE": storage,
+                "FAVORITES_DUAL_WRITE": dual_write,
+            }
+        ))
+
+    def favorite(method, product_id):
+        return test_client.request(
+            method, "/favorite",
+            params={"client_id": client_id, "product_id": product_id}
+        )
+
+    client_id = 9909
+    product_ids = [9909, 9910, 9911]
+    use_storage("documents", True)
+    test_client.delete(f"/client/{client_id}")
+    test_client.post("/client", json=get_default_client(client_id))
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+    favorite("POST", product_ids[0])
+    favorite("POST", product_ids[1])
+    test_client.portal.call(partial(migrate_to_embedded, restart=True))
+
+    use_storage("embedded", True)
+    assert favorite("POST", product_ids[2]).status_code == 200
+    assert favorite("DELETE", product_ids[0]).status_code == 200
+    test_client.portal.call(partial(migrate_to_embedded, restart=True))
+    response = test_client.get(f"/favorite/{client_id}")
+    assert response.json()["data"]["favorites"] == product_ids[1:]
+
+    use_storage("embedded", False)
+    with pytest.raises(RuntimeError):
+        test_client.portal.call(migrate_to_embedded)
+
+    use_storage("embedded", True)
+    test_client.delete(f"/client/{client_id}")
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+    assert test_client.portal.call(ClientFavorites.get, client_id) is None
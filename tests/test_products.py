@@ -1,3 +1,13 @@
+import json
+from functools import partial
+
+from database.cache import NOT_CACHED, TTLCache
+from database.catalog_sync import sync_catalog
+from database.facets import refresh_facets
+from database.popularity import reconcile_popularity
+from database.product import get_product_cache
+from models.popularity import ProductPopularity
+from models.product import Product
 from resources.resources import ResourceManager
 
 resources = ResourceManager()
@@ -138,6 +148,7 @@ def test_delete_product(test_client):
         json_response["description"]
         == resources.get("product.product_removed").format(id_to_delete)
     )
+    assert json_response["data"] == {"favorites_removed": 0}
 
 
 def test_delete_nonexistent_product(test_client):
@@ -197,7 +208,8 @@ def test_update_nonexistent_product(test_client):
 
 def test_update_to_existing_product_id(test_client):
     """
-    Testa a tentativa de atualizar um produto para um ID já existente.
+    Testa a tentativa de alterar o ID de um produto, que é rejeitada sem
+    consultar o outro produto.
     """
     id_original = 9999321
     id_to_update = 999931231
@@ -213,10 +225,426 @@ def test_update_to_existing_product_id(test_client):
     }
     response = test_client.put(f"/product/{id_original}", json=update_data)
     json_response = response.json()
-    assert response.status_code == 409
+    assert response.status_code == 400
     assert (
         json_response["detail"]
-        == resources.get("product.product_id_already_exists")
+        == resources.get("product.id_immutable").format(id_original)
     )
     test_client.delete(f"/product/{id_original}")
     test_client.delete(f"/product/{id_to_update}")
+
+
+def test_get_products_by_cursor(test_client):
+    """
+    Testa a listagem de produtos paginada por cursor.
+    """
+    product_ids = [99701, 99702, 99703]
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+        test_client.post("/product", json=get_default_product(product_id))
+
+    response = test_client.get("/product", params={"page_size": 1})
+    assert response.status_code == 200
+    page = response.json()["data"]
+    assert len(page["items"]) == 1
+    assert page["next_cursor"]
+
+    response = test_client.get(
+        "/product",
+        params={"cursor": page["next_cursor"], "page_size": 1}
+    )
+    next_page = response.json()["data"]
+    assert next_page["items"][0]["_id"] > page["items"][0]["_id"]
+
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_update_product_returns_updated_data(test_client):
+    """
+    Testa que a atualização retorna o produto já atualizado.
+    """
+    id_to_update = 99931224
+    test_client.delete(f"/product/{id_to_update}")
+    test_client.post("/product", json=get_default_product(id_to_update))
+
+    response = test_client.put(
+        f"/product/{id_to_update}", json={"price": 150.0, "revision": 0}
+    )
+    json_response = response.json()
+    assert response.status_code == 200
+    assert json_response["data"]["price"] == 150.0
+    assert json_response["data"]["revision"] == 1
+
+    response = test_client.put(
+        f"/product/{id_to_update}", json={"price": 120.0, "revision": 0}
+    )
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"]
+        == resources.get("product.revision_conflict").format(id_to_update)
+    )
+    test_client.delete(f"/product/{id_to_update}")
+
+
+def test_add_products_bulk(test_client):
+    """
+    Testa a importação de produtos em lote via NDJSON.
+    """
+    product_ids = [99501, 99502]
+    for product_id in product_ids:
+        test_client.delete(f"/product/{product_id}")
+
+    lines = [json.dumps(get_default_product(id)) for id in product_ids]
+    lines.append(json.dumps({"id": 99503}))
+    lines.append(json.dumps(get_default_product(product_ids[0])))
+    response = test_client.post(
+        "/product/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["description"] == resources.get("bulk.imported")
+    report = json_response["data"]
+    assert report["inserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+    assert report["errors"][1]["error"] == resources.get("bulk.duplicate")
+
+    for product_id in product_ids:
+        response = test_client.get(f"/product/{product_id}")
+        assert response.status_code == 200
+        test_client.delete(f"/product/{product_id}")
+
+
+def test_get_products_with_fields(test_client):
+    """
+    Testa a listagem de produtos retornando apenas os campos pedidos.
+    """
+    id_to_get = 99401
+    test_client.delete(f"/product/{id_to_get}")
+    test_client.post("/product", json=get_default_product(id_to_get))
+
+    response = test_client.get(
+        "/product", params={"page_size": 100, "fields": "title,price"}
+    )
+    assert response.status_code == 200
+    for product in response.json()["data"]["items"]:
+        assert set(product) == {"_id", "title", "price"}
+
+    response = test_client.get(
+        "/product", params={"page_size": 100, "fields": "id"}
+    )
+    for product in response.json()["data"]["items"]:
+        assert set(product) == {"_id"}
+    response = test_client.get("/product", params={"page": 1, "fields": "id"})
+    for product in response.json()["data"]["products"]:
+        assert set(product) == {"_id"}
+
+    response = test_client.get("/product", params={"fields": "unknown"})
+    assert response.status_code == 400
+
+    test_client.delete(f"/product/{id_to_get}")
+
+
+def test_product_count_follows_writes(test_client):
+    """
+    Testa que o total de produtos acompanha inclusões e exclusões.
+    """
+    id_existing = 99302
+    id_to_add = 99301
+    test_client.post("/product", json=get_default_product(id_existing))
+    test_client.delete(f"/product/{id_to_add}")
+    response = test_client.get("/product", params={"page": 1})
+    total_items = response.json()["data"]["total_items"]
+
+    test_client.post("/product", json=get_default_product(id_to_add))
+    response = test_client.get("/product", params={"page": 1})
+    assert response.json()["data"]["total_items"] == total_items + 1
+
+    test_client.delete(f"/product/{id_to_add}")
+    response = test_client.get("/product", params={"page": 1})
+    assert response.json()["data"]["total_items"] == total_items
+
+    test_client.delete(f"/product/{id_existing}")
+
+
+def test_get_product_after_writes(test_client):
+    """
+    Testa que a consulta de um produto reflete inclusões, alterações e
+    exclusões, mesmo com o produto em cache.
+    """
+    id_to_get = 99501
+    test_client.delete(f"/product/{id_to_get}")
+    response = test_client.get(f"/product/{id_to_get}")
+    assert response.status_code == 404
+
+    test_client.post("/product", json=get_default_product(id_to_get))
+    response = test_client.get(f"/product/{id_to_get}")
+    assert response.status_code == 200
+
+    test_client.put(f"/product/{id_to_get}", json={"price": 150.0})
+    response = test_client.get(f"/product/{id_to_get}")
+    assert response.json()["data"]["price"] == 150.0
+
+    test_client.delete(f"/product/{id_to_get}")
+    response = test_client.get(f"/product/{id_to_get}")
+    assert response.status_code == 404
+
+
+def test_cache_drops_reads_older_than_invalidation():
+    """
+    Testa que uma leitura iniciada antes de uma invalidação não é gravada
+    no cache.
+    """
+    cache = TTLCache("test_cache", max_size=2, ttl=60, negative_ttl=60)
+    generation = cache.generation()
+    cache.invalidate(1)
+    cache.put(1, "stale", generation)
+    assert cache.get(1) is NOT_CACHED
+
+    cache.put(1, "fresh", cache.generation())
+    assert cache.get(1) == "fresh"
+
+    generation = cache.generation()
+    for key in range(2, 6):
+        cache.invalidate(key)
+    cache.put(1, "stale", generation)
+    assert cache.get(1) == "fresh"
+
+
+def test_search_products(test_client):
+    """
+    Testa a busca de produtos filtrando por marca, preço e nota, ordenada
+    por preço.
+    """
+    ids = [99601, 99602, 99603]
+    prices = [30.0, 10.0, 20.0]
+    for id_to_add, price in zip(ids, prices):
+        test_client.delete(f"/product/{id_to_add}")
+        product = get_default_product(id_to_add)
+        product.update({"brand": "Busca", "price": price, "reviewScore": 8})
+        test_client.post("/product", json=product)
+
+    response = test_client.get(
+        "/product/search",
+        params={"brand": "Busca", "max_price": 25, "sort": "-price"},
+    )
+    assert response.status_code == 200
+    products = response.json()["data"]["products"]
+    assert [product["price"] for product in products] == [20.0, 10.0]
+
+    response = test_client.get(
+        "/product/search", params={"brand": "Busca", "min_score": 9}
+    )
+    assert response.json()["data"]["products"] == []
+
+    response = test_client.get("/product/search", params={"sort": "title"})
+    assert response.status_code == 422
+
+    for id_to_delete in ids:
+        test_client.delete(f"/product/{id_to_delete}")
+
+
+def test_catalog_sync_writes_only_changes(test_client):
+    """
+    Testa que a sincronização do catálogo grava apenas os produtos novos
+    ou alterados.
+    """
+    ids = [99701, 99702]
+    for id_to_delete in ids:
+        test_client.delete(f"/product/{id_to_delete}")
+    feed = [get_default_product(id_to_add) for id_to_add in ids]
+
+    def sync():
+        lines = [json.dumps(product) for product in feed]
+        return test_client.portal.call(
+            partial(sync_catalog, lines, delete_missing=False)
+        )
+
+    report = sync()
+    assert (report["inserted"], report["unchanged"]) == (2, 0)
+
+    report = sync()
+    assert (report["inserted"], report["updated"]) == (0, 0)
+    assert report["unchanged"] == 2
+
+    feed[1]["price"] = 150.0
+    report = sync()
+    assert (report["updated"], report["unchanged"]) == (1, 1)
+    response = test_client.get(f"/product/{ids[1]}")
+    assert response.json()["data"]["price"] == 150.0
+
+    for id_to_delete in ids:
+        test_client.delete(f"/product/{id_to_delete}")
+
+
+def test_get_product_not_modified(test_client):
+    """
+    Testa a consulta condicional de um produto com If-None-Match.
+    """
+    id_to_get = 99801
+    test_client.delete(f"/product/{id_to_get}")
+    test_client.post("/product", json=get_default_product(id_to_get))
+
+    response = test_client.get(f"/product/{id_to_get}")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = test_client.get(
+        f"/product/{id_to_get}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    test_client.put(f"/product/{id_to_get}", json={"price": 150.0})
+    response = test_client.get(
+        f"/product/{id_to_get}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "created_nonce" not in response.json()["data"]
+
+    etag = response.headers["etag"]
+    test_client.delete(f"/product/{id_to_get}")
+    test_client.post("/product", json=get_default_product(id_to_get))
+    response = test_client.get(
+        f"/product/{id_to_get}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+
+    test_client.delete(f"/product/{id_to_get}")
+
+
+def test_get_product_not_modified_without_nonce(test_client):
+    """
+    Testa que um produto gravado antes do nonce de criação mantém o mesmo
+    ETag entre leituras, mesmo fora do cache.
+    """
+    id_to_get = 99802
+    test_client.delete(f"/product/{id_to_get}")
+    document = {**get_default_product(id_to_get), "_id": id_to_get}
+    del document["id"]
+    collection = Product.get_motor_collection()
+    test_client.portal.call(collection.insert_one, document)
+
+    etag = test_client.get(f"/product/{id_to_get}").headers["etag"]
+    get_product_cache().clear()
+    response = test_client.get(
+        f"/product/{id_to_get}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    test_client.delete(f"/product/{id_to_get}")
+
+
+def test_get_products_batch(test_client):
+    """
+    Testa a consulta de vários produtos em uma requisição, na ordem pedida.
+    """
+    ids = [99902, 99901]
+    id_missing = 99903
+    for id_to_add in ids:
+        test_client.delete(f"/product/{id_to_add}")
+        test_client.post("/product", json=get_default_product(id_to_add))
+    test_client.delete(f"/product/{id_missing}")
+
+    response = test_client.get(
+        "/product/batch", params={"ids": f"99902,{id_missing},99901,99902"}
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [product["_id"] for product in data["items"]] == ids
+    assert data["missing"] == [id_missing]
+
+    response = test_client.get("/product/batch", params={"ids": "1,a"})
+    assert response.status_code == 400
+
+    for id_to_delete in ids:
+        test_client.delete(f"/product/{id_to_delete}")
+
+
+def test_product_facets_and_top(test_client):
+    """
+    Testa as facetas do catálogo e o ranking de produtos por marca.
+    """
+    scores = {99951: 7.0, 99952: 9.5, 99953: 8.0}
+    for id_to_add, score in scores.items():
+        test_client.delete(f"/product/{id_to_add}")
+        product = get_default_product(id_to_add)
+        product.update({"brand": "Faceta", "reviewScore": score})
+        test_client.post("/product", json=product)
+    test_client.portal.call(refresh_facets)
+
+    response = test_client.get("/product/facets")
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert {"brand": "Faceta", "count": 3} in data["brands"]
+    assert (
+        sum(bucket["count"] for bucket in data["price_histogram"])
+        == data["total_products"]
+    )
+
+    response = test_client.get(
+        "/product/top", params={"brand": "Faceta", "limit": 2}
+    )
+    assert response.status_code == 200
+    top = response.json()["data"][0]["products"]
+    assert [product["id"] for product in top] == [99952, 99953]
+
+    for id_to_delete in scores:
+        test_client.delete(f"/product/{id_to_delete}")
+    test_client.portal.call(refresh_facets)
+
+
+def test_most_favorited_products(test_client):
+    """
+    Testa os contadores de favoritos dos produtos, a reconciliação e a
+    listagem dos produtos mais favoritados.
+    """
+    client_ids = [99961, 99962]
+    product_ids = [99961, 99962]
+    for id in client_ids:
+        test_client.delete(f"/client/{id}")
+        test_client.post("/client", json=get_default_client(id))
+    for id in product_ids:
+        test_client.delete(f"/product/{id}")
+        test_client.post("/product", json=get_default_product(id))
+    for client_id, product_id in [(99961, 99961), (99961, 99962),
+                                  (99962, 99962)]:
+        test_client.post(
+            "/favorite",
+            params={"client_id": client_id, "product_id": product_id}
+        )
+
+    def popular():
+        response = test_client.get("/product/popular", params={"limit": 100})
+        assert response.status_code == 200
+        return [
+            (item["product"]["_id"], item["favorites"])
+            for item in response.json()["data"]
+            if item["product"]["_id"] in product_ids
+        ]
+
+    assert popular() == [(99962, 2), (99961, 1)]
+
+    # Removing a favorite that does not exist does not change the counters
+    response = test_client.delete(
+        "/favorite", params={"client_id": 99962, "product_id": 99961}
+    )
+    assert response.status_code == 404
+    assert popular() == [(99962, 2), (99961, 1)]
+
+    test_client.delete(f"/client/{99962}")
+    assert popular() == [(99961, 1), (99962, 1)]
+
+    counter = test_client.portal.call(ProductPopularity.get, 99961)
+    counter.favorites = 5
+    test_client.portal.call(counter.save)
+    assert test_client.portal.call(reconcile_popularity) >= 1
+    assert popular() == [(99961, 1), (99962, 1)]
+
+    test_client.delete(f"/client/{99961}")
+    assert popular() == []
+    for id in product_ids:
+        test_client.delete(f"/product/{id}")